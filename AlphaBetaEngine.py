@@ -0,0 +1,336 @@
+# Description: An alpha-beta search player for Pentago.
+
+import copy
+import random
+import time
+
+from Evaluator import evaluate, is_batch_available, score_children
+from Pentago import GAME_STATE_CODES, index_to_move, winning_squares
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+# score for winning right now. Wins further away score a little less, one point per ply, so the
+#       search always takes the quickest win and puts off a loss as long as it can.
+WIN_SCORE = 1000000
+_WIN_THRESHOLD = WIN_SCORE - 100
+_INFINITY = WIN_SCORE + 1
+
+# the clock is only read every so many nodes, reading it every node would slow the search down
+_NODES_BETWEEN_CLOCK_CHECKS = 256
+
+_UNFINISHED = GAME_STATE_CODES['UNFINISHED']
+_DRAW = GAME_STATE_CODES['DRAW']
+_BLACK_WON = GAME_STATE_CODES['BLACK_WON']
+_WHITE_WON = GAME_STATE_CODES['WHITE_WON']
+
+
+class _SearchTimeout(Exception):
+    """ raised inside the search when the deadline passes, to unwind back to the root """
+
+
+class AlphaBetaEngine:
+    """
+    Picks moves for whichever player's turn it is using negamax search with alpha-beta pruning.
+    The search deepens one ply at a time until the time limit runs out, and each pass searches the
+    previous pass's best move first. Results are cached in a TranspositionTable that's kept between
+    searches, so later moves in the same game start out with a warm table. With an opening book or an
+    endgame database, positions they cover are answered from them instead of being searched. Leaves
+    are scored with Evaluator.evaluate, and with NumPy installed a whole last ply is scored in one go.
+    """
+
+    __slots__ = ('_time_limit', '_max_depth', '_table', '_nodes', '_next_clock_check', '_deadline',
+                 '_endgame_database', '_opening_book', '_batch_leaves')
+
+    def __init__(self, time_limit=1.0, max_depth=36, table_size_mb=16, endgame_database=None,
+                 opening_book=None, batch_leaves=True, table=None):
+        """
+        :param time_limit: seconds allowed per move. The search stops when it runs out, even partway
+            through a pass, and answers with the best move it has found so far.
+        :param max_depth: deepest pass to search, in plies
+        :param table_size_mb: memory budget for the transposition table
+        :param endgame_database: an EndgameSolver.EndgameDatabase to look late positions up in, or None
+        :param opening_book: an OpeningBook.OpeningBook to take early moves from, or None
+        :param batch_leaves: score every move of the last ply together with Evaluator.score_children. It's
+            ignored without NumPy, and with an endgame database, whose lookups go move by move.
+        :param table: a table to use instead of a new TranspositionTable of table_size_mb, such as a
+            TranspositionTable.SharedTranspositionTable that other processes search with too
+        """
+        self._time_limit = time_limit
+        self._max_depth = max_depth
+        self._table = TranspositionTable(table_size_mb) if table is None else table
+        self._deadline = 0.0
+        self._nodes = 0
+        self._next_clock_check = 0
+        self._endgame_database = endgame_database
+        self._opening_book = opening_book
+        self._batch_leaves = batch_leaves and endgame_database is None and is_batch_available()
+
+    def get_table(self):
+        """ returns the engine's TranspositionTable """
+        return self._table
+
+    def find_best_move(self, game):
+        """ returns the best (position, sub_board, rotation) found for the player whose turn it is, or None """
+        return self.search(game)['move']
+
+    def search(self, game, helper=0, time_limit=None, deadline=None):
+        """
+        Searches the position without changing the game that's passed in.
+        :param helper: 0 for an ordinary search. In a parallel search (see ParallelSearch) every process
+            searches the same position with its own helper number, and helpers 1 and up spread out over the
+            tree: odd numbered ones start a pass deeper, and each one tries the root moves in its own order.
+        :param time_limit: seconds allowed for this search, defaults to the engine's time limit
+        :param deadline: a time.monotonic() time to stop at instead, so searches started in several
+            processes at slightly different moments all stop together
+        :return: a dict with the best 'move' as a (position, sub_board, rotation) triple (None if the game is
+            over), its 'move_index', its 'value' for the player to move, the deepest fully searched 'depth',
+            the number of 'nodes' visited, the 'time' taken in seconds, and whether the search finished
+            ('complete') or was cut off by the time limit. The value is None if the time ran out before any
+            move was scored, and for moves from an opening book built from games, whose score in
+            thousandths (see OpeningBook.build_from_games) is given as 'book_score' instead.
+        """
+        start = time.monotonic()
+        if deadline is None:
+            deadline = start + (self._time_limit if time_limit is None else time_limit)
+        self._deadline = deadline
+        self._nodes = 0
+        self._next_clock_check = _NODES_BETWEEN_CLOCK_CHECKS
+        game = copy.copy(game)
+
+        moves = self._order_moves(game, -1, 1)
+        if not moves:
+            return {'move': None, 'move_index': -1, 'value': 0, 'depth': 0, 'nodes': 0, 'time': 0.0,
+                    'complete': True}
+
+        black, white = game.get_bitboards()
+        empty_squares = 36 - (black | white).bit_count()
+        if self._opening_book is not None:
+            entry = self._opening_book.lookup(game)
+            if entry is not None:
+                result = {'move': index_to_move(entry[0]), 'move_index': entry[0], 'value': entry[1], 'depth': 0,
+                          'nodes': 0, 'time': time.monotonic() - start, 'complete': True}
+                if self._opening_book.is_built_from_games():
+                    # a share of games won isn't on the same scale as a search score
+                    result['value'] = None
+                    result['book_score'] = entry[1]
+                return result
+        if self._endgame_database is not None:
+            entry = self._endgame_database.lookup(game)
+            if entry is not None:
+                return {'move': index_to_move(entry[1]), 'move_index': entry[1],
+                        'value': _endgame_value(entry[0], 0, empty_squares), 'depth': empty_squares, 'nodes': 0,
+                        'time': time.monotonic() - start, 'complete': True}
+
+        last_depth = min(self._max_depth, empty_squares)
+        if helper:
+            random.Random(helper).shuffle(moves)
+        best_move = moves[0]
+        best_value = None
+        completed_depth = 0
+        complete = True
+
+        for depth in range(min(1 + helper % 2, last_depth), last_depth + 1):
+            # the previous pass's best move goes first, so a pass that gets cut off partway has
+            #       always finished with that move and anything it found is at least as good
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+            iteration_move = None
+            alpha = -_INFINITY
+            try:
+                for move in moves:
+                    value = self._search_move(game, move, depth, alpha, _INFINITY, 0)
+                    if value > alpha:
+                        alpha = value
+                        iteration_move = move
+            except _SearchTimeout:
+                if iteration_move is not None:
+                    best_move, best_value = iteration_move, alpha
+                complete = False
+                break
+
+            best_move, best_value, completed_depth = iteration_move, alpha, depth
+            self._table.store(game.get_zobrist_hash(), _to_table(alpha, 0), depth, EXACT, best_move)
+            # a proven win or loss won't change with more depth
+            if abs(best_value) >= _WIN_THRESHOLD:
+                break
+
+        return {
+            'move': index_to_move(best_move),
+            'move_index': best_move,
+            'value': best_value,
+            'depth': completed_depth,
+            'nodes': self._nodes,
+            'time': time.monotonic() - start,
+            'complete': complete,
+        }
+
+    def _search_move(self, game, move, depth, alpha, beta, ply):
+        """ plays one move, scores it for the player making it, and takes it back """
+        is_black_moving = game.get_whose_turn() == 'black'
+        token = game.apply_move(move)
+        state = game.get_game_state()
+        if state == 'UNFINISHED':
+            value = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+        elif state == 'DRAW':
+            value = 0
+        elif (state == 'BLACK_WON') == is_black_moving:
+            value = WIN_SCORE - ply - 1
+        else:
+            value = -(WIN_SCORE - ply - 1)
+        game.unmake_move(token)
+        return value
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        """ returns the value of an unfinished position for the player whose turn it is """
+        self._nodes += 1
+        # a batched last ply adds many nodes at once, so the check is due at a count rather than a multiple
+        if self._nodes >= self._next_clock_check:
+            self._next_clock_check = self._nodes + _NODES_BETWEEN_CLOCK_CHECKS
+            if time.monotonic() > self._deadline:
+                raise _SearchTimeout
+
+        if self._endgame_database is not None:
+            entry = self._endgame_database.lookup(game)
+            if entry is not None:
+                return _endgame_value(entry[0], ply, 36 - game.get_num_turns_taken())
+
+        if depth == 0:
+            return evaluate(game)
+
+        key = game.get_zobrist_hash()
+        entry = self._table.probe(key)
+        table_move = -1
+        if entry is not None:
+            value, entry_depth, bound, table_move = entry
+            if entry_depth >= depth:
+                value = _from_table(value, ply)
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER_BOUND and value >= beta:
+                    return value
+                elif bound == UPPER_BOUND and value <= alpha:
+                    return value
+
+        if depth == 1 and self._batch_leaves:
+            return self._search_last_ply(game, key, ply)
+
+        original_alpha = alpha
+        best_value = -_INFINITY
+        best_move = -1
+        for move in self._order_moves(game, table_move, depth):
+            value = self._search_move(game, move, depth, alpha, beta, ply)
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if best_value <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_value >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._table.store(key, _to_table(best_value, ply), depth, bound, best_move)
+        return best_value
+
+    def _search_last_ply(self, game, key, ply):
+        """
+        _negamax at depth 1, with every move played and scored at once by Evaluator.score_children. There's
+        no cutoff, so the value is always exact.
+        """
+        moves, states, scores = score_children(game)
+        won = _BLACK_WON if game.get_whose_turn() == 'black' else _WHITE_WON
+        win_value = WIN_SCORE - ply - 1
+        best_value = -_INFINITY
+        best_move = -1
+        unfinished = 0
+        for move, state, value in zip(moves.tolist(), states.tolist(), scores.tolist()):
+            if state == _UNFINISHED:
+                unfinished += 1
+            elif state == _DRAW:
+                value = 0
+            elif state == won:
+                value = win_value
+            else:
+                value = -win_value
+            if value > best_value:
+                best_value = value
+                best_move = move
+        # each unfinished child is a leaf, as it would have been a node of its own
+        self._nodes += unfinished
+        self._table.store(key, _to_table(best_value, ply), 1, EXACT, best_move)
+        return best_value
+
+    def _order_moves(self, game, table_move, depth):
+        """
+        Returns the legal moves, best guesses first: a move that wins on the spot (if there is one, it's
+        the only move worth searching), then the table's best move, then moves onto squares where the
+        opponent could win on the spot, then everything else, then moves that lose on the spot. Moves
+        that lead to the same board are merged below the last ply, where the merging pays for itself.
+        """
+        moves = game.get_legal_move_indices(merge_identical=depth > 1)
+        black, white = game.get_bitboards()
+        if game.get_whose_turn() == 'black':
+            mover, opponent = black, white
+        else:
+            mover, opponent = white, black
+
+        wins = winning_squares(mover, opponent)
+        if wins:
+            for move in moves:
+                if wins >> (move >> 3) & 1:
+                    return [move]
+
+        # above the last ply, the full tactical check pays for itself: it also finds wins made by the
+        #       rotation, and moves whose rotation hands the opponent five in a row go last
+        losses = ()
+        if depth > 1:
+            rotation_wins, losses = game.get_immediate_results()
+            if rotation_wins:
+                return rotation_wins[:1]
+            losses = set(losses)
+
+        blocks = winning_squares(opponent, mover)
+        first = []
+        rest = []
+        last = []
+        for move in moves:
+            if move == table_move:
+                continue
+            if move in losses:
+                last.append(move)
+            elif blocks >> (move >> 3) & 1:
+                first.append(move)
+            else:
+                rest.append(move)
+        if table_move in moves:
+            first.insert(0, table_move)
+        return first + rest + last
+
+
+def _endgame_value(result, ply, empty_squares):
+    """
+    turns an endgame database result (1, 0, or -1) into a search value. The database doesn't say how
+    far away a win is, so it's scored as if it takes every empty square.
+    """
+    return result * (WIN_SCORE - ply - empty_squares)
+
+
+def _to_table(value, ply):
+    """ win scores count plies from the root, but the table stores them counted from the position itself """
+    if value >= _WIN_THRESHOLD:
+        return value + ply
+    elif value <= -_WIN_THRESHOLD:
+        return value - ply
+    return value
+
+
+def _from_table(value, ply):
+    """ undoes _to_table for a position ply plies from the root """
+    if value >= _WIN_THRESHOLD:
+        return value - ply
+    elif value <= -_WIN_THRESHOLD:
+        return value + ply
+    return value
@@ -0,0 +1,87 @@
+import random
+import time
+import unittest
+from Pentago import *
+from AlphaBetaEngine import *
+from Evaluator import is_batch_available
+
+
+class AlphaBetaEngineTestCase(unittest.TestCase):
+    def test_winning_squares(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+        black, white = game.get_bitboards()
+        # black can finish the top row on either end
+        self.assertEqual(winning_squares(black, white), 1 << 0 | 1 << 5)
+        self.assertEqual(winning_squares(white, black), 0)
+
+    def test_takes_immediate_win(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+
+        result = AlphaBetaEngine(time_limit=5).search(game)
+        self.assertIn(result['move'][0], ['a0', 'a5'])
+        self.assertEqual(result['value'], WIN_SCORE - 1)
+        self.assertTrue(result['complete'])
+
+        game.make_move('black', *result['move'])
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_blocks_immediate_loss(self):
+        # white has four in a row on the bottom and black has nothing, so black has to stop it by taking
+        #       f4 or by rotating part of the row out of line
+        game = Pentago()
+        for position in ['a0', 'f0', 'c4', 'f1', 'b2', 'f2', 'd5', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 1, 'C')
+
+        result = AlphaBetaEngine(time_limit=5, max_depth=2).search(game)
+        self.assertGreater(result['value'], -WIN_SCORE + 100)
+        self.assertTrue(game.make_move('black', *result['move']))
+        black, white = game.get_bitboards()
+        self.assertEqual(winning_squares(white, black), 0)
+
+    def test_time_limit(self):
+        game = Pentago()
+        start = time.monotonic()
+        result = AlphaBetaEngine(time_limit=0.2).search(game)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertFalse(result['complete'])
+        self.assertIn(result['move'], game.get_legal_moves())
+
+    @unittest.skipIf(not is_batch_available(), 'NumPy is not installed')
+    def test_batch_leaves(self):
+        # scoring the last ply in one go has to give the same values as scoring it move by move
+        rng = random.Random(4)
+        for _ in range(3):
+            game = Pentago()
+            for _ in range(rng.randrange(6, 16)):
+                game.apply_move(rng.choice(game.get_legal_move_indices()))
+            if game.get_game_state() != 'UNFINISHED':
+                continue
+            batched = AlphaBetaEngine(time_limit=60, max_depth=2).search(game)
+            unbatched = AlphaBetaEngine(time_limit=60, max_depth=2, batch_leaves=False).search(game)
+            self.assertEqual(batched['value'], unbatched['value'])
+            self.assertEqual(batched['depth'], 2)
+
+    def test_helpers(self):
+        # a helper starts a pass deeper and tries the root moves in another order, but gets the same value
+        game = Pentago()
+        for position in ['a0', 'f0', 'c4', 'f1', 'b2', 'f2', 'd5', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 1, 'C')
+        result = AlphaBetaEngine(time_limit=60, max_depth=2).search(game)
+        for helper in (1, 2):
+            helper_result = AlphaBetaEngine(time_limit=60, max_depth=2).search(game, helper)
+            self.assertEqual(helper_result['value'], result['value'])
+            self.assertEqual(helper_result['depth'], 2)
+
+    def test_finished_game(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3', 'a0']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+        self.assertIsNone(AlphaBetaEngine().find_best_move(game))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# Description: Many games of Pentago stored in NumPy arrays and stepped all at once.
+
+import numpy as np
+
+from Pentago import GAME_STATE_CODES, LINE_MASKS, QUADRANT_MASKS, QUADRANT_OFFSETS, ROTATION_TABLES, Pentago
+
+UNFINISHED = GAME_STATE_CODES['UNFINISHED']
+WHITE_WON = GAME_STATE_CODES['WHITE_WON']
+BLACK_WON = GAME_STATE_CODES['BLACK_WON']
+DRAW = GAME_STATE_CODES['DRAW']
+
+_LINES = np.array(LINE_MASKS, dtype=np.uint64)
+# indexed by the low 3 bits of a move index: (sub_board - 1) * 2, plus 1 for anticlockwise
+_ROTATIONS = np.array([ROTATION_TABLES[sub_board][rotation] for sub_board in range(1, 5) for rotation in 'CA'],
+                      dtype=np.uint64)
+_QUADRANT_MASKS = np.array(QUADRANT_MASKS[1:], dtype=np.uint64)
+_QUADRANT_OFFSETS = np.array(QUADRANT_OFFSETS[1:], dtype=np.uint64)
+_SQUARE_BITS = np.uint64(1) << np.arange(36, dtype=np.uint64)
+_SEVEN = np.uint64(7)
+
+
+def _has_line(bits):
+    """ returns a bool array, True for each bitboard that has five in a row """
+    return ((bits[:, None] & _LINES) == _LINES).any(axis=1)
+
+
+def _rotate(bits, quadrants, rotations):
+    """
+    Rotates one quadrant of each bitboard.
+    :param quadrants: sub-board number minus 1 for each bitboard
+    :param rotations: row of _ROTATIONS to use for each bitboard
+    """
+    offsets = _QUADRANT_OFFSETS[quadrants]
+    patterns = ((bits >> offsets[:, 0] & _SEVEN) | (bits >> offsets[:, 1] & _SEVEN) << np.uint64(3)
+                | (bits >> offsets[:, 2] & _SEVEN) << np.uint64(6))
+    return (bits & ~_QUADRANT_MASKS[quadrants]) | _ROTATIONS[rotations, patterns.astype(np.intp)]
+
+
+class BatchPentago:
+    """
+    Holds N games of Pentago at once as NumPy arrays: a uint64 bitboard per color (bit row * 6 + col,
+    the same layout Pentago uses), a turn counter, and a game state code for each game. step plays
+    one move in every game with array operations and follows the same rules as Pentago.make_move:
+    a five made by placing the marble wins before the rotation, five for both players after the
+    rotation is a draw, and a board filled after 36 turns without a five is a draw.
+
+    Game states are stored as codes, with GAME_STATES (from Pentago) giving the string for each one.
+    Moves are move indices, see Pentago.move_to_index.
+    """
+
+    __slots__ = ('_black', '_white', '_num_turns_taken', '_states')
+
+    def __init__(self, num_games):
+        """ Initializes num_games empty boards, all with black to move """
+        self._black = np.zeros(num_games, dtype=np.uint64)
+        self._white = np.zeros(num_games, dtype=np.uint64)
+        self._num_turns_taken = np.zeros(num_games, dtype=np.int8)
+        self._states = np.zeros(num_games, dtype=np.int8)
+
+    def __len__(self):
+        """ returns the number of games """
+        return len(self._states)
+
+    def get_bitboards(self):
+        """ returns the (black, white) uint64 arrays. These are the batch's own arrays, not copies. """
+        return self._black, self._white
+
+    def get_num_turns_taken(self):
+        """ returns the int8 array of turn counters """
+        return self._num_turns_taken
+
+    def get_game_states(self):
+        """ returns the int8 array of game state codes """
+        return self._states
+
+    def get_planes(self):
+        """ returns a uint8 array of shape (N, 2, 6, 6): 1 where black (plane 0) or white (plane 1) has a marble """
+        bits = np.stack([self._black, self._white], axis=1)
+        return ((bits[:, :, None] & _SQUARE_BITS) != 0).astype(np.uint8).reshape(len(self), 2, 6, 6)
+
+    def get_legal_mask(self):
+        """ returns a bool array of shape (N, 288), True for each legal move index. Finished games have none. """
+        empty = ((self._black | self._white)[:, None] & _SQUARE_BITS) == 0
+        empty &= (self._states == UNFINISHED)[:, None]
+        return np.repeat(empty, 8, axis=1)
+
+    def random_moves(self, rng):
+        """
+        Returns a random legal move index for every game. Finished games get move 0, which step ignores.
+        :param rng: a numpy.random.Generator
+        """
+        empty = ((self._black | self._white)[:, None] & _SQUARE_BITS) == 0
+        # pick the empty square with the highest random key, a vectorized random choice
+        keys = np.where(empty, rng.random(empty.shape), -1.0)
+        squares = keys.argmax(axis=1)
+        moves = squares * 8 + rng.integers(0, 8, len(self))
+        return np.where(self._states == UNFINISHED, moves, 0)
+
+    def step(self, moves):
+        """
+        Plays one move in every unfinished game. Finished games are left alone.
+        :param moves: array of N move indices
+        :return: a (states, illegal) tuple. states is the int8 array of game state codes after the move, and
+            illegal is a bool array that is True where the move's square was already taken. Those games
+            are left unchanged, just as make_move refuses the move.
+        """
+        moves = np.asarray(moves, dtype=np.int64)
+        active = self._states == UNFINISHED
+        bits = _SQUARE_BITS[moves >> 3]
+        occupied = ((self._black | self._white) & bits) != 0
+        illegal = active & occupied
+        playing = active & ~occupied
+
+        is_black_turn = self._num_turns_taken % 2 == 0
+        black_placing = playing & is_black_turn
+        white_placing = playing & ~is_black_turn
+        self._black[black_placing] |= bits[black_placing]
+        self._white[white_placing] |= bits[white_placing]
+        self._num_turns_taken += playing
+
+        # check for win prior to rotation. Only the mover's marbles changed, and nobody had five before.
+        mover = np.where(is_black_turn, self._black, self._white)
+        won_before_rotation = playing & _has_line(mover)
+        self._states[won_before_rotation] = np.where(is_black_turn, BLACK_WON, WHITE_WON)[won_before_rotation]
+
+        # rotate, then check both colors (and whether the board is full)
+        rotating = playing & ~won_before_rotation
+        quadrants = (moves >> 1 & 3)[rotating]
+        rotations = (moves & 7)[rotating]
+        self._black[rotating] = _rotate(self._black[rotating], quadrants, rotations)
+        self._white[rotating] = _rotate(self._white[rotating], quadrants, rotations)
+
+        is_white_winner = _has_line(self._white[rotating])
+        is_black_winner = _has_line(self._black[rotating])
+        is_board_full = self._num_turns_taken[rotating] > 35
+        self._states[rotating] = np.select(
+            [is_white_winner & is_black_winner, is_white_winner, is_black_winner, is_board_full],
+            [DRAW, WHITE_WON, BLACK_WON, DRAW], UNFINISHED)
+
+        return self._states, illegal
+
+    def reset(self, games=None):
+        """
+        Empties boards so they can be played again.
+        :param games: indices or a bool mask of the games to reset, or None for all of them
+        """
+        if games is None:
+            games = slice(None)
+        self._black[games] = 0
+        self._white[games] = 0
+        self._num_turns_taken[games] = 0
+        self._states[games] = UNFINISHED
+
+    def get_game(self, game_number):
+        """ returns a Pentago object holding a copy of one game """
+        game = Pentago()
+        game.set_position(int(self._black[game_number]), int(self._white[game_number]),
+                          int(self._num_turns_taken[game_number]))
+        return game
+
+    def set_game(self, game_number, game):
+        """ copies a Pentago object's position into one game of the batch """
+        black, white = game.get_bitboards()
+        self._black[game_number] = black
+        self._white[game_number] = white
+        self._num_turns_taken[game_number] = game.get_num_turns_taken()
+        self._states[game_number] = GAME_STATE_CODES[game.get_game_state()]
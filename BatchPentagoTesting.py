@@ -0,0 +1,59 @@
+import random
+import unittest
+from Pentago import *
+
+try:
+    import numpy as np
+    from BatchPentago import *
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class BatchPentagoTestCase(unittest.TestCase):
+    def test_matches_make_move(self):
+        # play the same random games in a batch and one at a time, including some illegal moves
+        rng = random.Random(3)
+        batch = BatchPentago(200)
+        games = [Pentago() for _ in range(200)]
+        while (batch.get_game_states() == UNFINISHED).any():
+            moves = [rng.randrange(288) for _ in games]
+            states, illegal = batch.step(moves)
+            for game_number, game in enumerate(games):
+                result = game.make_move(game.get_whose_turn(), *index_to_move(moves[game_number]))
+                self.assertEqual(illegal[game_number], result == 'position is not empty')
+                self.assertEqual(GAME_STATES[states[game_number]], game.get_game_state())
+                self.assertEqual(batch.get_game(game_number).get_bitboards(), game.get_bitboards())
+
+        # games that are over stay over
+        states, illegal = batch.step(np.zeros(200, dtype=np.int64))
+        self.assertFalse(illegal.any())
+        self.assertEqual([GAME_STATES[state] for state in states], [game.get_game_state() for game in games])
+
+    def test_random_moves_and_planes(self):
+        rng = np.random.default_rng(5)
+        batch = BatchPentago(50)
+        for _ in range(10):
+            moves = batch.random_moves(rng)
+            self.assertTrue(batch.get_legal_mask()[np.arange(50), moves].all())
+            states, illegal = batch.step(moves)
+            self.assertFalse(illegal.any())
+
+        planes = batch.get_planes()
+        self.assertEqual(planes.shape, (50, 2, 6, 6))
+        game = batch.get_game(7)
+        board = game.get_board()
+        for row in range(6):
+            for col in range(6):
+                self.assertEqual(planes[7, 0, row, col], board[row][col] == 'black')
+                self.assertEqual(planes[7, 1, row, col], board[row][col] == 'white')
+
+        batch.reset([7])
+        self.assertEqual(batch.get_game(7).get_bitboards(), (0, 0))
+        batch.set_game(7, game)
+        self.assertEqual(batch.get_game(7).get_board(), board)
+        self.assertEqual(batch.get_num_turns_taken()[7], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+# Description: Repeatable speed benchmarks for the core Pentago operations.
+#       Run it with: python Benchmark.py --help
+
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+import time
+
+# Only the API the original list-of-lists Pentago.py already had is used, so this file can be copied
+#       into an old checkout and run there to measure a rewrite against it.
+from Pentago import Pentago, SubBoard, string_coord_to_tuple
+
+try:
+    from AlphaBetaEngine import AlphaBetaEngine
+except ImportError:
+    # older trees have no search engine, so there's no search benchmark to run on them
+    AlphaBetaEngine = None
+
+# bump this if the layout of the JSON output changes
+FORMAT_VERSION = 2
+
+_SQUARE_NAMES = [row + str(col) for row in 'abcdef' for col in range(6)]
+
+
+def _random_move(game, rng):
+    """ returns a random legal (color, position, sub_board, rotation) move """
+    empty = [_SQUARE_NAMES[square] for square in range(36) if game.is_move_valid(divmod(square, 6))]
+    return game.get_whose_turn(), rng.choice(empty), rng.randint(1, 4), rng.choice('CA')
+
+
+def _make_workload(seed, num_games):
+    """ returns fixed random games as lists of (color, position, sub_board, rotation) moves """
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        game = Pentago()
+        moves = []
+        while game.get_game_state() == 'UNFINISHED':
+            move = _random_move(game, rng)
+            game.make_move(*move)
+            moves.append(move)
+        games.append(moves)
+    return games
+
+
+def _positions(games):
+    """ returns a Pentago object for every position partway through the workload's games """
+    positions = []
+    for moves in games:
+        game = Pentago()
+        for move in moves[:-1]:
+            game.make_move(*move)
+            positions.append(copy.deepcopy(game))
+    return positions
+
+
+def bench_make_move(workload):
+    """ replays every workload game with make_move """
+    calls = 0
+    for moves in workload['games']:
+        game = Pentago()
+        for move in moves:
+            game.make_move(*move)
+        calls += len(moves)
+    return calls
+
+
+def bench_get_winner(workload):
+    """ calls get_winner, which checks the whole board for five in a row, on every workload position """
+    for game in workload['positions']:
+        game.get_winner()
+    return len(workload['positions'])
+
+
+def bench_sub_board_rotate(workload):
+    """ rotates a filled SubBoard back and forth """
+    sub_board = SubBoard()
+    for row in range(3):
+        for col in range(3):
+            sub_board.update((row, col), 'black' if (row + col) % 2 else 'white')
+    for _ in range(workload['repetitions']):
+        sub_board.rotate('C')
+        sub_board.rotate('A')
+    return 2 * workload['repetitions']
+
+
+def bench_update_main_board_from_sub_board(workload):
+    """
+    rotates every quadrant of every workload position by hand, with get_sub_board, SubBoard.rotate, and
+    update_main_board_from_sub_board, first clockwise and then back so the positions end up unchanged
+    """
+    for game in workload['positions']:
+        for sub_board in range(1, 5):
+            for rotation in 'CA':
+                game.get_sub_board(sub_board).rotate(rotation)
+                game.update_main_board_from_sub_board(sub_board)
+    return 8 * len(workload['positions'])
+
+
+def bench_string_coord_to_tuple(workload):
+    """ converts every square's name, over and over """
+    for _ in range(workload['repetitions'] // 36):
+        for coord in _SQUARE_NAMES:
+            string_coord_to_tuple(coord)
+    return workload['repetitions'] // 36 * 36
+
+
+def bench_random_games(workload):
+    """ plays whole games of random moves with make_move """
+    rng = random.Random(workload['seed'])
+    for _ in range(len(workload['games'])):
+        game = Pentago()
+        while game.get_game_state() == 'UNFINISHED':
+            game.make_move(*_random_move(game, rng))
+    return len(workload['games'])
+
+
+def bench_search_nodes(workload):
+    """ runs a fixed depth alpha-beta search from a few workload positions and counts nodes """
+    nodes = 0
+    for game in workload['positions'][::max(1, len(workload['positions']) // 5)][:5]:
+        engine = AlphaBetaEngine(time_limit=float('inf'), max_depth=2, table_size_mb=4)
+        nodes += engine.search(game)['nodes']
+    return nodes
+
+
+# name: (function, unit it counts)
+BENCHMARKS = {
+    'make_move': (bench_make_move, 'moves'),
+    'get_winner': (bench_get_winner, 'calls'),
+    'sub_board_rotate': (bench_sub_board_rotate, 'rotations'),
+    'update_main_board_from_sub_board': (bench_update_main_board_from_sub_board, 'rotations'),
+    'string_coord_to_tuple': (bench_string_coord_to_tuple, 'calls'),
+    'random_games': (bench_random_games, 'games'),
+}
+if AlphaBetaEngine is not None:
+    BENCHMARKS['search_nodes'] = (bench_search_nodes, 'nodes')
+
+
+def run_benchmarks(names=None, seed=0, num_games=200, repetitions=100000, repeat=3):
+    """
+    Runs the benchmarks on a workload made from the seed, so every run measures exactly the same work.
+    :param names: benchmark names to run, defaults to all of BENCHMARKS
+    :param repeat: times to run each benchmark. The fastest run is reported, since slower runs are
+        slowed down by other things happening on the machine.
+    :return: a dict ready to be written out as JSON
+    """
+    games = _make_workload(seed, num_games)
+    workload = {'seed': seed, 'games': games, 'positions': _positions(games), 'repetitions': repetitions}
+    results = {}
+    for name in names or BENCHMARKS:
+        function, unit = BENCHMARKS[name]
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            operations = function(workload)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = {
+            'unit': unit,
+            'operations': operations,
+            'seconds': round(best, 6),
+            'per_second': round(operations / best, 1) if best > 0 else None,
+        }
+    return {
+        'format': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'settings': {'seed': seed, 'num_games': num_games, 'repetitions': repetitions, 'repeat': repeat},
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Compares a report against a saved baseline report.
+    :param tolerance: how much slower than the baseline (as a fraction) counts as a regression
+    :return: a {name: speed ratio} dict (above 1 is faster than the baseline) and a list of the names
+        that regressed
+    """
+    ratios = {}
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old['per_second'] or not result['per_second']:
+            continue
+        ratios[name] = round(result['per_second'] / old['per_second'], 3)
+        if ratios[name] < 1 - tolerance:
+            regressions.append(name)
+    return ratios, regressions
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Benchmark the core Pentago operations.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, default all: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON report from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown that counts as a regression')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--games', type=int, default=200, help='games in the workload')
+    parser.add_argument('--repetitions', type=int, default=100000, help='calls for the micro benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the fastest is kept')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: ' + name)
+
+    report = run_benchmarks(args.names, args.seed, args.games, args.repetitions, args.repeat)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            ratios, regressions = compare(report, json.load(baseline_file), args.tolerance)
+        report['comparison'] = {'baseline': args.baseline, 'ratios': ratios, 'regressions': regressions}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+import json
+import unittest
+from Benchmark import *
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_run_benchmarks(self):
+        report = run_benchmarks(seed=1, num_games=3, repetitions=360, repeat=1)
+        self.assertEqual(report['format'], FORMAT_VERSION)
+        self.assertEqual(set(report['results']), set(BENCHMARKS))
+        for result in report['results'].values():
+            self.assertGreater(result['operations'], 0)
+        # the report is plain JSON
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+        # the same seed gives the same work
+        again = run_benchmarks(['make_move', 'search_nodes'], seed=1, num_games=3, repetitions=360, repeat=1)
+        self.assertEqual(again['results']['make_move']['operations'], report['results']['make_move']['operations'])
+        self.assertEqual(again['results']['search_nodes']['operations'],
+                         report['results']['search_nodes']['operations'])
+
+    def test_compare(self):
+        baseline = {'results': {'make_move': {'per_second': 100.0}, 'get_winner': {'per_second': 100.0}}}
+        report = {'results': {'make_move': {'per_second': 50.0}, 'get_winner': {'per_second': 95.0},
+                              'random_games': {'per_second': 10.0}}}
+        ratios, regressions = compare(report, baseline, tolerance=0.1)
+        self.assertEqual(ratios, {'make_move': 0.5, 'get_winner': 0.95})
+        self.assertEqual(regressions, ['make_move'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+# Description: Solves Pentago endgames exactly and keeps the results in a memory-mapped database file
+#       indexed by canonical position. Run it with: python EndgameSolver.py --help
+
+import argparse
+import copy
+import itertools
+import os
+import random
+import shutil
+import sys
+from multiprocessing import Pool
+
+from Pentago import Pentago, canonical_symmetry, inverse_symmetry, transform_move_index, winning_squares
+from PositionTable import PositionTable, pack_record, record_layout, unpack_records, write_table
+
+# results, always from the point of view of the player whose turn it is
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+# Every database file starts with these bytes.
+MAGIC = b'PED1'
+
+# The file is a PositionTable that keeps the most empty squares a solved root had in its header. A
+#       record holds the result and the best move in the canonical orientation. Part files are the
+#       same records back to back, without the header or the sorting.
+_RECORD = record_layout('bH')
+
+
+def solve(game, memo=None):
+    """
+    Works out the result of an unfinished position with perfect play from both sides. This searches
+    every line to the end of the game, so it's only practical with a handful of empty squares left.
+    :param memo: a dict to keep solved positions in between calls, keyed by canonical key. Every
+        position the solver finishes with is added to it as (result, best move in the canonical orientation).
+    :return: a (result, move index) tuple: WIN, DRAW, or LOSS for the player whose turn it is, and a
+        move that gets that result
+    """
+    if game.get_game_state() != 'UNFINISHED':
+        raise ValueError('the game is already over')
+    return _solve(copy.copy(game), {} if memo is None else memo)
+
+
+def _solve(game, memo):
+    """ depth first solve, filling memo as each position's children are finished """
+    black, white = game.get_bitboards()
+    key, symmetry = canonical_symmetry(black, white)
+    entry = memo.get(key)
+    if entry is not None:
+        return entry[0], transform_move_index(entry[1], inverse_symmetry(symmetry))
+
+    is_black_moving = game.get_whose_turn() == 'black'
+    best_value = LOSS - 1
+    best_move = -1
+    for move in _order_moves(game, black, white, is_black_moving):
+        token = game.apply_move(move)
+        state = game.get_game_state()
+        if state == 'UNFINISHED':
+            value = -_solve(game, memo)[0]
+        elif state == 'DRAW':
+            value = DRAW
+        elif (state == 'BLACK_WON') == is_black_moving:
+            value = WIN
+        else:
+            value = LOSS
+        game.unmake_move(token)
+        if value > best_value:
+            best_value = value
+            best_move = move
+            if value == WIN:
+                break
+
+    memo[key] = (best_value, transform_move_index(best_move, symmetry))
+    return best_value, best_move
+
+
+def _order_moves(game, black, white, is_black_moving):
+    """ legal moves with identical results merged, moves that win on the spot first """
+    moves = game.get_legal_move_indices(merge_identical=True)
+    wins = winning_squares(black, white) if is_black_moving else winning_squares(white, black)
+    if wins:
+        moves.sort(key=lambda move: not wins >> (move >> 3) & 1)
+    return moves
+
+
+def sample_roots(num_positions, max_empty, seed=0):
+    """
+    Yields (black, white) bitboards of unfinished positions with max_empty empty squares, reached by
+    playing random moves from the start. The same seed always gives the same positions.
+    """
+    rng = random.Random(seed)
+    game = Pentago()
+    made = 0
+    while made < num_positions:
+        game.set_position(0, 0, 0)
+        while game.get_game_state() == 'UNFINISHED' and 36 - game.get_num_turns_taken() > max_empty:
+            game.apply_move(rng.choice(game.get_legal_move_indices()))
+        if game.get_game_state() == 'UNFINISHED':
+            made += 1
+            yield game.get_bitboards()
+
+
+def roots_from_games(games, max_empty):
+    """
+    Yields (black, white) bitboards of each recorded game's position once only max_empty squares are
+    left, for the games still unfinished by then.
+    :param games: an iterable of move index sequences, or (moves, result) pairs like GameRecordReader gives
+    """
+    game = Pentago()
+    for moves in games:
+        if isinstance(moves, tuple):
+            moves = moves[0]
+        game.set_position(0, 0, 0)
+        for move in moves:
+            if game.get_game_state() != 'UNFINISHED' or 36 - game.get_num_turns_taken() <= max_empty:
+                break
+            game.apply_move(move)
+        if game.get_game_state() == 'UNFINISHED' and 36 - game.get_num_turns_taken() == max_empty:
+            yield game.get_bitboards()
+
+
+def _part_path(parts_directory, chunk_number):
+    """ returns the path of the file holding one chunk's solved positions """
+    return os.path.join(parts_directory, 'part-{:06d}.bin'.format(chunk_number))
+
+
+def _solve_chunk(arguments):
+    """ solves one chunk of roots in a worker process and writes everything it solved to the chunk's part file """
+    part_path, roots = arguments
+    memo = {}
+    game = Pentago()
+    for black, white in roots:
+        game.set_position(black, white)
+        if game.get_game_state() == 'UNFINISHED':
+            _solve(game, memo)
+
+    # written under another name and renamed, so a part file that exists is always complete
+    with open(part_path + '.tmp', 'wb') as part:
+        part.write(b''.join(pack_record(_RECORD, key, entry) for key, entry in memo.items()))
+    os.replace(part_path + '.tmp', part_path)
+    return len(memo)
+
+
+def build_database(path, roots, max_empty, processes=None, chunk_size=64, resume=True):
+    """
+    Solves every root position and writes all the positions solved along the way to a database file.
+    Chunks of roots are solved across a process pool and each finished chunk is saved in a directory
+    next to the database (its name plus '.parts'), so a build that's stopped can pick up where it
+    left off. The chunks are merged into the database at the end and the directory is removed.
+    :param roots: an iterable of (black, white) bitboards, see sample_roots and roots_from_games. To resume
+        a build it has to give the same positions in the same order as before.
+    :param max_empty: the most empty squares a root can have
+    :param processes: worker processes, defaults to one per core. With 1 everything runs in this process.
+    :param resume: if True, chunks that are already saved are skipped and the positions already in the
+        database are kept. Otherwise the build starts over.
+    :return: the number of positions in the database
+    """
+    parts_directory = path + '.parts'
+    if not resume and os.path.exists(parts_directory):
+        shutil.rmtree(parts_directory)
+    os.makedirs(parts_directory, exist_ok=True)
+
+    tasks = []
+    roots = iter(roots)
+    for chunk_number in itertools.count():
+        chunk = list(itertools.islice(roots, chunk_size))
+        if not chunk:
+            break
+        for black, white in chunk:
+            if 36 - (black | white).bit_count() > max_empty:
+                raise ValueError('a root has more than {} empty squares'.format(max_empty))
+        part_path = _part_path(parts_directory, chunk_number)
+        if not os.path.exists(part_path):
+            tasks.append((part_path, chunk))
+
+    if processes == 1:
+        for task in tasks:
+            _solve_chunk(task)
+    elif tasks:
+        with Pool(processes) as pool:
+            for _ in pool.imap_unordered(_solve_chunk, tasks):
+                pass
+
+    records = {}
+    if resume and os.path.exists(path):
+        with EndgameDatabase(path) as database:
+            max_empty = max(max_empty, database.get_max_empty())
+            records.update(database.get_records())
+    for name in sorted(os.listdir(parts_directory)):
+        if name.endswith('.bin'):
+            with open(os.path.join(parts_directory, name), 'rb') as part:
+                records.update(unpack_records(_RECORD, part.read()))
+
+    count = write_table(path, MAGIC, max_empty, _RECORD, records)
+    shutil.rmtree(parts_directory)
+    return count
+
+
+class EndgameDatabase(PositionTable):
+    """ Looks up solved positions in a database file made by build_database, see PositionTable """
+
+    __slots__ = ()
+
+    def __init__(self, path):
+        """ Remembers where the database is, without opening it yet """
+        super().__init__(path, MAGIC, _RECORD, 'an endgame database')
+
+    def get_max_empty(self):
+        """ returns the most empty squares any solved root had. Positions with more are never in the database. """
+        return self.get_info()
+
+    def lookup(self, game):
+        """
+        Looks up the position in a Pentago object.
+        :return: a (result, move index) tuple like solve gives, or None if the position isn't in the database
+        """
+        black, white = game.get_bitboards()
+        if 36 - (black | white).bit_count() > self.get_max_empty():
+            return None
+        key, symmetry = canonical_symmetry(black, white)
+        record = self.find(key)
+        if record is None:
+            return None
+        value, move = record
+        return value, transform_move_index(move, inverse_symmetry(symmetry))
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Solve Pentago endgames into a database file.')
+    parser.add_argument('output', help='database file to build or add to')
+    parser.add_argument('--max-empty', type=int, default=5, help='empty squares left in each root position')
+    parser.add_argument('--positions', type=int, default=1000, help='random root positions to solve')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--records', help='take the roots from a game record file instead of random games')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, defaults to one per core')
+    parser.add_argument('--chunk-size', type=int, default=64, help='roots solved and saved at a time')
+    parser.add_argument('--no-resume', action='store_true', help='start over instead of resuming')
+    args = parser.parse_args(argv)
+
+    if args.records:
+        from GameRecords import GameRecordReader
+        with GameRecordReader(args.records) as reader:
+            count = build_database(args.output, roots_from_games(reader, args.max_empty), args.max_empty,
+                                   args.processes, args.chunk_size, not args.no_resume)
+    else:
+        count = build_database(args.output, sample_roots(args.positions, args.max_empty, args.seed),
+                               args.max_empty, args.processes, args.chunk_size, not args.no_resume)
+    print('{} positions in {}'.format(count, args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
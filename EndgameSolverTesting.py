@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from Pentago import *
+from Pentago import _transform_bits
+from AlphaBetaEngine import AlphaBetaEngine
+from EndgameSolver import *
+
+
+def brute_force(game):
+    """ plain minimax with no memo or symmetry, to check the solver against """
+    is_black_moving = game.get_whose_turn() == 'black'
+    best = LOSS
+    for move in game.get_legal_move_indices():
+        token = game.apply_move(move)
+        state = game.get_game_state()
+        if state == 'UNFINISHED':
+            value = -brute_force(game)
+        elif state == 'DRAW':
+            value = DRAW
+        else:
+            value = WIN if (state == 'BLACK_WON') == is_black_moving else LOSS
+        game.unmake_move(token)
+        best = max(best, value)
+        if best == WIN:
+            break
+    return best
+
+
+def result_of_move(game, move):
+    """ returns the result of playing move, for the player making it """
+    game = copy.copy(game)
+    is_black_moving = game.get_whose_turn() == 'black'
+    game.apply_move(move)
+    state = game.get_game_state()
+    if state == 'UNFINISHED':
+        return -solve(game)[0]
+    elif state == 'DRAW':
+        return DRAW
+    return WIN if (state == 'BLACK_WON') == is_black_moving else LOSS
+
+
+class EndgameSolverTestCase(unittest.TestCase):
+    def test_solve_matches_brute_force(self):
+        memo = {}
+        results = set()
+        for black, white in sample_roots(12, 3, seed=2):
+            game = Pentago()
+            game.set_position(black, white)
+            value, move = solve(game, memo)
+            self.assertEqual(value, brute_force(game))
+            self.assertEqual(result_of_move(game, move), value)
+            results.add(value)
+        self.assertGreater(len(results), 1)
+
+        finished = Pentago()
+        for position in ['a0', 'f5', 'a1', 'f4', 'a2', 'e5', 'a3', 'e4', 'a4']:
+            finished.make_move(finished.get_whose_turn(), position, 4, 'C')
+        self.assertRaises(ValueError, solve, finished)
+
+    def test_roots(self):
+        roots = list(sample_roots(5, 4, seed=3))
+        self.assertEqual(roots, list(sample_roots(5, 4, seed=3)))
+        for black, white in roots:
+            self.assertEqual((black | white).bit_count(), 32)
+
+        game = Pentago()
+        moves = []
+        for move in game.get_legal_move_indices()[:1] + [move_to_index('f5', 1, 'C')]:
+            game.apply_move(move)
+            moves.append(move)
+        self.assertEqual(list(roots_from_games([(moves, 'UNFINISHED')], 34)), [game.get_bitboards()])
+        self.assertEqual(list(roots_from_games([moves], 33)), [])
+
+    def test_build_and_lookup(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        directory = temporary.name
+        path = os.path.join(directory, 'endgames.db')
+        roots = list(sample_roots(6, 4, seed=4))
+        count = build_database(path, roots[:4], 4, processes=1, chunk_size=3)
+        self.assertFalse(os.path.exists(path + '.parts'))
+
+        # adding more roots later keeps what was already there
+        self.assertGreater(build_database(path, roots[4:], 4, processes=1), count)
+
+        database = EndgameDatabase(path)
+        self.assertEqual(database.get_max_empty(), 4)
+        for black, white in roots:
+            game = Pentago()
+            game.set_position(black, white)
+            value, move = database.lookup(game)
+            self.assertEqual(value, solve(game)[0])
+            self.assertEqual(result_of_move(game, move), value)
+
+            # a mirror image of the position is found too, with the move mirrored
+            mirrored = Pentago()
+            mirrored.set_position(_transform_bits(black, 5), _transform_bits(white, 5))
+            mirrored_value, mirrored_move = database.lookup(mirrored)
+            self.assertEqual(mirrored_value, value)
+            self.assertEqual(result_of_move(mirrored, mirrored_move), value)
+
+        self.assertIsNone(database.lookup(Pentago()))
+        engine = AlphaBetaEngine(time_limit=5, endgame_database=database)
+        game = Pentago()
+        game.set_position(*roots[0])
+        result = engine.search(game)
+        self.assertEqual(result['nodes'], 0)
+        self.assertEqual(result['move_index'], database.lookup(game)[1])
+        database.close()
+
+        with open(path, 'r+b') as broken:
+            broken.write(b'XXXX')
+        self.assertRaises(ValueError, len, EndgameDatabase(path))
+
+    def test_resume(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        directory = temporary.name
+        path = os.path.join(directory, 'endgames.db')
+        roots = list(sample_roots(4, 3, seed=5))
+        # a chunk saved by an earlier, stopped build is used as it is
+        os.makedirs(path + '.parts')
+        with open(os.path.join(path + '.parts', 'part-000000.bin'), 'wb'):
+            pass
+        partial = build_database(path, roots, 3, processes=1, chunk_size=2)
+        self.assertEqual(partial, build_database(os.path.join(directory, 'tail.db'), roots[2:], 3, processes=1))
+        # starting over solves the first chunk as well
+        self.assertGreater(build_database(path, roots, 3, processes=1, chunk_size=2, resume=False), partial)
+
+
+if __name__ == '__main__':
+    unittest.main()
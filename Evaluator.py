@@ -0,0 +1,130 @@
+# Description: A static evaluation of Pentago positions, for one position at a time or, with NumPy,
+#       for thousands of positions in one go.
+
+from Pentago import LINE_MASKS, LINES_THROUGH_QUADRANT, ROTATION_CHOICES, rotate_bitboard
+
+try:
+    import numpy as np
+    from BatchPentago import BatchPentago
+except ImportError:
+    np = None
+
+# what an open window (one of the 32 fives in a row with none of the other color's marbles in it) is
+#       worth, by how many marbles it has. Windows with 3 or 4 are the ones that turn into wins.
+OPEN_WINDOW_WEIGHTS = (0, 1, 4, 16, 64, 256)
+# what each extra open four the player to move could make with one rotation is worth
+ROTATION_WEIGHT = 32
+
+# the 5 square indices (row * 6 + col) of each window, in LINE_MASKS order
+WINDOW_SQUARES = tuple(tuple(index for index in range(36) if line >> index & 1) for line in LINE_MASKS)
+
+
+def _count_open_fours(mover, opponent, lines):
+    """ returns how many of the lines hold exactly four of mover's marbles and none of opponent's """
+    fours = 0
+    for line in lines:
+        if not opponent & line and (mover & line).bit_count() == 4:
+            fours += 1
+    return fours
+
+
+def evaluate_bitboards(black, white, is_black_turn):
+    """
+    Scores a position from the point of view of the player whose turn it is: every open window counts
+    OPEN_WINDOW_WEIGHTS for its owner, more the fuller it is, and the player to move also gets
+    ROTATION_WEIGHT for each open four beyond what's on the board that their best single rotation
+    would make.
+    """
+    score = 0
+    for line in LINE_MASKS:
+        black_in_line = black & line
+        white_in_line = white & line
+        if not white_in_line:
+            score += OPEN_WINDOW_WEIGHTS[black_in_line.bit_count()]
+        elif not black_in_line:
+            score -= OPEN_WINDOW_WEIGHTS[white_in_line.bit_count()]
+    if not is_black_turn:
+        score = -score
+    mover, opponent = (black, white) if is_black_turn else (white, black)
+
+    # a rotation only moves the windows through its quadrant, so only those are counted
+    potential = 0
+    for sub_board, rotation in ROTATION_CHOICES:
+        lines = LINES_THROUGH_QUADRANT[sub_board]
+        gained = (_count_open_fours(rotate_bitboard(mover, sub_board, rotation),
+                                    rotate_bitboard(opponent, sub_board, rotation), lines)
+                  - _count_open_fours(mover, opponent, lines))
+        if gained > potential:
+            potential = gained
+    return score + ROTATION_WEIGHT * potential
+
+
+def evaluate(game):
+    """ scores a Pentago object's position for the player whose turn it is, see evaluate_bitboards """
+    black, white = game.get_bitboards()
+    return evaluate_bitboards(black, white, game.get_whose_turn() == 'black')
+
+
+def is_batch_available():
+    """ returns True if NumPy is installed, which evaluate_batch and score_children need """
+    return np is not None
+
+
+if np is not None:
+    _WINDOW_SQUARES = np.array(WINDOW_SQUARES, dtype=np.intp)
+    _OPEN_WINDOW_WEIGHTS = np.array(OPEN_WINDOW_WEIGHTS, dtype=np.int64)
+    _SQUARE_SHIFTS = np.arange(36, dtype=np.uint64)
+    # for each rotation choice, the square each square of the rotated board comes from
+    _ROTATION_SOURCES = np.array([[(rotate_bitboard(1 << square, sub_board, 'A' if rotation == 'C' else 'C'))
+                                   .bit_length() - 1 for square in range(36)]
+                                  for sub_board, rotation in ROTATION_CHOICES], dtype=np.intp)
+
+
+def evaluate_batch(black, white, is_black_turn):
+    """
+    evaluate_bitboards for many positions at once, with the same results.
+    :param black: uint64 array of black bitboards
+    :param white: uint64 array of white bitboards
+    :param is_black_turn: bool array, True where black is to move
+    :return: an int64 array of scores
+    """
+    black = np.asarray(black, dtype=np.uint64)
+    white = np.asarray(white, dtype=np.uint64)
+    is_black_turn = np.asarray(is_black_turn, dtype=bool)
+    # (N, 2, 36) planes of 0s and 1s, mover first
+    mover = np.where(is_black_turn, black, white)
+    opponent = np.where(is_black_turn, white, black)
+    planes = (np.stack([mover, opponent], axis=1)[:, :, None] >> _SQUARE_SHIFTS & np.uint64(1)).astype(np.int8)
+
+    # marbles of each color in each window, (N, 2, 32)
+    counts = planes[:, :, _WINDOW_SQUARES].sum(axis=3)
+    mover_counts = counts[:, 0]
+    opponent_counts = counts[:, 1]
+    score = (np.where(opponent_counts == 0, _OPEN_WINDOW_WEIGHTS[mover_counts], 0).sum(axis=1)
+             - np.where(mover_counts == 0, _OPEN_WINDOW_WEIGHTS[opponent_counts], 0).sum(axis=1))
+
+    # open fours for the mover after each of the 8 rotations, (N, 8)
+    rotated = planes[:, :, _ROTATION_SOURCES]
+    rotated_counts = rotated[:, :, :, _WINDOW_SQUARES].sum(axis=4)
+    rotated_fours = ((rotated_counts[:, 0] == 4) & (rotated_counts[:, 1] == 0)).sum(axis=2)
+    fours = ((mover_counts == 4) & (opponent_counts == 0)).sum(axis=1)
+    potential = np.maximum(rotated_fours.max(axis=1) - fours, 0)
+    return score + ROTATION_WEIGHT * potential
+
+
+def score_children(game):
+    """
+    Plays every legal move of an unfinished game at once and scores the results.
+    :return: (moves, states, scores) arrays. moves holds the move indices, states the game state code
+        after each move (see GAME_STATES), and scores the evaluation of each new position from the
+        point of view of the player who made the move. Scores of finished games mean nothing.
+    """
+    moves = np.array(game.get_legal_move_indices(), dtype=np.int64)
+    children = BatchPentago(len(moves))
+    black, white = children.get_bitboards()
+    black[:] = game.get_bitboards()[0]
+    white[:] = game.get_bitboards()[1]
+    children.get_num_turns_taken()[:] = game.get_num_turns_taken()
+    states, _ = children.step(moves)
+    scores = -evaluate_batch(black, white, np.full(len(moves), game.get_whose_turn() == 'white'))
+    return moves, states.copy(), scores
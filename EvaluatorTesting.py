@@ -0,0 +1,73 @@
+import copy
+import random
+import unittest
+from Pentago import *
+from Evaluator import *
+
+
+def random_positions(count, seed):
+    """ returns unfinished Pentago objects from random games, with anywhere from 0 to 35 marbles """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = Pentago()
+        while game.get_game_state() == 'UNFINISHED':
+            positions.append(copy.copy(game))
+            game.apply_move(rng.choice(game.get_legal_move_indices()))
+    return positions[:count]
+
+
+class EvaluatorTestCase(unittest.TestCase):
+    def test_window_squares(self):
+        self.assertEqual(len(WINDOW_SQUARES), 32)
+        for line, squares in zip(LINE_MASKS, WINDOW_SQUARES):
+            self.assertEqual(sum(1 << square for square in squares), line)
+
+    def test_evaluate(self):
+        game = Pentago()
+        self.assertEqual(evaluate(game), 0)
+
+        # one black marble in the corner sits in 3 windows, each worth 1
+        game.make_move('black', 'a0', 4, 'C')
+        self.assertEqual(evaluate(game), -3)
+        self.assertEqual(evaluate_bitboards(*game.get_bitboards(), True), 3)
+
+        # apart from what the player to move could get from a rotation, the two players' scores are opposites
+        for game in random_positions(200, 5):
+            black, white = game.get_bitboards()
+            potentials = evaluate_bitboards(black, white, True) + evaluate_bitboards(black, white, False)
+            self.assertGreaterEqual(potentials, 0)
+            self.assertEqual(potentials % ROTATION_WEIGHT, 0)
+
+    def test_rotation_potential(self):
+        # black has a0 a1 a2 and b3, and rotating sub-board 2 clockwise moves b3 to a4 for an open four
+        black = 1 << 0 | 1 << 1 | 1 << 2 | 1 << 9
+        white = 1 << 20 | 1 << 27 | 1 << 34
+        self.assertEqual(evaluate_bitboards(black, white, True) + evaluate_bitboards(black, white, False),
+                         ROTATION_WEIGHT)
+
+
+@unittest.skipIf(not is_batch_available(), 'NumPy is not installed')
+class EvaluatorBatchTestCase(unittest.TestCase):
+    def test_matches_scalar(self):
+        positions = random_positions(2000, 7)
+        black = [game.get_bitboards()[0] for game in positions]
+        white = [game.get_bitboards()[1] for game in positions]
+        is_black_turn = [game.get_whose_turn() == 'black' for game in positions]
+        scores = evaluate_batch(black, white, is_black_turn)
+        self.assertEqual(scores.tolist(), [evaluate(game) for game in positions])
+
+    def test_score_children(self):
+        for game in random_positions(30, 11):
+            moves, states, scores = score_children(game)
+            self.assertEqual(moves.tolist(), game.get_legal_move_indices())
+            for move, state, score in zip(moves.tolist(), states.tolist(), scores.tolist()):
+                token = game.apply_move(move)
+                self.assertEqual(GAME_STATES[state], game.get_game_state())
+                if state == GAME_STATE_CODES['UNFINISHED']:
+                    self.assertEqual(score, -evaluate(game))
+                game.unmake_move(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
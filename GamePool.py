@@ -0,0 +1,171 @@
+# Description: Stores many Pentago games in a few flat arrays, one slot per game, with Pentago objects
+#       that read and write a slot in place.
+
+import struct
+from array import array
+
+from Pentago import Pentago, GAME_STATES, GAME_STATE_CODES
+
+# Every snapshot starts with these bytes, then the capacity, then each array's contents in _ARRAYS
+#       order. The arrays are saved in the machine's own byte order.
+MAGIC = b'PGP1'
+_HEADER = struct.Struct('<4sI')
+
+# (array name, typecode) for every per-game array
+_ARRAYS = (('_black', 'Q'), ('_white', 'Q'), ('_hashes', 'Q'), ('_turns', 'B'), ('_states', 'B'),
+           ('_in_use', 'B'))
+
+
+class GamePool:
+    """
+    Holds games in preallocated arrays (both bitboards, the Zobrist hash, the turn count, and the
+    game state code), so a game costs 27 bytes and no Python objects of its own. Each game is
+    addressed by an integer handle, and get_game wraps a handle in a PooledGame that works like a
+    Pentago object. Freed handles are reused, and the arrays grow when every slot is taken.
+    """
+
+    __slots__ = ('_black', '_white', '_hashes', '_turns', '_states', '_in_use', '_free')
+
+    def __init__(self, capacity=1024):
+        """ Preallocates room for capacity games """
+        for name, typecode in _ARRAYS:
+            setattr(self, name, array(typecode, bytes(array(typecode).itemsize * capacity)))
+        # free handles, lowest last so they're handed out in order
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def get_capacity(self):
+        """ returns the number of slots, used or not """
+        return len(self._in_use)
+
+    def __len__(self):
+        """ returns the number of games in the pool """
+        return len(self._in_use) - len(self._free)
+
+    def _grow(self):
+        """ doubles the number of slots """
+        capacity = len(self._in_use)
+        added = max(capacity, 1)
+        for name, typecode in _ARRAYS:
+            getattr(self, name).extend(array(typecode, bytes(array(typecode).itemsize * added)))
+        self._free.extend(range(capacity + added - 1, capacity - 1, -1))
+
+    def allocate(self):
+        """ returns the handle of a new game at the starting position """
+        if not self._free:
+            self._grow()
+        handle = self._free.pop()
+        self._black[handle] = 0
+        self._white[handle] = 0
+        self._hashes[handle] = 0
+        self._turns[handle] = 0
+        self._states[handle] = 0
+        self._in_use[handle] = 1
+        return handle
+
+    def free(self, handle):
+        """ gives a game's slot back to the pool. PooledGame objects for it must not be used afterwards. """
+        if not self.is_allocated(handle):
+            raise ValueError('handle {} is not allocated'.format(handle))
+        self._in_use[handle] = 0
+        self._free.append(handle)
+
+    def is_allocated(self, handle):
+        """ returns True if the handle is a game in the pool """
+        return 0 <= handle < len(self._in_use) and self._in_use[handle] == 1
+
+    def get_handles(self):
+        """ returns a list of the handles of every game in the pool """
+        in_use = self._in_use
+        return [handle for handle in range(len(in_use)) if in_use[handle]]
+
+    def get_game(self, handle):
+        """ returns a PooledGame that plays the game in the handle's slot """
+        if not self.is_allocated(handle):
+            raise ValueError('handle {} is not allocated'.format(handle))
+        return PooledGame(self, handle)
+
+    def to_bytes(self):
+        """ returns every slot, used and free, as one bytes object that from_bytes turns back into a pool """
+        return _HEADER.pack(MAGIC, len(self._in_use)) + b''.join(getattr(self, name).tobytes()
+                                                                 for name, _ in _ARRAYS)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """ returns a new pool made from to_bytes output. Handles are the same as in the saved pool. """
+        magic, capacity = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('not a game pool snapshot')
+        pool = cls(0)
+        offset = _HEADER.size
+        for name, typecode in _ARRAYS:
+            values = array(typecode)
+            size = values.itemsize * capacity
+            values.frombytes(data[offset:offset + size])
+            offset += size
+            setattr(pool, name, values)
+        pool._free = [handle for handle in range(capacity - 1, -1, -1) if not pool._in_use[handle]]
+        return pool
+
+
+def _pooled_field(array_name):
+    """ returns a property that reads and writes one of a pool's arrays at the game's handle """
+    def get_value(game):
+        return getattr(game._pool, array_name)[game._handle]
+
+    def set_value(game, value):
+        getattr(game._pool, array_name)[game._handle] = value
+    return property(get_value, set_value)
+
+
+def _get_state(game):
+    """ reads the game state string from the pool's state codes """
+    return GAME_STATES[game._pool._states[game._handle]]
+
+
+def _set_state(game, state):
+    """ writes a game state string into the pool as its code """
+    game._pool._states[game._handle] = GAME_STATE_CODES[state]
+
+
+class PooledGame(Pentago):
+    """
+    A Pentago game whose position lives in a GamePool slot. Every Pentago method works on it and
+    changes go straight into the pool. Nothing is copied when one is made, so they can be made on
+    demand and thrown away. copy.copy gives an ordinary Pentago object with the same position.
+    """
+
+    __slots__ = ('_pool', '_handle')
+
+    # the fields Pentago keeps in its own slots are read from the pool instead
+    _black = _pooled_field('_black')
+    _white = _pooled_field('_white')
+    _hash = _pooled_field('_hashes')
+    _num_turns_taken = _pooled_field('_turns')
+    _game_state = property(_get_state, _set_state)
+
+    def __init__(self, pool, handle):
+        """ Wraps a handle from pool. This doesn't reset the game, see GamePool.allocate. """
+        self._pool = pool
+        self._handle = handle
+        self._sub_boards = None
+
+    def get_handle(self):
+        """ returns the game's handle in its pool """
+        return self._handle
+
+    def __copy__(self):
+        """ returns an ordinary Pentago object with the same position """
+        game = Pentago()
+        game.set_position(self._black, self._white, self._num_turns_taken)
+        return game
+
+    def __reduce__(self):
+        """ pickles as an ordinary Pentago object, the pool itself isn't sent along """
+        return _unpickle_game, (self._black, self._white, self._num_turns_taken)
+
+
+def _unpickle_game(black, white, num_turns_taken):
+    """ rebuilds a pickled PooledGame as an ordinary Pentago object """
+    game = Pentago()
+    game.set_position(black, white, num_turns_taken)
+    return game
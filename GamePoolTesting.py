@@ -0,0 +1,80 @@
+import copy
+import pickle
+import random
+import unittest
+from Pentago import *
+from GamePool import *
+
+
+class GamePoolTestCase(unittest.TestCase):
+    def test_allocate_and_free(self):
+        pool = GamePool(2)
+        handles = [pool.allocate() for _ in range(3)]
+        self.assertEqual(handles, [0, 1, 2])
+        # the pool grew to make room
+        self.assertEqual(pool.get_capacity(), 4)
+        self.assertEqual(len(pool), 3)
+
+        pool.get_game(1).make_move('black', 'a0', 1, 'C')
+        pool.free(1)
+        self.assertFalse(pool.is_allocated(1))
+        self.assertRaises(ValueError, pool.free, 1)
+        self.assertRaises(ValueError, pool.get_game, 1)
+        self.assertEqual(pool.get_handles(), [0, 2])
+        # a freed slot is reused and starts over
+        self.assertEqual(pool.allocate(), 1)
+        self.assertEqual(pool.get_game(1).get_num_turns_taken(), 0)
+        self.assertEqual(pool.get_game(1).get_bitboards(), (0, 0))
+
+    def test_pooled_games_play_like_pentago(self):
+        pool = GamePool(4)
+        rng = random.Random(3)
+        handles = [pool.allocate() for _ in range(4)]
+        games = {handle: Pentago() for handle in handles}
+        for _ in range(300):
+            handle = rng.choice(handles)
+            pooled = pool.get_game(handle)
+            game = games[handle]
+            if game.get_game_state() != 'UNFINISHED':
+                self.assertEqual(pooled.get_game_state(), game.get_game_state())
+                self.assertEqual(pooled.make_move(pooled.get_whose_turn(), 'a0', 1, 'C'), 'game is finished')
+                pool.free(handle)
+                games[pool.allocate()] = Pentago()
+                continue
+            position, sub_board, rotation = index_to_move(rng.choice(game.get_legal_move_indices()))
+            self.assertEqual(pooled.make_move(pooled.get_whose_turn(), position, sub_board, rotation),
+                             game.make_move(game.get_whose_turn(), position, sub_board, rotation))
+            self.assertEqual(pooled.get_bitboards(), game.get_bitboards())
+            self.assertEqual(pooled.get_zobrist_hash(), game.get_zobrist_hash())
+            self.assertEqual(pooled.get_board(), game.get_board())
+            self.assertEqual(pool.get_game(handle).get_game_state(), game.get_game_state())
+
+        # copies are ordinary games, so changing one leaves the pool alone
+        pooled = pool.get_game(handles[0])
+        for duplicate in (copy.copy(pooled), pickle.loads(pickle.dumps(pooled))):
+            self.assertIs(type(duplicate), Pentago)
+            self.assertEqual(duplicate.get_bitboards(), pooled.get_bitboards())
+            duplicate.set_position(0, 0, 0)
+        self.assertEqual(pooled.get_bitboards(), games[handles[0]].get_bitboards())
+
+    def test_snapshot_and_restore(self):
+        pool = GamePool(8)
+        for _ in range(5):
+            pool.allocate()
+        pool.free(3)
+        pool.get_game(4).make_move('black', 'c3', 2, 'A')
+        pool.get_game(4).make_move('white', 'd1', 3, 'C')
+
+        restored = GamePool.from_bytes(pool.to_bytes())
+        self.assertEqual(restored.get_capacity(), 8)
+        self.assertEqual(restored.get_handles(), [0, 1, 2, 4])
+        game = restored.get_game(4)
+        self.assertEqual(game.get_bitboards(), pool.get_game(4).get_bitboards())
+        self.assertEqual(game.get_zobrist_hash(), pool.get_game(4).get_zobrist_hash())
+        self.assertEqual(game.get_whose_turn(), 'black')
+        self.assertEqual(restored.allocate(), 3)
+        self.assertRaises(ValueError, GamePool.from_bytes, b'XXXX' + pool.to_bytes()[4:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+# Description: A compact binary file format for whole Pentago games, with a memory-mapped reader.
+
+import json
+import mmap
+import numbers
+import os
+from array import array
+
+from Pentago import GAME_STATES, GAME_STATE_CODES, move_to_index
+
+# Every file starts with these bytes.
+MAGIC = b'PGR1'
+
+# A game is stored as one byte with the number of moves, one byte with the final game state code,
+#       and then each move index (0 - 287, see Pentago.move_to_index) packed into 9 bits, least
+#       significant bits first. A full 36 move game takes 2 + 41 = 43 bytes.
+_HEADER_SIZE = len(MAGIC)
+
+
+def encode_game(moves, result):
+    """
+    Returns the bytes for one game.
+    :param moves: the move indices played, which can be NumPy integers, or (position, sub_board, rotation) triples
+    :param result: the final game state string, like 'BLACK_WON'
+    """
+    packed = 0
+    for number, move in enumerate(moves):
+        if isinstance(move, numbers.Integral):
+            move = int(move)
+        else:
+            move = move_to_index(*move)
+        packed |= move << (9 * number)
+    return bytes((len(moves), GAME_STATE_CODES[result])) + packed.to_bytes((9 * len(moves) + 7) // 8, 'little')
+
+
+def decode_game(data, offset=0):
+    """
+    Reads one game from a bytes-like object.
+    :return: a (move indices, result) tuple, where result is a game state string
+    """
+    num_moves = data[offset]
+    start = offset + 2
+    packed = int.from_bytes(data[start:start + (9 * num_moves + 7) // 8], 'little')
+    moves = [packed >> (9 * number) & 511 for number in range(num_moves)]
+    return moves, GAME_STATES[data[offset + 1]]
+
+
+def _index_path(path):
+    """ returns the path of the offset index that goes with a record file """
+    return path + '.idx'
+
+
+def _record_size(data, offset):
+    """ returns the number of bytes taken by the game starting at offset """
+    return 2 + (9 * data[offset] + 7) // 8
+
+
+def _scan_offsets(data):
+    """ walks the whole record file to find where each complete game starts """
+    offsets = array('Q')
+    offset = _HEADER_SIZE
+    while offset < len(data):
+        size = _record_size(data, offset)
+        # a game cut off partway by a writer that was killed is left out
+        if offset + size > len(data):
+            break
+        offsets.append(offset)
+        offset += size
+    return offsets
+
+
+def _index_fits(offsets, data):
+    """
+    Checks that an offset index starts at the first game and that its last game ends where the
+    record file does, which catches an index left behind by a writer that was killed or a record
+    file that was changed without it.
+    :param offsets: the index's offsets, or just its first and last ones
+    """
+    if len(offsets) == 0:
+        return len(data) == _HEADER_SIZE
+    last = offsets[-1]
+    return offsets[0] == _HEADER_SIZE and last < len(data) and last + _record_size(data, last) == len(data)
+
+
+class GameRecordWriter:
+    """
+    Appends games to a record file. The byte offset of every game is written to a second file
+    (the record file's name plus '.idx') so a reader can jump straight to any game.
+    """
+
+    __slots__ = ('_records', '_index', '_offset')
+
+    def __init__(self, path, append=False):
+        """
+        Opens the file, starting a new one unless append is True and the file already exists. When
+        appending, an index that doesn't match the file is rebuilt first, and a game left cut off
+        partway at the end of the file is removed.
+        """
+        is_appending = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._records = open(path, 'ab' if is_appending else 'wb')
+        if is_appending:
+            self._index = self._open_index(path)
+        else:
+            self._index = open(_index_path(path), 'wb')
+            self._records.write(MAGIC)
+        self._offset = self._records.tell()
+
+    def _open_index(self, path):
+        """ opens the index of an existing record file for appending, rebuilding it if it's stale """
+        index_path = _index_path(path)
+        ends = array('Q')
+        if os.path.exists(index_path) and os.path.getsize(index_path) % 8 == 0:
+            with open(index_path, 'rb') as index:
+                ends.frombytes(index.read(8))
+                if os.path.getsize(index_path) > 8:
+                    index.seek(-8, os.SEEK_END)
+                    ends.frombytes(index.read(8))
+        else:
+            # a first offset that no index can have, so the index is rebuilt
+            ends.append(0)
+        with open(path, 'rb') as records, mmap.mmap(records.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if _index_fits(ends, data):
+                return open(index_path, 'ab')
+            offsets = _scan_offsets(data)
+            end = offsets[-1] + _record_size(data, offsets[-1]) if offsets else _HEADER_SIZE
+        self._records.truncate(end)
+        index = open(index_path, 'wb')
+        index.write(offsets.tobytes())
+        return index
+
+    def write(self, moves, result):
+        """ adds one game, see encode_game """
+        data = encode_game(moves, result)
+        self._index.write(array('Q', [self._offset]).tobytes())
+        self._records.write(data)
+        self._offset += len(data)
+
+    def close(self):
+        """ flushes and closes both files """
+        self._records.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+class GameRecordReader:
+    """
+    Reads a record file through mmap, so opening even a very large file is instant and only the
+    pages that are actually read get loaded. The offset index is memory-mapped too and read in
+    place, and is rebuilt by scanning the records if it's missing or doesn't match the records.
+    """
+
+    __slots__ = ('_file', '_data', '_index_file', '_index_data', '_offsets')
+
+    def __init__(self, path):
+        """ Maps the record file and its offset index into memory """
+        self._file = open(path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index_file = None
+        self._index_data = None
+        self._offsets = array('Q')
+        if self._data[:_HEADER_SIZE] != MAGIC:
+            self.close()
+            raise ValueError(path + ' is not a game record file')
+
+        index_path = _index_path(path)
+        # an index that isn't a whole number of offsets was cut short while being written
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0 and os.path.getsize(index_path) % 8 == 0:
+            self._index_file = open(index_path, 'rb')
+            self._index_data = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets = memoryview(self._index_data).cast('Q')
+            if not _index_fits(self._offsets, self._data):
+                self._close_index()
+        if self._index_data is None:
+            self._offsets = _scan_offsets(self._data)
+
+    def _close_index(self):
+        """ unmaps and closes the offset index, if there is one """
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._offsets = array('Q')
+        if self._index_data is not None:
+            self._index_data.close()
+            self._index_file.close()
+            self._index_data = None
+
+    def __len__(self):
+        """ returns the number of games in the file """
+        return len(self._offsets)
+
+    def get_game(self, game_number):
+        """ returns the (move indices, result) of one game, see decode_game """
+        return decode_game(self._data, self._offsets[game_number])
+
+    def __getitem__(self, game_number):
+        return self.get_game(game_number)
+
+    def __iter__(self):
+        """ yields every game in order, see decode_game """
+        data = self._data
+        for offset in self._offsets:
+            yield decode_game(data, offset)
+
+    def close(self):
+        """ unmaps and closes the files """
+        self._close_index()
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+def read_games(path):
+    """
+    Yields the (moves, result) pairs of every game in a file, whichever format it's in.
+    :param path: a self-play JSON lines file (ending in .jsonl), whose moves come out as
+        (position, sub_board, rotation) triples, or a game record file, whose moves come out as move indices
+    """
+    if path.endswith('.jsonl'):
+        with open(path) as games:
+            for line in games:
+                if line.strip():
+                    record = json.loads(line)
+                    yield [tuple(move) for move in record['moves']], record['result']
+    else:
+        with GameRecordReader(path) as reader:
+            yield from reader
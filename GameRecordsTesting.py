@@ -0,0 +1,139 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+from Pentago import *
+from GameRecords import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _random_game(rng):
+    """ plays a random game and returns its (move indices, result) """
+    game = Pentago()
+    moves = []
+    while game.get_game_state() == 'UNFINISHED':
+        moves.append(rng.choice(game.get_legal_move_indices()))
+        game.apply_move(moves[-1])
+    return moves, game.get_game_state()
+
+
+class GameRecordsTestCase(unittest.TestCase):
+    def test_encode_and_decode(self):
+        moves = [move_to_index('a2', 1, 'C'), 287, 0]
+        data = encode_game(moves, 'UNFINISHED')
+        self.assertEqual(len(data), 2 + 4)
+        self.assertEqual(decode_game(data), (moves, 'UNFINISHED'))
+
+        # triples work too, and a full game fits in under 45 bytes
+        triples = [index_to_move(move) for move in range(0, 288, 8)]
+        data = encode_game(triples, 'DRAW')
+        self.assertEqual(len(data), 43)
+        self.assertEqual(decode_game(data), (list(range(0, 288, 8)), 'DRAW'))
+
+        if np is not None:
+            self.assertEqual(encode_game(np.array(moves), 'UNFINISHED'), encode_game(moves, 'UNFINISHED'))
+
+    def test_write_and_read(self):
+        rng = random.Random(2)
+        games = [_random_game(rng) for _ in range(50)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.pgr')
+            with GameRecordWriter(path) as writer:
+                for moves, result in games[:30]:
+                    writer.write(moves, result)
+            with GameRecordWriter(path, append=True) as writer:
+                for moves, result in games[30:]:
+                    writer.write(moves, result)
+
+            with GameRecordReader(path) as reader:
+                self.assertEqual(len(reader), 50)
+                self.assertEqual(list(reader), games)
+                self.assertEqual(reader[37], games[37])
+                self.assertEqual(reader.get_game(0), games[0])
+
+            # without the index the reader finds the games itself
+            os.remove(path + '.idx')
+            with GameRecordReader(path) as reader:
+                self.assertEqual(len(reader), 50)
+                self.assertEqual(reader[49], games[49])
+
+            # an index that doesn't match the records is rebuilt instead of trusted
+            with GameRecordWriter(path) as writer:
+                writer.write(*games[0])
+            os.remove(path + '.idx')
+            with GameRecordWriter(path, append=True) as writer:
+                writer.write(*games[1])
+                writer.write(*games[2])
+            with open(path + '.idx', 'rb') as index:
+                self.assertEqual(len(index.read()), 3 * 8)
+            with GameRecordReader(path) as reader:
+                self.assertEqual(list(reader), games[:3])
+                self.assertEqual(reader[2], games[2])
+
+            with open(path + '.idx', 'rb') as index:
+                old_index = index.read(8)
+            with GameRecordWriter(path, append=True) as writer:
+                writer.write(*games[3])
+            for stale in (old_index, old_index + b'\0' * 4, b'\0' * 16, b''):
+                with open(path + '.idx', 'wb') as index:
+                    index.write(stale)
+                with GameRecordReader(path) as reader:
+                    self.assertEqual(len(reader), 4)
+                    self.assertEqual(reader[3], games[3])
+                with GameRecordWriter(path, append=True) as writer:
+                    writer.write(*games[4])
+                with GameRecordReader(path) as reader:
+                    self.assertEqual(list(reader), games[:5])
+                    self.assertEqual(reader[4], games[4])
+                with GameRecordWriter(path) as writer:
+                    for moves, result in games[:4]:
+                        writer.write(moves, result)
+
+            # a writer killed partway through a game leaves part of it at the end of the file
+            with GameRecordWriter(path) as writer:
+                for moves, result in games[:3]:
+                    writer.write(moves, result)
+            with open(path, 'ab') as records:
+                records.write(encode_game(*games[3])[:-1])
+            with GameRecordReader(path) as reader:
+                self.assertEqual(list(reader), games[:3])
+            with GameRecordWriter(path, append=True) as writer:
+                writer.write(*games[4])
+            with GameRecordReader(path) as reader:
+                self.assertEqual(list(reader), games[:3] + games[4:5])
+            os.remove(path + '.idx')
+            with GameRecordReader(path) as reader:
+                self.assertEqual(list(reader), games[:3] + games[4:5])
+
+            with open(path, 'wb') as not_records:
+                not_records.write(b'hello')
+            self.assertRaises(ValueError, GameRecordReader, path)
+
+
+    def test_read_games(self):
+        rng = random.Random(4)
+        games = [_random_game(rng) for _ in range(5)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.pgr')
+            with GameRecordWriter(path) as writer:
+                for moves, result in games:
+                    writer.write(moves, result)
+            self.assertEqual(list(read_games(path)), games)
+
+            # self-play files give the moves as triples, with blank lines skipped
+            path = os.path.join(directory, 'games.jsonl')
+            with open(path, 'w') as output:
+                for number, (moves, result) in enumerate(games):
+                    output.write(json.dumps({'game': number, 'moves': [index_to_move(move) for move in moves],
+                                             'result': result}) + '\n\n')
+            self.assertEqual(list(read_games(path)),
+                             [([index_to_move(move) for move in moves], result) for moves, result in games])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,394 @@
+# Description: An asyncio server that hosts many Pentago games at once. Clients talk to it with one
+#       JSON object per line over TCP or a Unix socket. Run it with: python GameServer.py --help
+#
+# Every request is an object with an 'op' and, optionally, an 'id' that's copied into the reply.
+#       Replies have 'ok' set to true, or false with an 'error' string. The ops are:
+#   create                                          starts a game, replies with its 'game' number
+#   move     game, color, position, sub_board, rotation
+#                                                   calls make_move, replies with its 'result'
+#                                                   (true or one of make_move's strings)
+#   ai_move  game, time_limit (optional)            lets the search engine move for whoever's turn it
+#                                                   is, replies with the 'move' and the 'result'. The
+#                                                   time limit is cut to between 0 and the server's.
+#   state    game                                   replies with get_game_state() as 'state'
+#   board    game                                   replies with a snapshot: 'board', 'state', 'turn'
+#                                                   and 'num_turns_taken'
+#   watch    game                                   sends this connection an 'update' event with a
+#                                                   snapshot after every move in the game
+#   unwatch  game                                   stops the updates
+#   end      game                                   removes the game
+# Events sent to spectators have an 'event' instead of 'ok': 'update' after a move, and 'ended' when
+#       the game is removed or evicted for being idle.
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from Pentago import Pentago, index_to_move
+from AlphaBetaEngine import AlphaBetaEngine
+from GamePool import GamePool
+
+# the search engine of each executor worker, built once and reused. It's kept per thread, since an engine
+#       can only run one search at a time and a thread pool's workers all share this module.
+_workers = threading.local()
+
+
+def _choose_move(black, white, num_turns_taken, time_limit):
+    """ picks a move index for a position, run in the executor so the event loop never waits on the search """
+    engine = getattr(_workers, 'engine', None)
+    if engine is None:
+        engine = _workers.engine = AlphaBetaEngine()
+    game = Pentago()
+    game.set_position(black, white, num_turns_taken)
+    return engine.search(game, time_limit=time_limit)['move_index']
+
+
+class _RequestError(Exception):
+    """ raised while handling a request to send back an error reply """
+
+
+def _read_move(request):
+    """ returns the (color, position, sub_board, rotation) in a move request, checked so make_move can't fail on it """
+    color = request.get('color')
+    position = request.get('position')
+    sub_board = request.get('sub_board')
+    rotation = request.get('rotation')
+    if (color not in ('black', 'white') or not isinstance(position, str) or len(position) != 2
+            or position[0].lower() not in 'abcdef' or position[1] not in '012345'
+            or type(sub_board) is not int or sub_board not in (1, 2, 3, 4) or rotation not in ('C', 'A')):
+        raise _RequestError('a move needs a color, position, sub_board, and rotation')
+    return color, position, sub_board, rotation
+
+
+def _read_time_limit(request, most):
+    """ returns an ai_move request's time limit, from 0 to most seconds """
+    time_limit = request.get('time_limit', most)
+    # bool is an int too, and NaN would never run out
+    if type(time_limit) not in (int, float) or not math.isfinite(time_limit):
+        raise _RequestError('time_limit must be a number of seconds')
+    return max(0.0, min(float(time_limit), most))
+
+
+def _snapshot(game):
+    """ returns the parts of a game a client can ask about, ready to be sent as JSON """
+    return {'board': game.get_board(), 'state': game.get_game_state(), 'turn': game.get_whose_turn(),
+            'num_turns_taken': game.get_num_turns_taken()}
+
+
+class _HostedGame:
+    """ one game on the server and the connections watching it. The position is kept in the server's GamePool. """
+
+    __slots__ = ('handle', 'spectators', 'last_active', 'is_thinking')
+
+    def __init__(self, handle, now):
+        """ a game in the pool slot handle, last active at loop time now """
+        self.handle = handle
+        self.spectators = set()
+        self.last_active = now
+        self.is_thinking = False
+
+
+class _Connection:
+    """
+    One client connection. Everything sent to the client goes through a bounded queue that a writer
+    task drains, waiting for the socket each time, so a slow client can't make the server buffer
+    without limit.
+    """
+
+    __slots__ = ('writer', 'outgoing', 'watching', 'sender', 'handler')
+
+    def __init__(self, writer, queue_size):
+        """ wraps a stream writer, the writer task is started by the server """
+        self.writer = writer
+        self.outgoing = asyncio.Queue(queue_size)
+        self.watching = set()
+        self.sender = None
+        self.handler = None
+
+
+class GameServer:
+    """
+    Hosts games for any number of connections on one event loop. Replies to a connection are sent in
+    the order its requests came in, and a connection's next request isn't read until its last reply
+    has room in the send queue, so a client that doesn't read its replies stops being served instead
+    of piling them up. A spectator that falls a whole queue behind on updates is disconnected.
+    """
+
+    def __init__(self, idle_timeout=600.0, max_games=None, ai_time_limit=1.0, executor=None, queue_size=64):
+        """
+        :param idle_timeout: seconds without a request before a game is removed
+        :param max_games: most games hosted at once, or None for no limit
+        :param ai_time_limit: most seconds of search an ai_move may ask for
+        :param executor: a concurrent.futures executor for the search. Defaults to a process pool,
+            which is shut down with the server.
+        :param queue_size: most messages waiting to be sent to one connection
+        """
+        self._idle_timeout = idle_timeout
+        self._max_games = max_games
+        self._ai_time_limit = ai_time_limit
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._queue_size = queue_size
+        self._games = {}
+        self._pool = GamePool()
+        self._game_numbers = itertools.count(1)
+        self._connections = set()
+        self._server = None
+        self._evictor = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+        Starts listening, on a Unix socket if path is given and on TCP otherwise.
+        :return: the address being listened on, (host, port) for TCP or the socket path
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor()
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_connection, path)
+        else:
+            self._server = await asyncio.start_server(self._serve_connection, host, port)
+        self._evictor = asyncio.get_running_loop().create_task(self._evict_idle_games())
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self):
+        """ serves until the task is cancelled """
+        await self._server.serve_forever()
+
+    async def close(self):
+        """ stops listening, disconnects every client, and shuts down the executor if the server made it """
+        self._evictor.cancel()
+        self._server.close()
+        connections = list(self._connections)
+        for connection in connections:
+            self._disconnect(connection)
+        await asyncio.gather(*(connection.handler for connection in connections), return_exceptions=True)
+        await self._server.wait_closed()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_num_games(self):
+        """ returns the number of games being hosted """
+        return len(self._games)
+
+    async def _serve_connection(self, reader, writer):
+        """ reads one request per line and replies to each, until the client hangs up """
+        connection = _Connection(writer, self._queue_size)
+        connection.handler = asyncio.current_task()
+        connection.sender = asyncio.get_running_loop().create_task(self._send(connection))
+        self._connections.add(connection)
+        try:
+            while not writer.is_closing():
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self._handle_line(connection, line)
+                await connection.outgoing.put(reply)
+        except (ConnectionError, ValueError):
+            # ValueError is a line longer than the stream reader's limit
+            pass
+        except asyncio.CancelledError:
+            # the connection was dropped by _disconnect, maybe while this was waiting for room in the queue
+            pass
+        finally:
+            self._connections.discard(connection)
+            for game_number in connection.watching:
+                if game_number in self._games:
+                    self._games[game_number].spectators.discard(connection)
+            connection.sender.cancel()
+            writer.close()
+
+    async def _send(self, connection):
+        """ writes the connection's queued messages, one at a time, waiting for the socket between them """
+        try:
+            while True:
+                message = await connection.outgoing.get()
+                connection.writer.write(json.dumps(message).encode() + b'\n')
+                await connection.writer.drain()
+        except ConnectionError:
+            # the handler may be waiting for room in the queue, which will never come now
+            self._disconnect(connection)
+
+    @staticmethod
+    def _disconnect(connection):
+        """
+        drops a connection right away, without sending what's queued or buffered for it, and stops its
+        handler. Closing the writer instead would wait for a client that isn't reading.
+        """
+        connection.writer.transport.abort()
+        if connection.handler is not asyncio.current_task():
+            connection.handler.cancel()
+
+    async def _handle_line(self, connection, line):
+        """ decodes one request and returns the reply """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'ok': False, 'error': 'not valid JSON'}
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'requests must be JSON objects'}
+        handler = self._HANDLERS.get(request.get('op'))
+        try:
+            if handler is None:
+                raise _RequestError('unknown op: {}'.format(request.get('op')))
+            reply = await handler(self, connection, request)
+        except _RequestError as error:
+            reply = {'ok': False, 'error': str(error)}
+        else:
+            reply['ok'] = True
+        if 'id' in request:
+            reply['id'] = request['id']
+        return reply
+
+    def _get_hosted(self, request):
+        """ returns the game a request names and marks it as active """
+        game_number = request.get('game')
+        if type(game_number) is not int:
+            raise _RequestError('a request needs a game number')
+        hosted = self._games.get(game_number)
+        if hosted is None:
+            raise _RequestError('no such game: {}'.format(request.get('game')))
+        hosted.last_active = asyncio.get_running_loop().time()
+        return hosted
+
+    def _broadcast(self, game_number, event):
+        """ queues an event for every spectator of a game, disconnecting any that are a full queue behind """
+        for connection in list(self._games[game_number].spectators):
+            try:
+                connection.outgoing.put_nowait(event)
+            except asyncio.QueueFull:
+                self._disconnect(connection)
+
+    async def _create(self, connection, request):
+        """ starts a new game """
+        if self._max_games is not None and len(self._games) >= self._max_games:
+            raise _RequestError('too many games')
+        game_number = next(self._game_numbers)
+        self._games[game_number] = _HostedGame(self._pool.allocate(), asyncio.get_running_loop().time())
+        return {'game': game_number}
+
+    async def _move(self, connection, request):
+        """ plays a move with make_move and tells the spectators """
+        hosted = self._get_hosted(request)
+        if hosted.is_thinking:
+            raise _RequestError('the engine is moving in this game')
+        game = self._pool.get_game(hosted.handle)
+        num_turns_taken = game.get_num_turns_taken()
+        result = game.make_move(*_read_move(request))
+        # make_move also says 'game is finished' for the move that finishes it
+        if game.get_num_turns_taken() != num_turns_taken:
+            self._broadcast(request['game'], dict(_snapshot(game), event='update', game=request['game']))
+        return {'result': result}
+
+    async def _ai_move(self, connection, request):
+        """ searches in the executor, then plays the move it found """
+        hosted = self._get_hosted(request)
+        time_limit = _read_time_limit(request, self._ai_time_limit)
+        game = self._pool.get_game(hosted.handle)
+        if hosted.is_thinking:
+            raise _RequestError('the engine is moving in this game')
+        if game.get_game_state() != 'UNFINISHED':
+            return {'result': 'game is finished', 'move': None}
+        hosted.is_thinking = True
+        try:
+            move_index = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _choose_move, *game.get_bitboards(), game.get_num_turns_taken(), time_limit)
+        finally:
+            hosted.is_thinking = False
+        if request['game'] not in self._games:
+            raise _RequestError('the game ended while the engine was moving')
+        move = index_to_move(move_index)
+        result = game.make_move(game.get_whose_turn(), *move)
+        self._broadcast(request['game'], dict(_snapshot(game), event='update', game=request['game']))
+        return {'result': result, 'move': list(move)}
+
+    async def _state(self, connection, request):
+        """ returns the game state """
+        return {'state': self._pool.get_game(self._get_hosted(request).handle).get_game_state()}
+
+    async def _board(self, connection, request):
+        """ returns a snapshot of the game """
+        return _snapshot(self._pool.get_game(self._get_hosted(request).handle))
+
+    async def _watch(self, connection, request):
+        """ subscribes the connection to the game's updates """
+        self._get_hosted(request).spectators.add(connection)
+        connection.watching.add(request['game'])
+        return {}
+
+    async def _unwatch(self, connection, request):
+        """ unsubscribes the connection from the game's updates """
+        self._get_hosted(request).spectators.discard(connection)
+        connection.watching.discard(request['game'])
+        return {}
+
+    async def _end(self, connection, request):
+        """ removes the game """
+        self._get_hosted(request)
+        self._end_game(request['game'])
+        return {}
+
+    def _end_game(self, game_number):
+        """ removes a game and tells its spectators """
+        self._broadcast(game_number, {'event': 'ended', 'game': game_number})
+        hosted = self._games.pop(game_number)
+        self._pool.free(hosted.handle)
+        for connection in hosted.spectators:
+            connection.watching.discard(game_number)
+
+    async def _evict_idle_games(self):
+        """ removes games nobody has sent a request about for idle_timeout seconds """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self._idle_timeout / 4, 60.0))
+            cutoff = loop.time() - self._idle_timeout
+            for game_number in [number for number, hosted in self._games.items()
+                                if hosted.last_active < cutoff and not hosted.is_thinking]:
+                self._end_game(game_number)
+
+    _HANDLERS = {
+        'create': _create,
+        'move': _move,
+        'ai_move': _ai_move,
+        'state': _state,
+        'board': _board,
+        'watch': _watch,
+        'unwatch': _unwatch,
+        'end': _end,
+    }
+
+
+async def _run(args):
+    """ starts a server and runs it until interrupted """
+    server = GameServer(idle_timeout=args.idle_timeout, max_games=args.max_games, ai_time_limit=args.ai_time_limit)
+    address = await server.start(args.host, args.port, args.unix)
+    print('listening on {}'.format(address), file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Host Pentago games over a JSON lines protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--idle-timeout', type=float, default=600.0, help='seconds before an idle game is removed')
+    parser.add_argument('--max-games', type=int, default=None)
+    parser.add_argument('--ai-time-limit', type=float, default=1.0, help='most seconds the engine may think')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from Pentago import *
+from GameServer import *
+from GameServer import _choose_move, _workers
+
+
+class Client:
+    """ a test client that sends one request at a time and collects spectator events separately """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        return await self.read()
+
+    async def read(self):
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+
+    def close(self):
+        self.writer.close()
+
+
+def _engine_after_move(time_limit):
+    """ chooses an opening move in this thread and returns the id of the engine that searched it """
+    _choose_move(0, 0, 0, time_limit)
+    return id(_workers.engine)
+
+
+class GameServerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executor = ThreadPoolExecutor(2)
+        self.server = GameServer(idle_timeout=60, max_games=3, ai_time_limit=0.2, executor=self.executor)
+        self.host, self.port = await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.executor.shutdown()
+
+    async def connect(self):
+        return Client(*await asyncio.open_connection(self.host, self.port))
+
+    async def test_play_a_game(self):
+        client = await self.connect()
+        reply = await client.request(op='create', id=7)
+        self.assertEqual(reply, {'ok': True, 'game': 1, 'id': 7})
+
+        move = {'op': 'move', 'game': 1, 'color': 'black', 'position': 'a0', 'sub_board': 4, 'rotation': 'C'}
+        self.assertEqual(await client.request(**move), {'ok': True, 'result': True})
+        # make_move's strings come back as they are
+        self.assertEqual((await client.request(**move))['result'], "not this player's turn")
+        move['color'] = 'white'
+        self.assertEqual((await client.request(**move))['result'], 'position is not empty')
+
+        self.assertEqual(await client.request(op='state', game=1), {'ok': True, 'state': 'UNFINISHED'})
+        snapshot = await client.request(op='board', game=1)
+        self.assertEqual(snapshot['board'][0][0], 'black')
+        self.assertEqual((snapshot['turn'], snapshot['num_turns_taken']), ('white', 1))
+
+        reply = await client.request(op='ai_move', game=1)
+        self.assertTrue(reply['result'])
+        self.assertEqual(len(reply['move']), 3)
+        self.assertEqual((await client.request(op='board', game=1))['turn'], 'black')
+        client.close()
+
+    async def test_errors(self):
+        client = await self.connect()
+        client.writer.write(b'{not json\n')
+        self.assertEqual(await client.read(), {'ok': False, 'error': 'not valid JSON'})
+        self.assertFalse((await client.request(op='fly'))['ok'])
+        self.assertEqual((await client.request(op='state', game=99))['error'], 'no such game: 99')
+        await client.request(op='create')
+        reply = await client.request(op='move', game=1, color='black', position='z9', sub_board=1, rotation='C')
+        self.assertFalse(reply['ok'])
+        reply = await client.request(op='move', game=1, color='black', position='a0', sub_board=5, rotation='C')
+        self.assertFalse(reply['ok'])
+        self.assertEqual((await client.request(op='board', game=1))['num_turns_taken'], 0)
+
+        await client.request(op='create')
+        await client.request(op='create')
+        self.assertEqual(await client.request(op='create'), {'ok': False, 'error': 'too many games'})
+        client.close()
+
+    async def test_bad_values(self):
+        client = await self.connect()
+        await client.request(op='create')
+        # every bad value gets an error reply, and the connection keeps working
+        for game in ([1], None, '1', 1.0, True, {'a': 1}):
+            reply = await client.request(op='state', game=game)
+            self.assertEqual(reply, {'ok': False, 'error': 'a request needs a game number'})
+        for time_limit in (float('nan'), float('inf'), None, 'x', [1], True):
+            # json.dumps writes NaN and Infinity, which json.loads reads back
+            reply = await client.request(op='ai_move', game=1, time_limit=time_limit)
+            self.assertEqual(reply, {'ok': False, 'error': 'time_limit must be a number of seconds'})
+        for field, value in (('sub_board', True), ('sub_board', [1]), ('position', ['a', '0']),
+                             ('color', None), ('rotation', 1)):
+            move = {'game': 1, 'color': 'black', 'position': 'a0', 'sub_board': 1, 'rotation': 'C', field: value}
+            self.assertFalse((await client.request(op='move', **move))['ok'])
+        self.assertEqual((await client.request(op='board', game=1))['num_turns_taken'], 0)
+
+        # out of range limits are cut to the server's range
+        self.assertTrue((await client.request(op='ai_move', game=1, time_limit=-5))['ok'])
+        self.assertTrue((await client.request(op='ai_move', game=1, time_limit=1e9))['ok'])
+        self.assertEqual((await client.request(op='board', game=1))['num_turns_taken'], 2)
+        client.close()
+
+    async def test_ai_moves_at_once(self):
+        client = await self.connect()
+        other = await self.connect()
+        games = [(await client.request(op='create'))['game'] for _ in range(2)]
+        # both searches run at the same time in the executor's two threads, with limits that all differ
+        replies = await asyncio.gather(client.request(op='ai_move', game=games[0], time_limit=0.1),
+                                       other.request(op='ai_move', game=games[1], time_limit=0.11))
+        self.assertTrue(all(reply['ok'] for reply in replies))
+
+        # each worker thread keeps a single engine whatever the time limits are
+        engines = {_engine_after_move(time_limit) for time_limit in (0.01, 0.011, 0.0111)}
+        self.assertEqual(len(engines), 1)
+        client.close()
+        other.close()
+
+    async def stop_reading(self, server):
+        """ connects a client that sends requests without reading the replies, until the server is stuck """
+        host, port = await server.start()
+        client = socket.socket()
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        client.connect((host, port))
+        reader, writer = await asyncio.open_connection(sock=client)
+        writer.write(json.dumps({'op': 'create'}).encode() + b'\n')
+        writer.write((json.dumps({'op': 'board', 'game': 1}).encode() + b'\n') * 200000)
+        # wait for the send queue to fill up with everything past it backed up
+        for _ in range(200):
+            connection = next(iter(server._connections), None)
+            if connection is not None and connection.outgoing.full() and connection.writer.transport.get_write_buffer_size():
+                break
+            await asyncio.sleep(0.05)
+        self.assertTrue(connection.outgoing.full())
+        return writer
+
+    async def test_client_that_stops_reading(self):
+        # the client resets the connection while the server is waiting for room to send
+        server = GameServer(executor=self.executor, queue_size=2)
+        writer = await self.stop_reading(server)
+        writer.transport.abort()
+        for _ in range(40):
+            if not server._connections:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(len(server._connections), 0)
+        await asyncio.wait_for(server.close(), 5)
+
+        # the server closes while the client still isn't reading
+        server = GameServer(executor=self.executor, queue_size=2)
+        writer = await self.stop_reading(server)
+        await asyncio.wait_for(server.close(), 5)
+        self.assertEqual(len(server._connections), 0)
+        writer.close()
+
+    async def test_spectators(self):
+        player = await self.connect()
+        spectator = await self.connect()
+        game = (await player.request(op='create'))['game']
+        self.assertTrue((await spectator.request(op='watch', game=game))['ok'])
+
+        await player.request(op='move', game=game, color='black', position='c2', sub_board=1, rotation='A')
+        update = await spectator.read()
+        self.assertEqual(update['event'], 'update')
+        self.assertEqual(update['game'], game)
+        self.assertEqual(update['board'][0][2], 'black')
+        self.assertEqual(update['turn'], 'white')
+
+        # a refused move isn't sent out
+        await player.request(op='move', game=game, color='black', position='d2', sub_board=1, rotation='A')
+        await player.request(op='end', game=game)
+        self.assertEqual(await spectator.read(), {'event': 'ended', 'game': game})
+        self.assertEqual(self.server.get_num_games(), 0)
+        player.close()
+        spectator.close()
+
+    async def test_idle_games_are_evicted(self):
+        server = GameServer(idle_timeout=0.2, executor=self.executor)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'pentago.sock')
+        self.assertEqual(await server.start(path=path), path)
+        client = Client(*await asyncio.open_unix_connection(path))
+        game = (await client.request(op='create'))['game']
+        await client.request(op='watch', game=game)
+        await client.request(op='create')
+        self.assertEqual(server.get_num_games(), 2)
+        self.assertEqual(await client.read(), {'event': 'ended', 'game': game})
+        # the other game may be a check later than the watched one
+        for _ in range(40):
+            if server.get_num_games() == 0:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(server.get_num_games(), 0)
+        client.close()
+        await server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+# Description: A Monte Carlo tree search player for Pentago that spreads its playouts over a process pool.
+
+import copy
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from Pentago import BOARD_MASK, index_to_move, winning_squares
+
+
+def random_playout(game, rng=random):
+    """
+    Plays random legal moves until the game is over and returns the final game state. The game passed
+    in is changed, so hand it a copy if the position is still needed.
+    :param rng: a random.Random to draw moves from
+    """
+    while game.get_game_state() == 'UNFINISHED':
+        black, white = game.get_bitboards()
+        empty = ~(black | white) & BOARD_MASK
+        squares = [index for index in range(36) if empty >> index & 1]
+        game.apply_move(rng.choice(squares) * 8 + rng.randrange(8))
+    return game.get_game_state()
+
+
+class _Node:
+    """ one position in the search tree, reached by playing move from its parent """
+
+    __slots__ = ('move', 'parent', 'untried_moves', 'is_black_move', 'children', 'visits', 'wins')
+
+    def __init__(self, move, parent, untried_moves, is_black_move):
+        """
+        :param move: move index played to get here, or None at the root
+        :param untried_moves: legal move indices that don't have a child yet
+        :param is_black_move: True if black played move, so wins here are counted for black
+        """
+        self.move = move
+        self.parent = parent
+        self.untried_moves = untried_moves
+        self.is_black_move = is_black_move
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+
+
+def _search_tree(game, playouts, time_limit, exploration, seed):
+    """
+    Grows one UCT tree from the game's position until it has run the given number of playouts or
+    the time limit passes. This runs inside a worker process.
+    :return: a ({move index: (visits, wins)} dict for the root's children, playouts run) tuple. Wins are
+        counted for the player to move at the root, with a draw counting as half.
+    """
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_limit if time_limit else None
+    root = _Node(None, None, game.get_legal_move_indices(merge_identical=True),
+                 game.get_whose_turn() == 'white')
+    count = 0
+
+    while count < playouts and (deadline is None or time.monotonic() < deadline):
+        node = root
+        tokens = []
+
+        # selection: follow the best upper confidence bound down to a node with moves left to try
+        while not node.untried_moves and node.children:
+            log_visits = math.log(node.visits)
+            node = max(node.children, key=lambda child: child.wins / child.visits
+                       + exploration * math.sqrt(log_visits / child.visits))
+            tokens.append(game.apply_move(node.move))
+
+        # expansion
+        if node.untried_moves:
+            move = node.untried_moves.pop(rng.randrange(len(node.untried_moves)))
+            is_black_move = game.get_whose_turn() == 'black'
+            tokens.append(game.apply_move(move))
+            if game.get_game_state() == 'UNFINISHED':
+                untried_moves = game.get_legal_move_indices(merge_identical=True)
+            else:
+                untried_moves = []
+            child = _Node(move, node, untried_moves, is_black_move)
+            node.children.append(child)
+            node = child
+
+        # simulation
+        state = random_playout(copy.copy(game), rng)
+
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            if state == 'DRAW':
+                node.wins += 0.5
+            elif (state == 'BLACK_WON') == node.is_black_move:
+                node.wins += 1
+            node = node.parent
+
+        for token in reversed(tokens):
+            game.unmake_move(token)
+        count += 1
+
+    return {child.move: (child.visits, child.wins) for child in root.children}, count
+
+
+class MCTSEngine:
+    """
+    Picks moves for whichever player's turn it is with Monte Carlo tree search (UCT) and random playouts.
+    The search uses root parallelism: each worker process grows its own tree from the same position,
+    and the visit counts for the root's moves are added up across workers at the end, so more cores
+    give more playouts in the same amount of time.
+    """
+
+    __slots__ = ('_playouts', '_time_limit', '_processes', '_exploration', '_rng', '_pool')
+
+    def __init__(self, playouts=10000, time_limit=None, processes=None, exploration=1.4, seed=None):
+        """
+        :param playouts: total playouts per move, split evenly between the workers
+        :param time_limit: seconds allowed per move, or None to always run every playout. Whichever
+            limit is hit first ends the search.
+        :param processes: number of worker processes, defaults to one per core. With 1 the search
+            runs in this process and no pool is started.
+        :param exploration: the UCT exploration constant
+        :param seed: seed for the playouts, or None for a different game every time
+        """
+        self._playouts = playouts
+        self._time_limit = time_limit
+        self._processes = processes or os.cpu_count() or 1
+        self._exploration = exploration
+        self._rng = random.Random(seed)
+        self._pool = None
+
+    def close(self):
+        """ shuts down the worker processes, if any were started """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def find_best_move(self, game):
+        """ returns the best (position, sub_board, rotation) found for the player whose turn it is, or None """
+        return self.search(game)['move']
+
+    def search(self, game):
+        """
+        Searches the position without changing the game that's passed in.
+        :return: a dict with the best 'move' as a (position, sub_board, rotation) triple (None if the game
+            is over), its 'move_index', its 'value' (the share of its playouts the player to move won, with
+            draws counting half), the number of 'playouts' run, the 'time' taken in seconds, and the
+            'visits' for every root move as a {move index: visits} dict.
+        """
+        start = time.monotonic()
+        if game.get_game_state() != 'UNFINISHED':
+            return {'move': None, 'move_index': -1, 'value': 0.0, 'playouts': 0, 'time': 0.0, 'visits': {}}
+
+        # a move that wins on the spot can't be beaten, so there is nothing to search
+        black, white = game.get_bitboards()
+        mover, opponent = (black, white) if game.get_whose_turn() == 'black' else (white, black)
+        winning = winning_squares(mover, opponent)
+        if winning:
+            move_index = ((winning & -winning).bit_length() - 1) * 8
+            return {'move': index_to_move(move_index), 'move_index': move_index, 'value': 1.0, 'playouts': 0,
+                    'time': time.monotonic() - start, 'visits': {}}
+
+        playouts_per_worker = -(-self._playouts // self._processes)
+        arguments = [(copy.copy(game), playouts_per_worker, self._time_limit, self._exploration,
+                      self._rng.getrandbits(64)) for _ in range(self._processes)]
+        if self._processes == 1:
+            results = [_search_tree(*arguments[0])]
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self._processes)
+            results = list(self._pool.map(_search_tree, *zip(*arguments)))
+
+        visits = {}
+        wins = {}
+        playouts = 0
+        for children, count in results:
+            playouts += count
+            for move, (child_visits, child_wins) in children.items():
+                visits[move] = visits.get(move, 0) + child_visits
+                wins[move] = wins.get(move, 0.0) + child_wins
+
+        # the most visited move is the most robust choice. If the time ran out before a single
+        #       playout finished, fall back on any legal move.
+        if visits:
+            best_move = max(visits, key=visits.get)
+            value = wins[best_move] / visits[best_move]
+        else:
+            best_move = game.get_legal_move_indices()[0]
+            value = 0.5
+        return {
+            'move': index_to_move(best_move),
+            'move_index': best_move,
+            'value': value,
+            'playouts': playouts,
+            'time': time.monotonic() - start,
+            'visits': visits,
+        }
@@ -0,0 +1,51 @@
+import random
+import unittest
+from Pentago import *
+from MCTSEngine import *
+
+
+class MCTSEngineTestCase(unittest.TestCase):
+    def test_random_playout(self):
+        game = Pentago()
+        state = random_playout(game, random.Random(1))
+        self.assertNotEqual(state, 'UNFINISHED')
+        self.assertEqual(state, game.get_game_state())
+
+    def test_takes_immediate_win(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+        move = MCTSEngine(playouts=100, processes=1, seed=1).find_best_move(game)
+        self.assertIn(move[0], ['a0', 'a5'])
+
+    def test_search(self):
+        game = Pentago()
+        game.make_move('black', 'b1', 1, 'C')
+        result = MCTSEngine(playouts=300, processes=1, seed=1).search(game)
+        self.assertEqual(result['playouts'], 300)
+        self.assertEqual(sum(result['visits'].values()), 300)
+        self.assertIn(result['move'], game.get_legal_moves())
+        self.assertTrue(0 <= result['value'] <= 1)
+        # the game passed in isn't changed
+        self.assertEqual(game.get_whose_turn(), 'white')
+
+    def test_process_pool(self):
+        game = Pentago()
+        engine = MCTSEngine(playouts=200, processes=2, seed=1)
+        try:
+            result = engine.search(game)
+            result = engine.search(game)
+        finally:
+            engine.close()
+        self.assertEqual(result['playouts'], 200)
+        self.assertIn(result['move'], game.get_legal_moves())
+
+    def test_time_limit(self):
+        game = Pentago()
+        result = MCTSEngine(playouts=10 ** 9, time_limit=0.2, processes=1).search(game)
+        self.assertLess(result['time'], 1.0)
+        self.assertIn(result['move'], game.get_legal_moves())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+# Description: An opening book of best moves for the first few plies, keyed by canonical position and
+#       read lazily through mmap. Run it with: python OpeningBook.py --help
+
+import argparse
+import sys
+from multiprocessing import Pool
+
+from Pentago import (Pentago, canonical_key, canonical_symmetry, inverse_symmetry, move_to_index,
+                     transform_bitboard, transform_move_index)
+from AlphaBetaEngine import AlphaBetaEngine
+from GameRecords import read_games
+from PositionTable import PositionTable, record_layout, write_table
+
+# Every book file starts with these bytes.
+MAGIC = b'POB1'
+
+# The file is a PositionTable that keeps the number of plies the book covers in its header, with
+#       _FROM_GAMES added for books built from games. A record holds the position's ply, the best move
+#       in the canonical orientation, the move's value, and how many games or searches the value comes from.
+_RECORD = record_layout('BHiI')
+_FROM_GAMES = 1 << 16
+
+# the search engine used by each worker process, built once and reused
+_engines = {}
+
+
+def _canonical_move(black, white, move_index):
+    """
+    Returns (canonical key, move index in the canonical orientation). When the position is symmetric
+    several symmetries reach the canonical orientation, so the smallest of their moves is used and
+    the same move always comes out the same.
+    """
+    key = canonical_key(black, white)
+    return key, min(transform_move_index(move_index, symmetry) for symmetry in range(8)
+                    if transform_bitboard(black, symmetry) << 36 | transform_bitboard(white, symmetry) == key)
+
+
+def opening_positions(plies):
+    """
+    Returns (black, white) bitboards for one of each unfinished position, up to symmetry, that can come
+    up in the first plies moves of a game, so with 0 to plies - 1 marbles on the board.
+    """
+    game = Pentago()
+    frontier = [game.get_bitboards()]
+    positions = []
+    for _ in range(plies):
+        positions.extend(frontier)
+        seen = set()
+        next_frontier = []
+        for black, white in frontier:
+            game.set_position(black, white)
+            for move in game.get_legal_move_indices(merge_identical=True):
+                token = game.apply_move(move)
+                key = game.get_canonical_key()
+                if game.get_game_state() == 'UNFINISHED' and key not in seen:
+                    seen.add(key)
+                    next_frontier.append(game.get_bitboards())
+                game.unmake_move(token)
+        frontier = next_frontier
+    return positions
+
+
+def _search_position(arguments):
+    """ searches one opening position in a worker process """
+    black, white, time_limit, max_depth = arguments
+    key = (time_limit, max_depth)
+    if key not in _engines:
+        _engines[key] = AlphaBetaEngine(time_limit=time_limit, max_depth=max_depth)
+    game = Pentago()
+    game.set_position(black, white)
+    result = _engines[key].search(game)
+    return black, white, result['move_index'], result['value']
+
+
+def build_from_search(path, plies=2, time_limit=10.0, max_depth=36, processes=None):
+    """
+    Fills a book by searching every opening position with AlphaBetaEngine, spread over a process pool.
+    :param plies: the book covers positions from the first plies moves of a game
+    :param time_limit: seconds of search per position
+    :param processes: worker processes, defaults to one per core. With 1 everything runs in this process.
+    :return: the number of positions in the book
+    """
+    tasks = [(black, white, time_limit, max_depth) for black, white in opening_positions(plies)]
+    if processes == 1:
+        results = list(map(_search_position, tasks))
+    else:
+        with Pool(processes) as pool:
+            results = list(pool.imap_unordered(_search_position, tasks))
+    records = {}
+    for black, white, move_index, value in results:
+        # the search ran out of time before it had scored a single move
+        if value is None:
+            continue
+        key, move = _canonical_move(black, white, move_index)
+        records[key] = ((black | white).bit_count(), move, value, 1)
+    return write_table(path, MAGIC, plies, _RECORD, records)
+
+
+def build_from_games(path, games, plies=2, min_games=10):
+    """
+    Fills a book from the results of finished games, such as self-play output. For every opening
+    position, the move whose games scored best for the player making it is kept.
+    :param games: an iterable of (moves, result) pairs. moves are move indices or (position, sub_board,
+        rotation) triples, and result is the final game state string.
+    :param min_games: moves played in fewer games than this are left out
+    :return: the number of positions in the book
+    """
+    # {key: {move: [games, points, ply]}}, where a win is 2 points and a draw is 1
+    statistics = {}
+    game = Pentago()
+    for moves, result in games:
+        game.set_position(0, 0, 0)
+        for move in moves[:plies]:
+            if not isinstance(move, int):
+                move = move_to_index(*move)
+            black, white = game.get_bitboards()
+            key, canonical_move = _canonical_move(black, white, move)
+            winner = 'BLACK_WON' if game.get_whose_turn() == 'black' else 'WHITE_WON'
+            points = 1 if result == 'DRAW' else 2 if result == winner else 0
+            totals = statistics.setdefault(key, {}).setdefault(canonical_move, [0, 0, (black | white).bit_count()])
+            totals[0] += 1
+            totals[1] += points
+            game.apply_move(move)
+
+    records = {}
+    for key, moves in statistics.items():
+        best = None
+        for move, (count, points, ply) in moves.items():
+            if count < min_games:
+                continue
+            # the value is the move's score in thousandths, 1000 for always winning
+            value = points * 500 // count
+            if best is None or (value, count) > (best[2], best[3]):
+                best = (ply, move, value, count)
+        if best is not None:
+            records[key] = best
+    return write_table(path, MAGIC, plies | _FROM_GAMES, _RECORD, records)
+
+
+class OpeningBook(PositionTable):
+    """ Looks up moves in a book file made by build_from_search or build_from_games, see PositionTable """
+
+    __slots__ = ()
+
+    def __init__(self, path):
+        """ Remembers where the book is, without opening it yet """
+        super().__init__(path, MAGIC, _RECORD, 'an opening book')
+
+    def get_plies(self):
+        """ returns how many plies into the game the book covers """
+        return self.get_info() & (_FROM_GAMES - 1)
+
+    def is_built_from_games(self):
+        """
+        returns True for books made by build_from_games, whose values are scores in thousandths rather than
+        the engine's search scores
+        """
+        return bool(self.get_info() & _FROM_GAMES)
+
+    def lookup(self, game):
+        """
+        Looks up the position in a Pentago object.
+        :return: a (move index, value, count) tuple, or None if the position isn't in the book. The value
+            is the engine's score for books built by search, or the move's score in thousandths for
+            books built from games, and count is how many games it comes from (1 for search).
+        """
+        if game.get_num_turns_taken() >= self.get_plies():
+            return None
+        key, symmetry = canonical_symmetry(*game.get_bitboards())
+        record = self.find(key)
+        if record is None:
+            return None
+        ply, move, value, count = record
+        return transform_move_index(move, inverse_symmetry(symmetry)), value, count
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Build a Pentago opening book.')
+    parser.add_argument('output', help='book file to write')
+    parser.add_argument('--plies', type=int, default=2, help='how many plies into the game the book covers')
+    parser.add_argument('--games', help='build from finished games (self-play .jsonl or a game record file) '
+                                        'instead of searching')
+    parser.add_argument('--min-games', type=int, default=10, help='games a move needs to get into the book')
+    parser.add_argument('--search-time', type=float, default=10.0, help='seconds of search per position')
+    parser.add_argument('--search-depth', type=int, default=36, help='deepest search per position')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, defaults to one per core')
+    args = parser.parse_args(argv)
+
+    if args.games:
+        count = build_from_games(args.output, read_games(args.games), args.plies, args.min_games)
+    else:
+        count = build_from_search(args.output, args.plies, args.search_time, args.search_depth, args.processes)
+    print('{} positions in {}'.format(count, args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
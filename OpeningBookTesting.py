@@ -0,0 +1,106 @@
+import copy
+import os
+import tempfile
+import unittest
+from Pentago import *
+from AlphaBetaEngine import AlphaBetaEngine
+from OpeningBook import *
+
+
+class OpeningBookTestCase(unittest.TestCase):
+    def test_opening_positions(self):
+        self.assertEqual(opening_positions(1), [(0, 0)])
+        positions = opening_positions(2)
+        # every black first move, up to symmetry
+        self.assertEqual(len(positions), 7)
+        self.assertEqual(len({canonical_key(*position) for position in positions}), 7)
+
+    def test_build_from_search(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'book.bin')
+        self.assertEqual(build_from_search(path, plies=2, time_limit=60, max_depth=1, processes=1), 7)
+
+        book = OpeningBook(path)
+        self.assertEqual(len(book), 7)
+        self.assertEqual(book.get_plies(), 2)
+        # every way of reaching a position in the book gets a legal move, turned to match the board
+        game = Pentago()
+        for move in game.get_legal_move_indices():
+            token = game.apply_move(move)
+            move_index, value, count = book.lookup(game)
+            self.assertIn(move_index, game.get_legal_move_indices())
+            self.assertEqual(count, 1)
+            game.unmake_move(token)
+
+        # symmetric positions get symmetric moves
+        game.make_move('black', 'b1', 1, 'C')
+        move_index = book.lookup(game)[0]
+        mirror = Pentago()
+        mirror.set_position(*(transform_bitboard(bits, 4) for bits in game.get_bitboards()))
+        game.apply_move(move_index)
+        mirror.apply_move(book.lookup(mirror)[0])
+        self.assertEqual(mirror.get_canonical_key(), game.get_canonical_key())
+        game.set_position(*_after(move_to_index('b1', 1, 'C')))
+
+        # past the book's plies there's nothing
+        game.make_move('white', 'c2', 1, 'C')
+        self.assertIsNone(book.lookup(game))
+
+        self.assertFalse(book.is_built_from_games())
+        engine = AlphaBetaEngine(time_limit=60, opening_book=book)
+        result = engine.search(Pentago())
+        self.assertEqual(result['nodes'], 0)
+        self.assertEqual(result['value'], book.lookup(Pentago())[1])
+        self.assertNotIn('book_score', result)
+        book.close()
+
+    def test_build_from_games(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'book.bin')
+        good = move_to_index('b1', 1, 'C')
+        bad = move_to_index('a0', 2, 'A')
+        reply = move_to_index('e4', 3, 'C')
+        # playing b1 (or a mirror image of it) wins more often than a0
+        games = ([([good, reply], 'BLACK_WON')] * 6 + [([good, reply], 'WHITE_WON')] * 2
+                 + [([transform_move_index(good, 5), reply], 'BLACK_WON')] * 2
+                 + [([('a0', 2, 'A'), ('e4', 3, 'C')], 'DRAW')] * 10 + [([bad], 'WHITE_WON')] * 3)
+        # the replies to b1 and a0 get in too
+        self.assertEqual(build_from_games(path, games, plies=2, min_games=5), 3)
+
+        with OpeningBook(path) as book:
+            move_index, value, count = book.lookup(Pentago())
+            self.assertEqual((value, count), (800, 10))
+            self.assertEqual(canonical_key(*_after(move_index)), canonical_key(*_after(good)))
+
+            game = Pentago()
+            game.apply_move(good)
+            # the reply after the mirror image of b1 is the same move turned around, so it counts too
+            move_index, value, count = book.lookup(game)
+            self.assertEqual((value, count), (200, 10))
+            self.assertEqual(canonical_key(*_after(move_index, game)), canonical_key(*_after(reply, game)))
+            game = Pentago()
+            game.apply_move(bad)
+            self.assertEqual(book.lookup(game)[1:], (500, 10))
+
+            # the engine doesn't pass a share of games won off as a search score
+            self.assertTrue(book.is_built_from_games())
+            self.assertEqual(book.get_plies(), 2)
+            result = AlphaBetaEngine(opening_book=book).search(Pentago())
+            self.assertEqual((result['value'], result['book_score']), (None, 800))
+
+        with open(path, 'r+b') as broken:
+            broken.write(b'XXXX')
+        self.assertRaises(ValueError, len, OpeningBook(path))
+
+
+def _after(move_index, game=None):
+    """ returns the bitboards after playing one move, from the start or from a copy of game """
+    game = Pentago() if game is None else copy.copy(game)
+    game.apply_move(move_index)
+    return game.get_bitboards()
+
+
+if __name__ == '__main__':
+    unittest.main()
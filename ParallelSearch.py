@@ -0,0 +1,134 @@
+# Description: Lazy SMP search for Pentago: several processes search the same position at once and
+#       share what they find through one transposition table in shared memory.
+
+import os
+import threading
+import time
+from multiprocessing import Barrier, Pool
+
+from Pentago import Pentago
+from AlphaBetaEngine import AlphaBetaEngine
+from TranspositionTable import SharedTranspositionTable
+
+# the search engine of each worker process and the barrier all the workers meet at, set up once by
+#       _start_worker and reused
+_engine = None
+_barrier = None
+
+
+def _start_worker(table, barrier, settings):
+    """ builds the worker process's engine around the shared table """
+    global _engine, _barrier
+    _engine = AlphaBetaEngine(table=table, **settings)
+    _barrier = barrier
+
+
+def _search_worker(arguments):
+    """ searches one position in a worker process """
+    black, white, num_turns_taken, helper, deadline = arguments
+    # every worker holds on to its helper until all of them have one, so no worker can finish a
+    #       helper and then take a second one, which would run past the deadline
+    try:
+        _barrier.wait(max(0.0, deadline - time.monotonic()))
+    except threading.BrokenBarrierError:
+        pass
+    game = Pentago()
+    game.set_position(black, white, num_turns_taken)
+    result = _engine.search(game, helper, deadline=deadline)
+    result['helper'] = helper
+    result['process'] = os.getpid()
+    return result
+
+
+class ParallelSearchEngine:
+    """
+    Searches with a pool of processes, each running an AlphaBetaEngine on the same position until the
+    time limit. Nothing is split up between them: they all write to one SharedTranspositionTable, so
+    each one's results cut the others' searches short, and helpers search in different orders so they
+    don't all do the same work at the same moment. The answer comes from whichever process got deepest.
+
+    The table and the processes are kept between searches, and close() frees them.
+    """
+
+    __slots__ = ('_processes', '_time_limit', '_table', '_pool', '_barrier', '_engine')
+
+    def __init__(self, processes=None, time_limit=1.0, table_size_mb=64, **settings):
+        """
+        :param processes: search processes, defaults to one per core. With 1 the search runs in this process.
+        :param time_limit: seconds allowed per move, counted from when search is called
+        :param table_size_mb: memory budget for the shared transposition table
+        :param settings: passed to each AlphaBetaEngine (max_depth, batch_leaves, ...)
+        """
+        self._processes = processes or os.cpu_count() or 1
+        self._time_limit = time_limit
+        self._table = SharedTranspositionTable(table_size_mb)
+        if self._processes == 1:
+            self._engine = AlphaBetaEngine(table=self._table, **settings)
+            self._pool = None
+            self._barrier = None
+        else:
+            self._engine = None
+            self._barrier = Barrier(self._processes)
+            self._pool = Pool(self._processes, _start_worker, (self._table, self._barrier, settings))
+
+    def get_table(self):
+        """ returns the shared table """
+        return self._table
+
+    def get_processes(self):
+        """ returns the number of search processes """
+        return self._processes
+
+    def find_best_move(self, game):
+        """ returns the best (position, sub_board, rotation) found for the player whose turn it is, or None """
+        return self.search(game)['move']
+
+    def search(self, game):
+        """
+        Searches the position in every process without changing the game that's passed in.
+        :return: the dict AlphaBetaEngine.search returns for the process that searched deepest (ties go to
+            the lowest helper number), with 'helper' saying which one it was, 'nodes' and 'time' for the
+            whole search, and the 'nodes_per_second' of all of them. 'helper_nodes' and 'helper_processes'
+            give each helper's nodes and the process id it ran in, by helper number.
+        """
+        start = time.monotonic()
+        # one deadline for every helper, however long each one takes to get going
+        deadline = start + self._time_limit
+        if self._pool is None:
+            result = self._engine.search(game, deadline=deadline)
+            result['helper'] = 0
+            result['process'] = os.getpid()
+            results = [result]
+        else:
+            # a search whose workers didn't all get going before its deadline leaves the barrier broken
+            if self._barrier.broken:
+                self._barrier.reset()
+            black, white = game.get_bitboards()
+            tasks = [(black, white, game.get_num_turns_taken(), helper, deadline) for helper in range(self._processes)]
+            results = self._pool.map(_search_worker, tasks, chunksize=1)
+        elapsed = time.monotonic() - start
+
+        best = max(results, key=lambda result: (result['depth'], result['complete'], -result['helper']))
+        best = dict(best)
+        del best['process']
+        results.sort(key=lambda result: result['helper'])
+        best['helper_nodes'] = [result['nodes'] for result in results]
+        best['helper_processes'] = [result['process'] for result in results]
+        best['nodes'] = sum(best['helper_nodes'])
+        best['time'] = elapsed
+        best['nodes_per_second'] = best['nodes'] / elapsed if elapsed else 0.0
+        return best
+
+    def close(self):
+        """ stops the worker processes and frees the shared table """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
@@ -0,0 +1,63 @@
+import os
+import unittest
+from Pentago import *
+from AlphaBetaEngine import WIN_SCORE
+from ParallelSearch import *
+
+
+class ParallelSearchTestCase(unittest.TestCase):
+    def test_takes_immediate_win(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+
+        with ParallelSearchEngine(processes=2, time_limit=5, table_size_mb=1) as engine:
+            result = engine.search(game)
+            self.assertIn(result['move'][0], ['a0', 'a5'])
+            self.assertEqual(result['value'], WIN_SCORE - 1)
+            self.assertEqual(len(result['helper_nodes']), 2)
+            self.assertEqual(result['nodes'], sum(result['helper_nodes']))
+
+            # the workers' results are in the table this process sees
+            self.assertEqual(engine.get_table().probe(game.get_zobrist_hash())[0], WIN_SCORE - 1)
+
+    def test_search(self):
+        game = Pentago()
+        for position in ['a0', 'f0', 'c4', 'f1', 'b2', 'f2', 'd5', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 1, 'C')
+
+        for processes in (1, 3):
+            with ParallelSearchEngine(processes=processes, time_limit=30, max_depth=2, table_size_mb=1) as engine:
+                self.assertEqual(engine.get_processes(), processes)
+                result = engine.search(game)
+                self.assertEqual(result['depth'], 2)
+                self.assertTrue(result['complete'])
+                self.assertGreater(result['value'], -WIN_SCORE + 100)
+                self.assertGreater(result['nodes_per_second'], 0)
+                self.assertIn(result['move'], game.get_legal_moves())
+
+                # a second search starts with the table the first one filled
+                self.assertLess(engine.search(game)['nodes'], result['nodes'])
+
+    def test_one_helper_per_process(self):
+        game = Pentago()
+        game.make_move('black', 'c2', 1, 'C')
+        with ParallelSearchEngine(processes=3, time_limit=0.5, table_size_mb=1) as engine:
+            for _ in range(3):
+                result = engine.search(game)
+                self.assertEqual(len(set(result['helper_processes'])), 3)
+                self.assertNotIn(os.getpid(), result['helper_processes'])
+                # every helper stops at the same deadline, so the search takes the time limit and not a multiple
+                self.assertLess(result['time'], 1.0)
+                self.assertFalse(result['complete'])
+
+    def test_finished_game(self):
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3', 'a0']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+        with ParallelSearchEngine(processes=2, table_size_mb=1) as engine:
+            self.assertIsNone(engine.find_best_move(game))
+
+
+if __name__ == '__main__':
+    unittest.main()
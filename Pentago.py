@@ -3,6 +3,13 @@
 # Date: 8/11/24
 # Description: An implementation of the 2 player strategy game Pentago.
 
+import cProfile
+import functools
+import random
+import sys
+import time
+
+
 def string_coord_to_tuple(string_coord):
     """ Converts string coordinates like 'a1' into tuple form like (0,0) """
     letter = string_coord[0]
@@ -11,29 +18,415 @@ def string_coord_to_tuple(string_coord):
     return row, col
 
 
+def tuple_to_string_coord(coords):
+    """ Converts tuple coordinates like (0,0) into string form like 'a0' """
+    return chr(ord('a') + coords[0]) + str(coords[1])
+
+
+# The board is stored as two 36 bit integers, one per color. Bit (row * 6 + col) is set
+#   when that color has a marble on that square.
+BOARD_MASK = (1 << 36) - 1
+
+
+def _line_mask(row, col, row_step, col_step):
+    """ returns the bit mask of the five squares starting at (row, col) and stepping by (row_step, col_step) """
+    mask = 0
+    for i in range(5):
+        mask |= 1 << ((row + row_step * i) * 6 + col + col_step * i)
+    return mask
+
+
+# Every five in a row on the board, 32 in all, grouped by direction.
+_HORIZONTAL_LINES = tuple(_line_mask(row, col, 0, 1) for row in range(6) for col in range(2))
+_VERTICAL_LINES = tuple(_line_mask(row, col, 1, 0) for row in range(2) for col in range(6))
+_DIAGONAL_LINES = (tuple(_line_mask(row, col, 1, 1) for row in range(2) for col in range(2))
+                   + tuple(_line_mask(row, col, 1, -1) for row in range(2) for col in range(4, 6)))
+LINE_MASKS = _HORIZONTAL_LINES + _VERTICAL_LINES + _DIAGONAL_LINES
+
+# The lines that pass through each square. Placing a marble can only complete one of these.
+_LINES_THROUGH_SQUARE = tuple(tuple(line for line in LINE_MASKS if line >> index & 1) for index in range(36))
+
+
+def _has_line(bits, lines):
+    """ returns True if the bitboard fills every square of at least one of the line masks """
+    for line in lines:
+        if bits & line == line:
+            return True
+    return False
+
+
+def _quadrant_offsets(sub_board):
+    """ returns the bit index of the left-most square in each of the quadrant's three rows """
+    row_start = 3 if sub_board > 2 else 0
+    col_start = 3 if sub_board % 2 == 0 else 0
+    return tuple((row_start + row) * 6 + col_start for row in range(3))
+
+
+def _build_rotation_table(sub_board, rotation):
+    """
+    Builds a 512 entry list that maps a quadrant's 9 bit occupancy (row-major, 3 bits per row)
+    to the board bits that quadrant occupies after the rotation.
+    """
+    offsets = _quadrant_offsets(sub_board)
+    table = []
+    for pattern in range(512):
+        bits = 0
+        for row in range(3):
+            for col in range(3):
+                if pattern >> (row * 3 + col) & 1:
+                    # clockwise sends (row, col) to (col, 2 - row), anticlockwise to (2 - col, row)
+                    if rotation == 'C':
+                        new_row, new_col = col, 2 - row
+                    else:
+                        new_row, new_col = 2 - col, row
+                    bits |= 1 << (offsets[new_row] + new_col)
+        table.append(bits)
+    return table
+
+
+# indexed by sub-board number 1 - 4 (index 0 is unused so the numbers line up with make_move)
+QUADRANT_OFFSETS = [None] + [_quadrant_offsets(sub_board) for sub_board in range(1, 5)]
+QUADRANT_MASKS = [None] + [7 << offsets[0] | 7 << offsets[1] | 7 << offsets[2]
+                           for offsets in QUADRANT_OFFSETS[1:]]
+# The line masks that pass through each quadrant, indexed by sub-board number like QUADRANT_MASKS.
+#       Rotating a quadrant can only make or break one of these.
+LINES_THROUGH_QUADRANT = [None] + [tuple(line for line in LINE_MASKS if line & quadrant_mask)
+                                   for quadrant_mask in QUADRANT_MASKS[1:]]
+ROTATION_TABLES = [None] + [{rotation: _build_rotation_table(sub_board, rotation) for rotation in 'CA'}
+                            for sub_board in range(1, 5)]
+
+
+def _get_quadrant_pattern(bits, sub_board):
+    """ pulls one quadrant out of a bitboard as a 9 bit number, 3 bits per row """
+    offset_0, offset_1, offset_2 = QUADRANT_OFFSETS[sub_board]
+    return (bits >> offset_0 & 7) | (bits >> offset_1 & 7) << 3 | (bits >> offset_2 & 7) << 6
+
+
+def _set_quadrant_pattern(pattern, sub_board):
+    """ undoes _get_quadrant_pattern: returns a bitboard with a 9 bit pattern placed in one quadrant """
+    offset_0, offset_1, offset_2 = QUADRANT_OFFSETS[sub_board]
+    return (pattern & 7) << offset_0 | (pattern >> 3 & 7) << offset_1 | (pattern >> 6) << offset_2
+
+
+def _rotate_bits(bits, sub_board, rotation):
+    """ returns the bitboard with one quadrant rotated, using the precomputed rotation tables """
+    rotated = ROTATION_TABLES[sub_board][rotation][_get_quadrant_pattern(bits, sub_board)]
+    return (bits & ~QUADRANT_MASKS[sub_board]) | rotated
+
+
+# Every (sub_board, rotation) pair a player can finish their move with, in the order move indices use
+#       (see move_to_index).
+ROTATION_CHOICES = tuple((sub_board, rotation) for sub_board in range(1, 5) for rotation in 'CA')
+_STRING_COORDS = tuple(tuple_to_string_coord(divmod(index, 6)) for index in range(36))
+
+
+def move_to_index(position, sub_board, rotation):
+    """
+    Packs a move into one integer from 0 to 287: the square index (row * 6 + col) times 8, plus
+    (sub_board - 1) * 2, plus 1 for an anticlockwise rotation. Search code passes these around
+    instead of (position, sub_board, rotation) triples.
+    """
+    row, col = string_coord_to_tuple(position)
+    return (row * 6 + col) * 8 + (sub_board - 1) * 2 + (rotation == 'A')
+
+
+def index_to_move(move_index):
+    """ unpacks a move index from move_to_index back into a (position, sub_board, rotation) triple """
+    return _MOVES[move_index]
+
+
+_MOVES = tuple((position, sub_board, rotation) for position in _STRING_COORDS
+               for sub_board, rotation in ROTATION_CHOICES)
+
+# game states by number, the way undo tokens and the batch simulator store them
+GAME_STATES = ('UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAW')
+GAME_STATE_CODES = {state: code for code, state in enumerate(GAME_STATES)}
+
+
+# Zobrist hashing: every (color, square) pair gets a fixed random 64 bit key, and a position's hash
+#   is the xor of the keys for every marble on the board. The seed is fixed so hashes are the same
+#   in every process and every run.
+_zobrist_random = random.Random(20240811)
+_ZOBRIST_KEYS = tuple(tuple(_zobrist_random.getrandbits(64) for _ in range(36)) for _ in range(2))
+
+
+def _build_zobrist_quadrant_table(sub_board, color):
+    """ returns a 512 entry list with the xor of the color's keys for each 9 bit quadrant pattern """
+    offsets = QUADRANT_OFFSETS[sub_board]
+    table = []
+    for pattern in range(512):
+        key = 0
+        for square in range(9):
+            if pattern >> square & 1:
+                key ^= _ZOBRIST_KEYS[color][offsets[square // 3] + square % 3]
+        table.append(key)
+    return table
+
+
+def _build_zobrist_rotation_table(sub_board, rotation, color):
+    """
+    returns a 512 entry list that maps a quadrant pattern to the value to xor into the hash when that
+    quadrant is rotated, which swaps the keys of the old squares for the keys of the new ones.
+    """
+    keys = _build_zobrist_quadrant_table(sub_board, color)
+    rotated = ROTATION_TABLES[sub_board][rotation]
+    return [keys[pattern] ^ keys[_get_quadrant_pattern(rotated[pattern], sub_board)] for pattern in range(512)]
+
+
+# indexed by [sub_board][color], where color 0 is black and 1 is white
+_ZOBRIST_QUADRANT_TABLES = [None] + [[_build_zobrist_quadrant_table(sub_board, color) for color in range(2)]
+                                     for sub_board in range(1, 5)]
+# indexed by [sub_board][rotation][color]
+_ZOBRIST_ROTATION_TABLES = [None] + [{rotation: [_build_zobrist_rotation_table(sub_board, rotation, color)
+                                                 for color in range(2)] for rotation in 'CA'}
+                                     for sub_board in range(1, 5)]
+
+
+def _zobrist_hash(black, white):
+    """ computes the Zobrist hash of a position from scratch """
+    key = 0
+    for sub_board in range(1, 5):
+        key ^= _ZOBRIST_QUADRANT_TABLES[sub_board][0][_get_quadrant_pattern(black, sub_board)]
+        key ^= _ZOBRIST_QUADRANT_TABLES[sub_board][1][_get_quadrant_pattern(white, sub_board)]
+    return key
+
+
+def _rotate_hash(key, black, white, sub_board, rotation):
+    """ returns the hash after rotating a quadrant. black and white are the bitboards from before the rotation. """
+    tables = _ZOBRIST_ROTATION_TABLES[sub_board][rotation]
+    return (key ^ tables[0][_get_quadrant_pattern(black, sub_board)]
+            ^ tables[1][_get_quadrant_pattern(white, sub_board)])
+
+
+# The 8 symmetries of the whole board: 4 rotations, then the same 4 after a mirror image. Each one
+#   sends quadrants onto quadrants, so a symmetric position plays out exactly the same way.
+_SYMMETRIES = (
+    lambda row, col: (row, col),
+    lambda row, col: (col, 5 - row),
+    lambda row, col: (5 - row, 5 - col),
+    lambda row, col: (5 - col, row),
+    lambda row, col: (row, 5 - col),
+    lambda row, col: (col, row),
+    lambda row, col: (5 - row, col),
+    lambda row, col: (5 - col, 5 - row),
+)
+
+# for each symmetry, the square each square is sent to
+_SYMMETRY_SQUARES = tuple(tuple(row * 6 + col for row, col in (symmetry(*divmod(index, 6)) for index in range(36)))
+                          for symmetry in _SYMMETRIES)
+
+
+def _build_symmetry_table(squares, row):
+    """ returns a 64 entry list mapping one row's 6 bits to where those bits end up under a symmetry """
+    table = []
+    for pattern in range(64):
+        bits = 0
+        for col in range(6):
+            if pattern >> col & 1:
+                bits |= 1 << squares[row * 6 + col]
+        table.append(bits)
+    return table
+
+
+# indexed by [symmetry][row]
+_SYMMETRY_TABLES = tuple(tuple(_build_symmetry_table(squares, row) for row in range(6)) for squares in _SYMMETRY_SQUARES)
+
+
+def _transform_bits(bits, symmetry):
+    """ returns the bitboard moved by one of the 8 board symmetries (an index into _SYMMETRIES) """
+    tables = _SYMMETRY_TABLES[symmetry]
+    return (tables[0][bits & 63] | tables[1][bits >> 6 & 63] | tables[2][bits >> 12 & 63]
+            | tables[3][bits >> 18 & 63] | tables[4][bits >> 24 & 63] | tables[5][bits >> 30 & 63])
+
+
+def rotate_bitboard(bits, sub_board, rotation):
+    """ returns the bitboard with one quadrant turned, 'C' for clockwise or 'A' for anticlockwise """
+    return _rotate_bits(bits, sub_board, rotation)
+
+
+def transform_bitboard(bits, symmetry):
+    """ returns the bitboard moved by one of the 8 board symmetries, see canonical_symmetry """
+    return _transform_bits(bits, symmetry)
+
+
+def canonical_key(black, white):
+    """
+    Returns a key that is the same for a position and all 7 of its rotations and reflections: the smallest
+    (black << 36 | white) over the 8 symmetries. The key is exact, so two positions share a key only when
+    one is a symmetry of the other.
+    """
+    return min(_transform_bits(black, symmetry) << 36 | _transform_bits(white, symmetry) for symmetry in range(8))
+
+
+def canonical_symmetry(black, white):
+    """
+    Returns (canonical_key(black, white), symmetry), where symmetry is an index into the 8 board symmetries
+    that carries this position onto its canonical orientation. Moves can be carried across with
+    transform_move_index.
+    """
+    return min((_transform_bits(black, symmetry) << 36 | _transform_bits(white, symmetry), symmetry)
+               for symmetry in range(8))
+
+
+def _build_symmetry_moves(symmetry):
+    """ returns a 288 entry list of where each move index ends up under a symmetry """
+    # find the (sub_board, rotation) that does to the moved board what each choice did to the original,
+    #       using a few lopsided boards so only the right choice matches all of them
+    rng = random.Random(symmetry)
+    boards = [rng.getrandbits(36) for _ in range(4)]
+    choice_images = []
+    for sub_board, rotation in ROTATION_CHOICES:
+        for image, (image_sub_board, image_rotation) in enumerate(ROTATION_CHOICES):
+            if all(_transform_bits(_rotate_bits(bits, sub_board, rotation), symmetry)
+                   == _rotate_bits(_transform_bits(bits, symmetry), image_sub_board, image_rotation)
+                   for bits in boards):
+                choice_images.append(image)
+                break
+    squares = _SYMMETRY_SQUARES[symmetry]
+    return [squares[move_index >> 3] * 8 + choice_images[move_index & 7] for move_index in range(288)]
+
+
+# indexed by [symmetry][move_index]. Rotations of the board keep the rotation direction; mirror images flip it.
+_SYMMETRY_MOVES = tuple(_build_symmetry_moves(symmetry) for symmetry in range(8))
+# the symmetry that undoes each symmetry
+_INVERSE_SYMMETRIES = tuple(next(inverse for inverse in range(8)
+                                 if all(_SYMMETRY_SQUARES[inverse][_SYMMETRY_SQUARES[symmetry][index]] == index
+                                        for index in range(36)))
+                            for symmetry in range(8))
+
+
+def transform_move_index(move_index, symmetry):
+    """ returns the move index that plays move_index on the board moved by symmetry (see canonical_symmetry) """
+    return _SYMMETRY_MOVES[symmetry][move_index]
+
+
+def inverse_symmetry(symmetry):
+    """ returns the symmetry that undoes symmetry """
+    return _INVERSE_SYMMETRIES[symmetry]
+
+
+def _completing_squares(bits, empty, lines):
+    """ returns a bitboard of the empty squares that would fill one of the lines with a marble from bits """
+    squares = 0
+    for line in lines:
+        missing = line & ~bits
+        # exactly one square of the line is missing and nobody is on it
+        if missing & empty and missing & (missing - 1) == 0:
+            squares |= missing
+    return squares
+
+
+def winning_squares(mover, opponent):
+    """
+    Returns a bitboard of the empty squares where mover would get five in a row just by placing
+    a marble, which wins before the rotation.
+    :param mover: bitboard of the player about to move
+    :param opponent: bitboard of the other player
+    """
+    return _completing_squares(mover, ~(mover | opponent) & BOARD_MASK, LINE_MASKS)
+
+
+def _immediate_results(mover, opponent):
+    """
+    Works out which moves end an unfinished game at once, following the rules in make_move.
+    :param mover: bitboard of the player about to move
+    :param opponent: bitboard of the other player
+    :return: sorted lists of the move indices that win and that lose
+    """
+    empty = ~(mover | opponent) & BOARD_MASK
+    # a line made by placing the marble wins before the rotation, whatever the rotation would have been
+    placement_wins = _completing_squares(mover, empty, LINE_MASKS)
+    wins = []
+    losses = []
+    squares = placement_wins
+    while squares:
+        index = (squares & -squares).bit_length() - 1
+        wins.extend(range(index * 8, index * 8 + 8))
+        squares &= squares - 1
+
+    for choice, (sub_board, rotation) in enumerate(ROTATION_CHOICES):
+        # nobody had a line before the move, so only lines through the rotated quadrant can be
+        #       finished by the rotation
+        lines = LINES_THROUGH_QUADRANT[sub_board]
+        rotated_mover = _rotate_bits(mover, sub_board, rotation)
+        rotated_opponent = _rotate_bits(opponent, sub_board, rotation)
+        if _has_line(rotated_mover, lines):
+            mover_lines = empty
+        else:
+            # squares that finish a line once rotated, turned back to where the marble has to go
+            rotated_empty = ~(rotated_mover | rotated_opponent) & BOARD_MASK
+            mover_lines = _rotate_bits(_completing_squares(rotated_mover, rotated_empty, lines), sub_board,
+                                       'A' if rotation == 'C' else 'C')
+        mover_lines &= ~placement_wins
+
+        if _has_line(rotated_opponent, lines):
+            # the opponent wins unless the mover gets a line too, which is a draw
+            squares = empty & ~placement_wins & ~mover_lines
+            results = losses
+        else:
+            squares = mover_lines
+            results = wins
+        while squares:
+            results.append(((squares & -squares).bit_length() - 1) * 8 + choice)
+            squares &= squares - 1
+    wins.sort()
+    losses.sort()
+    return wins, losses
+
+
+def _winner_from_flags(is_white_winner, is_black_winner):
+    """ translates two booleans into 'white', 'black', 'both', or None """
+    if is_white_winner and is_black_winner:
+        return 'both'
+    elif is_white_winner:
+        return 'white'
+    elif is_black_winner:
+        return 'black'
+    else:
+        return None
+
+
+def _game_state_from_flags(is_white_winner, is_black_winner, is_board_full):
+    """ translates who has five in a row, and whether the board is full, into a game state string """
+    if is_white_winner and is_black_winner:
+        return 'DRAW'
+    elif is_white_winner:
+        return 'WHITE_WON'
+    elif is_black_winner:
+        return 'BLACK_WON'
+    elif is_board_full:
+        return 'DRAW'
+    return 'UNFINISHED'
+
+
 class Pentago:
     """
     This is the main / parent class for the game. It contains the board data and
-    conducts all the major actions of the game except for sub-board rotation. It has the board
-    as the source of ultimate truth about the state of the game, but it also has 4 sub-board
-    arrays that are instances of the class SubBoard that are updated from the main board.
+    conducts all the major actions of the game. The board is kept as two bitboards, one for
+    each color, which are the only source of truth about the state of the game. The 6 x 6
+    list view and the SubBoard objects are built from the bitboards when they're asked for.
     """
 
+    # no per-game __dict__, so an idle game costs one small object plus its ints
+    __slots__ = ('_black', '_white', '_num_turns_taken', '_game_state', '_hash', '_sub_boards')
+
     def __init__(self):
-        """ Initializes all data members, including empty board, turn counting variable, and 4 sub-boards"""
-        self._board = [[None for _ in range(6)] for _ in range(6)]
+        """ Initializes all data members: empty bitboards for each color and the turn counting variable"""
+        self._black = 0
+        self._white = 0
         self._num_turns_taken = 0
-        self._quadrant_1 = SubBoard()
-        self._quadrant_2 = SubBoard()
-        self._quadrant_3 = SubBoard()
-        self._quadrant_4 = SubBoard()
+        self._game_state = 'UNFINISHED'
+        # {sub_board: (SubBoard, black pattern, white pattern)} for the SubBoards get_sub_board handed
+        #       out, or None before the first one
+        self._sub_boards = None
+        self._hash = 0
 
     def print_board(self):
         """
         Displays the current state of the board to the console. This is a function, not a method,
         because it's used by both the Pentago class and the SubBoard class.
         """
-        for row in self._board:
+        for row in self.get_board():
             for slot in row:
                 if slot is None:
                     print('-', end='\t')
@@ -48,35 +441,79 @@ class Pentago:
 
     def get_game_state(self):
         """ Returns 'UNFINISHED', 'WHITE_WON', 'BLACK_WON' or 'DRAW'. """
+        return self._game_state
 
-        # takes on a value of 'white', 'black', 'both', or None.
-        winner = self.get_winner()
+    def _refresh_cached_state(self):
+        """
+        Recomputes the stored game state and hash from the whole board. make_move keeps them
+        up to date on its own, so this is only needed after the board is edited directly.
+        """
+        self._hash = _zobrist_hash(self._black, self._white)
+        self._game_state = _game_state_from_flags(_has_line(self._white, LINE_MASKS),
+                                                  _has_line(self._black, LINE_MASKS),
+                                                  self.is_board_full())
 
-        if winner == 'white':
-            return 'WHITE_WON'
-        elif winner == 'black':
-            return 'BLACK_WON'
-        elif winner == 'both' or self.is_board_full():
-            return 'DRAW'
+    def get_board(self):
+        """ builds and returns a 6 x 6 board array holding 'white', 'black', or None """
+        board = []
+        bit = 1
+        for _ in range(6):
+            row = []
+            for _ in range(6):
+                if self._black & bit:
+                    row.append('black')
+                elif self._white & bit:
+                    row.append('white')
+                else:
+                    row.append(None)
+                bit <<= 1
+            board.append(row)
+        return board
 
-        return 'UNFINISHED'
+    def get_zobrist_hash(self):
+        """ returns the 64 bit Zobrist hash of the board, kept up to date as marbles are placed and rotated """
+        return self._hash
 
-    def get_board(self):
-        """ returns board array """
-        return self._board
+    def get_canonical_key(self):
+        """ returns a key that is the same for this position and every rotation or reflection of the board """
+        return canonical_key(self._black, self._white)
+
+    def get_bitboards(self):
+        """ returns the (black, white) bitboards. Bit (row * 6 + col) is set where that color has a marble. """
+        return self._black, self._white
+
+    def set_position(self, black, white, num_turns_taken=None):
+        """
+        Replaces the whole board, for example to pick up a position that was stored as bitboards.
+        :param black: bitboard of black's marbles
+        :param white: bitboard of white's marbles
+        :param num_turns_taken: turn counter to use, defaults to the number of marbles on the board
+        """
+        self._black = black
+        self._white = white
+        if num_turns_taken is None:
+            num_turns_taken = (black | white).bit_count()
+        self._num_turns_taken = num_turns_taken
+        self._refresh_cached_state()
 
     def get_sub_board(self, sub_board):
-        """ returns a SubBoard object
+        """ returns a SubBoard object built from the current board. Changes to it only reach the game
+        when update_main_board_from_sub_board copies them back.
         :param sub_board: int describing which quadrant to grab
         """
-        if sub_board == 1:
-            return self._quadrant_1
-        elif sub_board == 2:
-            return self._quadrant_2
-        elif sub_board == 3:
-            return self._quadrant_3
-        elif sub_board == 4:
-            return self._quadrant_4
+        black = _get_quadrant_pattern(self._black, sub_board)
+        white = _get_quadrant_pattern(self._white, sub_board)
+        quadrant = SubBoard(['black' if black >> square & 1 else 'white' if white >> square & 1 else None
+                             for square in range(9)])
+        self._remember_sub_board(sub_board, quadrant, black, white)
+        return quadrant
+
+    def _remember_sub_board(self, sub_board, quadrant, black, white):
+        """ records the SubBoard last handed out for a quadrant, and the quadrant's patterns it matches """
+        # a new dict every time, so shallow copies of the game don't share later entries
+        sub_boards = dict(self._sub_boards) if self._sub_boards else {}
+        sub_boards[sub_board] = (quadrant, black, white)
+        self._sub_boards = sub_boards
 
     def is_board_full(self):
         """ returns True or False to indicate whether the board is already full """
@@ -95,46 +532,196 @@ class Pentago:
         :return: string: "game is finished", "Not this player's turn", "position is not empty", or True (if move was
         legal and carried out)
         """
-        # this runs multiple times throughout this method... here it is preventing further
-        #       play after the game is over
-        if self.get_game_state() != 'UNFINISHED':
+        # the game state is stored, and only lines the move touches are checked to update it
+        if self._game_state != 'UNFINISHED':
             return 'game is finished'
 
         if color != self.get_whose_turn():
             return "not this player's turn"
 
-        coords = string_coord_to_tuple(position)
+        row, col = string_coord_to_tuple(position)
+        index = row * 6 + col
+        bit = 1 << index
 
         # check if move is legal
-        if not self.is_move_valid(coords):
+        if (self._black | self._white) & bit:
             return "position is not empty"
-        else:
-            # update main board and sub-boards
-            self.update_board(coords)
-            self.update_sub_board(coords)
-            self._num_turns_taken += 1
 
-        # check for win prior to rotation
-        status = self.get_game_state()
-        if status == 'WHITE_WON' or status == 'BLACK_WON':
+        # a token without the rotation bit means the game was won before the rotation
+        token = self.apply_move(index * 8 + (sub_board - 1) * 2 + (rotation == 'A'))
+        if not token & 512:
             # return true on the same move player wins, later calls to this method will return 'game is finished'
             return True
 
-        # perform rotation on sub-board
-        self.get_sub_board(sub_board).rotate(rotation)
-
-        # copy data from sub-board back over to main board
-        self.update_main_board_from_sub_board(sub_board)
-
-        # post-rotation: check for win / loss / tie (including filled board) and return status
-        if self.get_game_state() != 'UNFINISHED':
+        if self._game_state != 'UNFINISHED':
             return 'game is finished'
         else:
             return True
 
+    def apply_move(self, move_index):
+        """
+        Carries out a move given as a move index (see move_to_index) in place and returns an undo token
+        for unmake_move. Unlike make_move nothing is checked, so only pass moves that are legal, like the
+        ones from get_legal_move_indices.
+        :return: int undo token: the move index in the low 9 bits, bit 9 set if the sub-board was rotated,
+            and the game state from before the move above that.
+        """
+        index = move_index >> 3
+        bit = 1 << index
+        token = move_index | GAME_STATE_CODES[self._game_state] << 10
+
+        # check for win prior to rotation. Nobody had five in a row before this marble, so only
+        #       the mover's lines through the new square can have changed.
+        if self._num_turns_taken % 2 == 0:
+            self._black |= bit
+            self._hash ^= _ZOBRIST_KEYS[0][index]
+            self._num_turns_taken += 1
+            if _has_line(self._black, _LINES_THROUGH_SQUARE[index]):
+                self._game_state = 'BLACK_WON'
+                return token
+        else:
+            self._white |= bit
+            self._hash ^= _ZOBRIST_KEYS[1][index]
+            self._num_turns_taken += 1
+            if _has_line(self._white, _LINES_THROUGH_SQUARE[index]):
+                self._game_state = 'WHITE_WON'
+                return token
+
+        # perform rotation on sub-board
+        sub_board = (move_index >> 1 & 3) + 1
+        rotation = 'A' if move_index & 1 else 'C'
+        self._hash = _rotate_hash(self._hash, self._black, self._white, sub_board, rotation)
+        self._black = _rotate_bits(self._black, sub_board, rotation)
+        self._white = _rotate_bits(self._white, sub_board, rotation)
+
+        # post-rotation: check for win / loss / tie (including filled board).
+        #       Only lines through the rotated quadrant can have changed.
+        lines = LINES_THROUGH_QUADRANT[sub_board]
+        self._game_state = _game_state_from_flags(_has_line(self._white, lines), _has_line(self._black, lines),
+                                                  self._num_turns_taken > 35)
+        return token | 512
+
+    def unmake_move(self, token):
+        """
+        Takes back the most recent move made with apply_move, restoring the board, the turn counter,
+        and the game state exactly.
+        :param token: the undo token apply_move returned for that move
+        """
+        move_index = token & 511
+        if token & 512:
+            sub_board = (move_index >> 1 & 3) + 1
+            rotation = 'C' if move_index & 1 else 'A'
+            self._hash = _rotate_hash(self._hash, self._black, self._white, sub_board, rotation)
+            self._black = _rotate_bits(self._black, sub_board, rotation)
+            self._white = _rotate_bits(self._white, sub_board, rotation)
+
+        index = move_index >> 3
+        bit = 1 << index
+        self._hash ^= _ZOBRIST_KEYS[0 if self._black & bit else 1][index]
+        self._black &= ~bit
+        self._white &= ~bit
+        self._num_turns_taken -= 1
+        self._game_state = GAME_STATES[token >> 10]
+
+    def get_legal_moves(self, merge_identical=False):
+        """
+        Lists every move make_move would accept from the player whose turn it is.
+        :param merge_identical: if True, moves that leave the board exactly the same as a move already
+            listed are left out. Rotating an empty quadrant, or any move that wins before the rotation,
+            gives the same result no matter which rotation is chosen.
+        :return: a list of (position, sub_board, rotation) triples like ('a2', 1, 'C')
+        """
+        return [_MOVES[move_index] for move_index in self.get_legal_move_indices(merge_identical)]
+
+    def _get_mover_and_opponent(self):
+        """ returns the bitboards of the player whose turn it is and of the other player """
+        if self._num_turns_taken % 2 == 0:
+            return self._black, self._white
+        return self._white, self._black
+
+    def get_winning_moves(self):
+        """
+        returns a sorted list of the move indices (see move_to_index) that win at once for the player whose
+        turn it is, either by making five in a row before the rotation or by the rotation itself
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        return _immediate_results(*self._get_mover_and_opponent())[0]
+
+    def get_losing_moves(self):
+        """
+        returns a sorted list of the move indices that lose at once for the player whose turn it is,
+        because the rotation makes five in a row for the other player only
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        return _immediate_results(*self._get_mover_and_opponent())[1]
+
+    def get_immediate_results(self):
+        """
+        returns (get_winning_moves(), get_losing_moves()) from a single pass over the moves, for callers
+        that want both
+        """
+        if self._game_state != 'UNFINISHED':
+            return [], []
+        return _immediate_results(*self._get_mover_and_opponent())
+
+    def get_threats(self):
+        """
+        returns a sorted list of the move indices that would win at once for the other player if it were
+        their turn now, which are the threats the player whose turn it is has to deal with
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        mover, opponent = self._get_mover_and_opponent()
+        return _immediate_results(opponent, mover)[0]
+
+    def get_legal_move_indices(self, merge_identical=False):
+        """ same as get_legal_moves, but each move is returned as a move index (see move_to_index) """
+        if self._game_state != 'UNFINISHED':
+            return []
+
+        occupied = self._black | self._white
+        is_black_turn = self._num_turns_taken % 2 == 0
+        moves = []
+        seen = set()
+
+        for index in range(36):
+            bit = 1 << index
+            if occupied & bit:
+                continue
+            first_move = index * 8
+
+            if not merge_identical:
+                moves.extend(range(first_move, first_move + 8))
+                continue
+
+            black = self._black | bit if is_black_turn else self._black
+            white = self._white if is_black_turn else self._white | bit
+
+            # a win before the rotation skips the rotation, so all 8 choices are the same move
+            if _has_line(black if is_black_turn else white, _LINES_THROUGH_SQUARE[index]):
+                if (black, white) not in seen:
+                    seen.add((black, white))
+                    moves.append(first_move)
+                continue
+
+            for choice, (sub_board, rotation) in enumerate(ROTATION_CHOICES):
+                result = (_rotate_bits(black, sub_board, rotation), _rotate_bits(white, sub_board, rotation))
+                if result not in seen:
+                    seen.add(result)
+                    moves.append(first_move + choice)
+
+        return moves
+
     def update_turn_number(self):
         """ increments the value of the turn counter by one"""
         self._num_turns_taken += 1
+        self._refresh_cached_state()
+
+    def get_num_turns_taken(self):
+        """ returns how many turns have been taken so far """
+        return self._num_turns_taken
 
     def get_whose_turn(self):
         """ returns whose turn it currently is -- 'white' or 'black' """
@@ -149,9 +736,14 @@ class Pentago:
         :param position: a tuple describing the (row, col) integers where the value is to be changed
         :return: nothing
         """
-        row = position[0]
-        col = position[1]
-        self._board[row][col] = self.get_whose_turn()
+        bit = 1 << (position[0] * 6 + position[1])
+        if self._num_turns_taken % 2 == 0:
+            self._white &= ~bit
+            self._black |= bit
+        else:
+            self._black &= ~bit
+            self._white |= bit
+        self._refresh_cached_state()
 
     def is_move_valid(self, position):
         """
@@ -160,219 +752,117 @@ class Pentago:
         :param position: a tuple describing the (row, col) integers where the value is to be changed
         :return: boolean: is it a valid move or not.
         """
-        row = position[0]
-        col = position[1]
-        return self._board[row][col] is None
+        bit = 1 << (position[0] * 6 + position[1])
+        return not (self._black | self._white) & bit
 
     def update_sub_board(self, main_board_coords):
         """
-        decides which sub-board to update based on the coordinates of the most recent move.
+        Places the current player's marble and reports which sub-board it landed in. The sub-boards
+        are just regions of the bitboards now, so this is the same update as update_board.
         """
+        self.update_board(main_board_coords)
         if main_board_coords[0] < 3:
             if main_board_coords[1] < 3:
-                self._quadrant_1.update(main_board_coords, self.get_whose_turn())
                 return 'quadrant 1'
             else:
-                self._quadrant_2.update(main_board_coords, self.get_whose_turn())
                 return 'quadrant 2'
         else:
             if main_board_coords[1] < 3:
-                self._quadrant_3.update(main_board_coords, self.get_whose_turn())
                 return 'quadrant 3'
             else:
-                self._quadrant_4.update(main_board_coords, self.get_whose_turn())
                 return 'quadrant 4'
 
     def update_main_board_from_sub_board(self, sub_board):
         """
-        This should be called right after a rotation. The sub-board has just been
-        rotated and its values need to be reflected in the main board so there is no
-        discrepancy.
+        Copies the SubBoard that get_sub_board last handed out for a quadrant back onto the board, so
+        changes made to it, like a rotation, show up in the game. Squares holding anything other than
+        'black' or 'white' come back empty. make_move doesn't go through SubBoards any more, so if
+        none was handed out there is nothing to copy.
         :param sub_board: an integer of 1, 2, 3, or 4 that indicates the sub-board that was
             rotated and now needs to be copied over.
+        :raises ValueError: if the quadrant changed on the board after the SubBoard was handed out,
+            since copying it back would undo that change
         """
-        row_start = 0
-        col_start = 0
-        if sub_board == 2 or sub_board == 4:
-            col_start = 3
-        if sub_board == 3 or sub_board == 4:
-            row_start = 3
-
-        sub_board = self.get_sub_board(sub_board)
-
-        for row in range(3):
-            for col in range(3):
-                self._board[row + row_start][col + col_start] = sub_board.get_array()[row][col]
+        entry = self._sub_boards.get(sub_board) if self._sub_boards else None
+        if entry is None:
+            return
+        quadrant, black, white = entry
+        if (_get_quadrant_pattern(self._black, sub_board) != black
+                or _get_quadrant_pattern(self._white, sub_board) != white):
+            raise ValueError('sub-board {} changed after get_sub_board'.format(sub_board))
+
+        black = white = 0
+        for square, value in enumerate(quadrant.get_cells()):
+            if value == 'black':
+                black |= 1 << square
+            elif value == 'white':
+                white |= 1 << square
+        mask = QUADRANT_MASKS[sub_board]
+        self._black = self._black & ~mask | _set_quadrant_pattern(black, sub_board)
+        self._white = self._white & ~mask | _set_quadrant_pattern(white, sub_board)
+        self._remember_sub_board(sub_board, quadrant, black, white)
+        self._refresh_cached_state()
+
+    def rotate_sub_board(self, sub_board, rotation):
+        """
+        rotates one quadrant of the board in place.
+        :param sub_board: an integer of 1, 2, 3, or 4 that indicates the sub-board to rotate
+        :param rotation: 'C' for clockwise or 'A' for anticlockwise
+        """
+        self._black = _rotate_bits(self._black, sub_board, rotation)
+        self._white = _rotate_bits(self._white, sub_board, rotation)
+        self._refresh_cached_state()
 
     def get_winner(self):
         """
         Checks for horizontal, diagonal, and vertical wins and returns who the winner
         is: 'white', 'black', 'both', or None.
         """
-
-        horizontal_winner = self.get_horizontal_winner()
-        if horizontal_winner is not None:
-            return horizontal_winner
-
-        vertical_winner = self.get_vertical_winner()
-        if vertical_winner is not None:
-            return vertical_winner
-
-        # last one to check, so if it's None just return that anyway
-        return self.get_diagonal_winner()
+        return _winner_from_flags(_has_line(self._white, LINE_MASKS), _has_line(self._black, LINE_MASKS))
 
     def get_horizontal_winner(self):
         """ checks for a horizontal win, returns 'white', 'black', 'both', or None to describe if winner is
         white, black, or no one. """
-
-        white_row_length = 0
-        black_row_length = 0
-
-        is_white_winner = False
-        is_black_winner = False
-
-        for row in self._board:
-            for value in row:
-                if value == 'white':
-                    white_row_length += 1
-                    if white_row_length == 5:
-                        is_white_winner = True
-                elif value == 'black':
-                    black_row_length += 1
-                    if black_row_length == 5:
-                        is_black_winner = True
-                else:
-                    white_row_length = 0
-                    black_row_length = 0
-            # reset after each row
-            white_row_length = 0
-            black_row_length = 0
-
-        if is_white_winner and is_black_winner:
-            return 'both'
-        elif is_white_winner:
-            return 'white'
-        elif is_black_winner:
-            return 'black'
-        else:
-            return None
+        return _winner_from_flags(_has_line(self._white, _HORIZONTAL_LINES), _has_line(self._black, _HORIZONTAL_LINES))
 
     def get_vertical_winner(self):
         """ checks for a vertical win, returns 'white', 'black', or None to describe if winner is
         white, black, or no one. """
-
-        white_row_length = 0
-        black_row_length = 0
-
-        is_white_winner = False
-        is_black_winner = False
-
-        for col_num in range(len(self._board[0])):
-            for row_num in range(len(self._board)):
-                value = self._board[row_num][col_num]
-                if value == 'white':
-                    white_row_length += 1
-                    if white_row_length == 5:
-                        is_white_winner = True
-                elif value == 'black':
-                    black_row_length += 1
-                    if black_row_length == 5:
-                        is_black_winner = True
-                else:
-                    white_row_length = 0
-                    black_row_length = 0
-            # reset after each row
-            white_row_length = 0
-            black_row_length = 0
-
-        if is_white_winner and is_black_winner:
-            return 'both'
-        elif is_white_winner:
-            return 'white'
-        elif is_black_winner:
-            return 'black'
-        else:
-            return None
+        return _winner_from_flags(_has_line(self._white, _VERTICAL_LINES), _has_line(self._black, _VERTICAL_LINES))
 
     def get_diagonal_winner(self):
         """ checks for a diagonal win, returns 'white', 'black', or None to describe if winner is
         white, black, or no one. """
+        return _winner_from_flags(_has_line(self._white, _DIAGONAL_LINES), _has_line(self._black, _DIAGONAL_LINES))
 
-        white_row_length = 0
-        black_row_length = 0
-
-        is_white_winner = False
-        is_black_winner = False
-
-        # Loop through a small grid in the upper left hand corner. The number 4 appears
-        #   because that is one less than the winning row length. This section tests for
-        #   diagonal wins that are sloped down to the right.
-        for row_num in range(len(self._board) - 4):
-            for col_num in range(len(self._board) - 4):
-                for i in range(5):
-                    value = self._board[row_num + i][col_num + i]
-                    if value == 'white':
-                        white_row_length += 1
-                        if white_row_length == 5:
-                            is_white_winner = True
-                    elif value == 'black':
-                        black_row_length += 1
-                        if black_row_length == 5:
-                            is_black_winner = True
-                    else:
-                        white_row_length = 0
-                        black_row_length = 0
-                # reset after each diagonal that's tested
-                white_row_length = 0
-                black_row_length = 0
-
-        # Now loop through all the diagonals that are sloping up to the right.
-        for row_num in range(4, len(self._board)):
-            for col_num in range(len(self._board) - 4):
-                for i in range(5):
-                    value = self._board[row_num - i][col_num + i]
-                    if value == 'white':
-                        white_row_length += 1
-                        if white_row_length == 5:
-                            is_white_winner = True
-                    elif value == 'black':
-                        black_row_length += 1
-                        if black_row_length == 5:
-                            is_black_winner = True
-                    else:
-                        white_row_length = 0
-                        black_row_length = 0
-                # reset after each diagonal that's tested
-                white_row_length = 0
-                black_row_length = 0
-
-        if is_white_winner and is_black_winner:
-            return 'both'
-        elif is_white_winner:
-            return 'white'
-        elif is_black_winner:
-            return 'black'
-        else:
-            return None
+
+# For each square of a rotated quadrant, the square (row * 3 + col) of the unrotated quadrant it comes from.
+#       Clockwise sends (row, col) to (col, 2 - row), so each new square reads from (2 - col, row).
+_SUB_BOARD_ROTATIONS = {
+    'C': tuple((2 - col) * 3 + row for row in range(3) for col in range(3)),
+    'A': tuple(col * 3 + 2 - row for row in range(3) for col in range(3)),
+}
 
 
 class SubBoard:
     """
-    Holds a 3 x 3 2D array of board values. The main 6 x 6 board typically drives the
-    data stored here, except when a rotation is performed by SubBoard, in which case the rotated
-    array is then used to update the appropriate quadrant of the main board.
+    Holds the 9 squares of one 3 x 3 quadrant in a flat list, row by row. Pentago hands these out
+    as snapshots of one quadrant of its bitboards. Changing a SubBoard changes the game it came from
+    only once Pentago.update_main_board_from_sub_board copies it back.
     """
 
-    def __init__(self):
-        """ Initializes empty 3 x 3 2D array"""
-        self._sub_board = [[None for _ in range(3)] for _ in range(3)]
+    __slots__ = ('_cells',)
+
+    def __init__(self, cells=None):
+        """ Initializes an empty quadrant, or one holding a list of 9 values in row order """
+        self._cells = [None] * 9 if cells is None else cells
 
     def print_board(self):
         """
         Displays the current state of the board to the console. This is a function, not a method,
         because it's used by both the Pentago class and the SubBoard class.
         """
-        for row in self._sub_board:
+        for row in self.get_array():
             for slot in row:
                 if slot is None:
                     print('-', end='\t')
@@ -391,50 +881,144 @@ class SubBoard:
         :param main_board_coords: The coordinates of the main board
         :param whose_turn: string 'white' or 'black' to place in the sub-board array
         """
-        sub_board_coords = list(main_board_coords)
-
-        # modify main board coords to fit within sub-board
-        if main_board_coords[0] > 2:
-            sub_board_coords[0] -= 3
-        if main_board_coords[1] > 2:
-            sub_board_coords[1] -= 3
-
-        row = sub_board_coords[0]
-        col = sub_board_coords[1]
-        self._sub_board[row][col] = whose_turn
+        # the main board coords fit within the sub-board once reduced mod 3
+        self._cells[main_board_coords[0] % 3 * 3 + main_board_coords[1] % 3] = whose_turn
 
     def rotate(self, direction):
         """ rotates the SubBoard. direction is a string 'A' or 'C' for clockwise or anticlockwise"""
-        new_sub_board = [[None for _ in range(3)] for _ in range(3)]
-
-        complex_multiplier = 1j
-        # Normally, rotating anticlockwise would require i. But the y-axis is flipped so rotation is reversed too.
-        if direction == 'A':
-            complex_multiplier *= -1
-
-        for row in range(len(self._sub_board)):
-            for col in range(len(self._sub_board[0])):
-                # shift coordinates over to center on origin and convert into complex number
-                complex_coord = (row - 1) * 1j + (col - 1)
-                # perform the rotation using complex multiplication
-                complex_coord *= complex_multiplier
-                # shift back so it's not centered on the origin anymore... no more negative coordinates
-                complex_coord += 1 + 1j
-                # extract row / col information
-                new_row = int(complex_coord.imag)
-                new_col = int(complex_coord.real)
-                # value to transfer can be None, 'white', or 'black'
-                value = self._sub_board[row][col]
-                new_sub_board[new_row][new_col] = value
-
-        self._sub_board = new_sub_board
+        old = self._cells
+        self._cells[:] = [old[square] for square in _SUB_BOARD_ROTATIONS['A' if direction == 'A' else 'C']]
+
+    def get_cells(self):
+        """ returns the 9 squares as a flat list, row by row """
+        return self._cells
 
     def get_array(self):
-        """ returns the 2d array describing the sub-board"""
-        return self._sub_board
+        """ returns a new 3 x 3 2d array describing the sub-board"""
+        cells = self._cells
+        return [cells[0:3], cells[3:6], cells[6:9]]
+
+
+# Instrumentation: while it's on, the methods and helpers below are swapped for wrapped versions that
+#       count calls and time. Turning it off puts the plain versions back, so there is no cost at all
+#       when it isn't being used.
+_INSTRUMENTED_METHODS = ('make_move', 'apply_move', 'get_game_state', 'rotate_sub_board', 'get_sub_board',
+                         'update_sub_board', 'update_main_board_from_sub_board')
+# module level helpers, and the name their counters are reported under
+_INSTRUMENTED_FUNCTIONS = {'_has_line': 'win_check', '_rotate_bits': 'rotate_bits'}
+_instrumentation_counters = {}
+_instrumentation_originals = {}
+
+
+def _timed(name, function):
+    """ wraps a function so each call adds to the [calls, seconds] counter for name """
+    counter = _instrumentation_counters.setdefault(name, [0, 0.0])
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+    return wrapper
+
+
+def _counting_game_endings(apply_move):
+    """ wraps apply_move to count whether each game that ends was won before or after the rotation """
+    @functools.wraps(apply_move)
+    def wrapper(self, move_index):
+        token = apply_move(self, move_index)
+        if self._game_state != 'UNFINISHED':
+            if token & 512:
+                _instrumentation_counters['games_ended_after_rotation'][0] += 1
+            else:
+                _instrumentation_counters['games_won_before_rotation'][0] += 1
+        return token
+    return wrapper
+
+
+def enable_instrumentation():
+    """ starts counting calls and time spent in make_move, win checks, rotations, and sub-board syncs """
+    if _instrumentation_originals:
+        return
+    _instrumentation_counters.setdefault('games_won_before_rotation', [0, 0.0])
+    _instrumentation_counters.setdefault('games_ended_after_rotation', [0, 0.0])
+    for name in _INSTRUMENTED_METHODS:
+        original = Pentago.__dict__[name]
+        _instrumentation_originals[name] = original
+        if name == 'apply_move':
+            original = _counting_game_endings(original)
+        setattr(Pentago, name, _timed(name, original))
+    for name, counter_name in _INSTRUMENTED_FUNCTIONS.items():
+        _instrumentation_originals[name] = globals()[name]
+        globals()[name] = _timed(counter_name, globals()[name])
+
+
+def disable_instrumentation():
+    """ puts the plain methods back. The counters keep their values until reset_instrumentation. """
+    for name, original in _instrumentation_originals.items():
+        if name in _INSTRUMENTED_FUNCTIONS:
+            globals()[name] = original
+        else:
+            setattr(Pentago, name, original)
+    _instrumentation_originals.clear()
+
+
+def is_instrumentation_enabled():
+    """ returns True while instrumentation is on """
+    return bool(_instrumentation_originals)
+
+
+def reset_instrumentation():
+    """ sets every counter back to zero """
+    for counter in _instrumentation_counters.values():
+        counter[0] = 0
+        counter[1] = 0.0
+
+
+def get_instrumentation_snapshot():
+    """
+    Returns a copy of the counters: {name: {'calls': count, 'seconds': total time}} for each instrumented
+    method and helper (times include time spent in anything they call), plus 'games_won_before_rotation'
+    and 'games_ended_after_rotation' as plain counts.
+    """
+    snapshot = {}
+    for name, (calls, seconds) in _instrumentation_counters.items():
+        if name.startswith('games_'):
+            snapshot[name] = calls
+        else:
+            snapshot[name] = {'calls': calls, 'seconds': seconds}
+    return snapshot
+
+
+def profile_games(function, *args, profiler=None, **kwargs):
+    """
+    Runs function(*args, **kwargs), typically something that plays a batch of games, with a profiler
+    attached for just that call.
+    :param profiler: anything with enable() and disable() methods, such as a cProfile.Profile or a
+        sampling profiler with the same interface. Defaults to a new cProfile.Profile.
+    :return: a (function's return value, profiler) tuple. For cProfile, pstats.Stats(profiler) sorts and
+        prints the results.
+    """
+    if profiler is None:
+        profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        profiler.disable()
+    return result, profiler
 
 
 def main():
+    # python -m Pentago selfplay ... runs the self-play generator instead of the demo
+    if len(sys.argv) > 1 and sys.argv[1] == 'selfplay':
+        import SelfPlay
+        SelfPlay.main(sys.argv[2:])
+        return
+
     game = Pentago()
     print(game.make_move('black', 'a2', 1, 'C'))
     print(game.make_move('white', 'a2', 1, 'C'))
@@ -1,5 +1,9 @@
+import copy
+import pickle
+import random
 import unittest
 from Pentago import *
+from Pentago import _set_quadrant_pattern, _transform_bits
 
 
 # Completed tests:
@@ -15,6 +19,45 @@ from Pentago import *
 # SubBoard class rotate() method
 # update_main_board_from_sub_board()
 # make_move()
+# get_legal_moves()
+# apply_move() / unmake_move()
+# get_zobrist_hash() / get_canonical_key()
+# canonical_symmetry() / transform_move_index()
+# get_winning_moves() / get_losing_moves() / get_immediate_results() / get_threats()
+# enable_instrumentation() / get_instrumentation_snapshot()
+
+
+def _brute_force_winner(board):
+    """ scans every run of five on a 6 x 6 list board, returns 'white', 'black', 'both', or None """
+    colors = set()
+    for row in range(6):
+        for col in range(6):
+            for row_step, col_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                cells = [(row + row_step * step, col + col_step * step) for step in range(5)]
+                if all(0 <= r < 6 and 0 <= c < 6 for r, c in cells):
+                    values = {board[r][c] for r, c in cells}
+                    if len(values) == 1 and None not in values:
+                        colors |= values
+    return 'both' if len(colors) == 2 else colors.pop() if colors else None
+
+
+def _bitboards_from_squares(black_squares, white_squares):
+    """ returns (black, white) bitboards with marbles on the given (row, col) squares """
+    return (sum(1 << (row * 6 + col) for row, col in black_squares),
+            sum(1 << (row * 6 + col) for row, col in white_squares))
+
+
+def _rotated_board(board, sub_board, rotation):
+    """ returns a copy of a 6 x 6 list board with one quadrant turned, square by square """
+    row_start = 3 if sub_board in (3, 4) else 0
+    col_start = 3 if sub_board in (2, 4) else 0
+    rotated = [list(row) for row in board]
+    for row in range(3):
+        for col in range(3):
+            # clockwise, (row, col) moves to (col, 2 - row)
+            new_row, new_col = (col, 2 - row) if rotation == 'C' else (2 - col, row)
+            rotated[row_start + new_row][col_start + new_col] = board[row_start + row][col_start + col]
+    return rotated
 
 
 class MyTestCase(unittest.TestCase):
@@ -104,6 +147,44 @@ class MyTestCase(unittest.TestCase):
 
         self.assertListEqual(comparison, game.get_board())
 
+    def test_rotate_then_update_main_board(self):
+        # the old way of rotating by hand: rotate the SubBoard, then copy it back onto the board
+        game = Pentago()
+        game.make_move('black', 'a0', 4, 'C')
+        game.make_move('white', 'b0', 4, 'C')
+        sub_board = game.get_sub_board(1)
+        sub_board.rotate('C')
+        self.assertEqual(game.get_board()[0][2], None)
+        game.update_main_board_from_sub_board(1)
+        self.assertEqual(game.get_board()[0][2], 'black')
+        self.assertEqual(game.get_board()[0][1], 'white')
+        self.assertEqual(game.get_board()[0][0], None)
+
+        # like make_move, anything but 'A' turns it clockwise
+        other = Pentago().get_sub_board(1)
+        other.update((0, 0), 'black')
+        other.rotate('clockwise')
+        self.assertEqual(other.get_array()[0][2], 'black')
+
+        # the same SubBoard can go round again, and the cached hash and state follow the board
+        sub_board.rotate('A')
+        sub_board.update((2, 2), 'black')
+        game.update_main_board_from_sub_board(1)
+        expected = Pentago()
+        expected.set_position(1 << 0 | 1 << 14, 1 << 6, 2)
+        self.assertEqual(game.get_bitboards(), expected.get_bitboards())
+        self.assertEqual(game.get_zobrist_hash(), expected.get_zobrist_hash())
+
+        # a SubBoard taken before a move in its quadrant would undo the move
+        stale = game.get_sub_board(1)
+        stale.rotate('C')
+        game.make_move('black', 'c0', 4, 'C')
+        with self.assertRaises(ValueError):
+            game.update_main_board_from_sub_board(1)
+        # quadrants nobody took a SubBoard of are left alone
+        game.update_main_board_from_sub_board(2)
+        self.assertEqual(game.get_board()[2][0], 'black')
+
     def test_get_horizontal_winner(self):
         game = Pentago()
 
@@ -352,6 +433,345 @@ class MyTestCase(unittest.TestCase):
         game.print_board()
         self.assertEqual(game.get_game_state(), 'WHITE_WON')
 
+    def test_interrupted_run(self):
+        # black has five marbles in row a, but white's a2 splits them, so nobody has won. The old row
+        #       counter kept counting black's marbles past white's and called this a win.
+        game = Pentago()
+        # sub-board 3 stays empty, so rotating it changes nothing
+        for position in ['a0', 'a2', 'a1', 'd3', 'a3', 'd4', 'a4', 'd5', 'a5']:
+            self.assertTrue(game.make_move(game.get_whose_turn(), position, 3, 'C'))
+        self.assertIsNone(game.get_winner())
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+
+        # the same for a column and both diagonals, set up directly
+        for black_squares, white_square in (([(0, 0), (1, 0), (3, 0), (4, 0), (5, 0)], (2, 0)),
+                                            ([(0, 0), (1, 1), (2, 2), (4, 4), (5, 5)], (3, 3)),
+                                            ([(0, 5), (1, 4), (3, 2), (4, 1), (5, 0)], (2, 3))):
+            game = Pentago()
+            game.set_position(*_bitboards_from_squares(black_squares, [white_square]), 6)
+            self.assertIsNone(_brute_force_winner(game.get_board()))
+            self.assertIsNone(game.get_winner())
+            self.assertEqual(game.get_game_state(), 'UNFINISHED')
+
+            # filling the gap with black is a win
+            game.set_position(*_bitboards_from_squares(black_squares + [white_square], []), 6)
+            self.assertEqual(game.get_winner(), 'black')
+            self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+    def test_rotation_tables(self):
+        # every table entry matches turning the quadrant square by square
+        for sub_board in range(1, 5):
+            for rotation in 'CA':
+                for pattern in range(512):
+                    game = Pentago()
+                    game.set_position(_set_quadrant_pattern(pattern, sub_board), 0, 10)
+                    expected = _rotated_board(game.get_board(), sub_board, rotation)
+                    game.rotate_sub_board(sub_board, rotation)
+                    self.assertEqual(game.get_board(), expected)
+
+        # and on real positions, with both colors in the quadrant
+        rng = random.Random(8)
+        game = Pentago()
+        for _ in range(300):
+            if game.get_game_state() != 'UNFINISHED':
+                game = Pentago()
+            game.apply_move(rng.choice(game.get_legal_move_indices()))
+            sub_board, rotation = rng.randint(1, 4), rng.choice('CA')
+            expected = _rotated_board(game.get_board(), sub_board, rotation)
+            black, white = game.get_bitboards()
+            game.rotate_sub_board(sub_board, rotation)
+            self.assertEqual(game.get_board(), expected)
+            self.assertEqual(game.get_bitboards(), (rotate_bitboard(black, sub_board, rotation),
+                                                    rotate_bitboard(white, sub_board, rotation)))
+
+    def test_incremental_state_matches_full_scan(self):
+        # the state make_move keeps up to date from the lines a move touches, against a scan of the board
+        #       after every move of seeded random games
+        states = {'white': 'WHITE_WON', 'black': 'BLACK_WON', 'both': 'DRAW'}
+        rng = random.Random(12)
+        seen = set()
+        for _ in range(300):
+            game = Pentago()
+            while game.get_game_state() == 'UNFINISHED':
+                move = index_to_move(rng.choice(game.get_legal_move_indices()))
+                board = [list(row) for row in game.get_board()]
+                position = string_coord_to_tuple(move[0])
+                board[position[0]][position[1]] = game.get_whose_turn()
+                # a five made by the placement wins before the rotation
+                winner = _brute_force_winner(board)
+                if winner is None:
+                    board = _rotated_board(board, move[1], move[2])
+                    winner = _brute_force_winner(board)
+                game.make_move(game.get_whose_turn(), *move)
+                self.assertEqual(game.get_board(), board)
+                expected = states.get(winner, 'DRAW' if game.get_num_turns_taken() == 36 else 'UNFINISHED')
+                self.assertEqual(game.get_game_state(), expected)
+                self.assertEqual(game.get_winner(), winner)
+                seen.add(expected)
+        self.assertEqual(seen, {'UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAW'})
+
+    def test_simultaneous_fives(self):
+        # turning sub-board 1 clockwise lines up black's row a and white's row b at the same time
+        game = Pentago()
+        game.set_position(*_bitboards_from_squares([(0, 0), (1, 0), (2, 0), (0, 3), (0, 4)],
+                                                   [(0, 1), (1, 1), (2, 1), (1, 3), (1, 4)]), 10)
+        self.assertEqual(game.make_move('black', 'f5', 1, 'C'), 'game is finished')
+        self.assertEqual(_brute_force_winner(game.get_board()), 'both')
+        self.assertEqual(game.get_winner(), 'both')
+        self.assertEqual(game.get_game_state(), 'DRAW')
+
+        # turning it the other way lines up only white's row, so black's own rotation loses the game
+        game.set_position(*_bitboards_from_squares([(5, 1), (5, 3), (3, 3), (4, 5), (2, 0)],
+                                                   [(2, 1), (1, 1), (0, 1), (1, 3), (1, 4)]), 10)
+        self.assertEqual(game.make_move('black', 'f5', 1, 'C'), 'game is finished')
+        self.assertEqual(_brute_force_winner(game.get_board()), 'white')
+        self.assertEqual(game.get_game_state(), 'WHITE_WON')
+
+    def test_get_legal_moves(self):
+        game = Pentago()
+        moves = game.get_legal_moves()
+        self.assertEqual(len(moves), 288)
+        self.assertIn(('a2', 1, 'C'), moves)
+
+        # on an empty board only the square matters: rotating any quadrant just moves the one marble
+        self.assertEqual(len(game.get_legal_moves(merge_identical=True)), 36)
+
+        game.make_move('black', 'b1', 1, 'C')
+        moves = game.get_legal_moves()
+        self.assertEqual(len(moves), 280)
+        self.assertNotIn(('b1', 2, 'A'), moves)
+
+        # every listed move is accepted by make_move, and merged moves never repeat a position
+        results = set()
+        for position, sub_board, rotation in game.get_legal_moves(merge_identical=True):
+            copy = Pentago()
+            copy.make_move('black', 'b1', 1, 'C')
+            self.assertTrue(copy.make_move('white', position, sub_board, rotation))
+            self.assertNotIn(str(copy.get_board()), results)
+            results.add(str(copy.get_board()))
+
+        # black can win on a0 before rotating, so all 8 rotations collapse into one move
+        game = Pentago()
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3']:
+            game.make_move(game.get_whose_turn(), position, 4, 'C')
+        merged = game.get_legal_moves(merge_identical=True)
+        self.assertEqual([move for move in merged if move[0] == 'a0'], [('a0', 1, 'C')])
+
+        game.make_move('black', 'a0', 1, 'C')
+        self.assertListEqual(game.get_legal_moves(), [])
+
+    def test_apply_and_unmake_move(self):
+        game = Pentago()
+        self.assertEqual(move_to_index('a2', 1, 'C'), 16)
+        self.assertEqual(index_to_move(16), ('a2', 1, 'C'))
+
+        # apply_move does the same thing as make_move
+        game.apply_move(move_to_index('a0', 2, 'A'))
+        game.apply_move(move_to_index('c5', 1, 'A'))
+        comparison = Pentago()
+        comparison.make_move('black', 'a0', 2, 'A')
+        comparison.make_move('white', 'c5', 1, 'A')
+        self.assertListEqual(comparison.get_board(), game.get_board())
+
+        # play a game to the end and take every move back
+        history = []
+        for position in ['a1', 'f0', 'a2', 'f1', 'a3', 'f2', 'a4', 'f3']:
+            before = (game.get_board(), game.get_whose_turn(), game.get_game_state())
+            history.append((before, game.apply_move(move_to_index(position, 4, 'C'))))
+        before = (game.get_board(), game.get_whose_turn(), game.get_game_state())
+        history.append((before, game.apply_move(move_to_index('a0', 3, 'A'))))
+        self.assertEqual(game.get_game_state(), 'BLACK_WON')
+
+        for before, token in reversed(history):
+            game.unmake_move(token)
+            self.assertEqual((game.get_board(), game.get_whose_turn(), game.get_game_state()), before)
+
+    def test_zobrist_hash_and_canonical_key(self):
+        # the same position reached in a different order has the same hash
+        game = Pentago()
+        game.make_move('black', 'a0', 4, 'C')
+        game.make_move('white', 'f5', 2, 'C')
+        game.make_move('black', 'b1', 2, 'A')
+        game2 = Pentago()
+        game2.make_move('black', 'b1', 4, 'C')
+        game2.make_move('white', 'f5', 2, 'C')
+        game2.make_move('black', 'a0', 2, 'A')
+        self.assertListEqual(game.get_board(), game2.get_board())
+        self.assertEqual(game.get_zobrist_hash(), game2.get_zobrist_hash())
+
+        # rotations keep the hash up to date, and unmaking a move puts the old hash back
+        before = game.get_zobrist_hash()
+        token = game.apply_move(move_to_index('c2', 1, 'C'))
+        self.assertNotEqual(before, game.get_zobrist_hash())
+        game.unmake_move(token)
+        self.assertEqual(before, game.get_zobrist_hash())
+
+        # a marble in opposite corners is the same position turned halfway around
+        game = Pentago()
+        game.make_move('black', 'a0', 4, 'C')
+        game2 = Pentago()
+        game2.make_move('black', 'f5', 1, 'A')
+        self.assertNotEqual(game.get_zobrist_hash(), game2.get_zobrist_hash())
+        self.assertEqual(game.get_canonical_key(), game2.get_canonical_key())
+
+        # a mirror image is too, but a different color isn't
+        game2 = Pentago()
+        game2.make_move('black', 'a5', 1, 'A')
+        self.assertEqual(game.get_canonical_key(), game2.get_canonical_key())
+        game.make_move('white', 'b1', 4, 'C')
+        game2.make_move('white', 'b1', 4, 'C')
+        self.assertNotEqual(game.get_canonical_key(), game2.get_canonical_key())
+
+    def test_transform_move_index(self):
+        game = Pentago()
+        for move in ['b1', 'e4', 'c2']:
+            game.make_move(game.get_whose_turn(), move, 3, 'A')
+        black, white = game.get_bitboards()
+        key, symmetry = canonical_symmetry(black, white)
+        self.assertEqual(key, canonical_key(black, white))
+        for symmetry in range(8):
+            for move_index in (0, 13, 100, 287):
+                # playing a move and then moving the board matches moving the board and then the move
+                played = Pentago()
+                played.set_position(black, white)
+                played.apply_move(move_index)
+                moved = Pentago()
+                moved.set_position(_transform_bits(black, symmetry), _transform_bits(white, symmetry))
+                moved.apply_move(transform_move_index(move_index, symmetry))
+                self.assertEqual(moved.get_bitboards(), tuple(_transform_bits(bits, symmetry)
+                                                             for bits in played.get_bitboards()))
+            self.assertEqual(transform_move_index(transform_move_index(100, symmetry), inverse_symmetry(symmetry)),
+                             100)
+
+    def test_tactical_analysis(self):
+        def squares(*positions):
+            return sum(1 << (row * 6 + col) for row, col in map(string_coord_to_tuple, positions))
+
+        # black has a0 - a3 and it's white's turn, so black threatens a4 with any rotation
+        game = Pentago()
+        game.set_position(squares('a0', 'a1', 'a2', 'a3'), squares('f0', 'f1', 'f2'))
+        a4 = move_to_index('a4', 1, 'C')
+        self.assertTrue(set(range(a4, a4 + 8)) <= set(game.get_threats()))
+        self.assertEqual(game.get_winning_moves(), [])
+
+        # black has a0 - a2 and b3. A marble on c3 and a clockwise turn of quadrant 2 brings both
+        #       b3 and c3 up into the top row
+        game.set_position(squares('a0', 'a1', 'a2', 'b3'), squares('f0', 'f1', 'f2', 'f4'))
+        self.assertIn(move_to_index('c3', 2, 'C'), game.get_winning_moves())
+        self.assertNotIn(move_to_index('c3', 2, 'A'), game.get_winning_moves())
+        self.assertNotIn(move_to_index('c3', 1, 'C'), game.get_winning_moves())
+
+        # the same turn made by white hands black the game
+        game.set_position(squares('a0', 'a1', 'a2', 'b3', 'c3'), squares('f0', 'f1', 'f2', 'f4'))
+        self.assertIn(move_to_index('e0', 2, 'C'), game.get_losing_moves())
+        self.assertNotIn(move_to_index('e0', 2, 'A'), game.get_losing_moves())
+
+        # check against trying every move, over whole random games
+        def results(game):
+            mover = 'BLACK_WON' if game.get_whose_turn() == 'black' else 'WHITE_WON'
+            wins, losses = [], []
+            for move in game.get_legal_move_indices():
+                token = game.apply_move(move)
+                state = game.get_game_state()
+                game.unmake_move(token)
+                if state == mover:
+                    wins.append(move)
+                elif state in ('BLACK_WON', 'WHITE_WON'):
+                    losses.append(move)
+            return wins, losses
+
+        rng = random.Random(11)
+        seen_wins = seen_losses = 0
+        for _ in range(15):
+            game = Pentago()
+            while game.get_game_state() == 'UNFINISHED':
+                wins, losses = results(game)
+                self.assertEqual(game.get_winning_moves(), wins)
+                self.assertEqual(game.get_losing_moves(), losses)
+                self.assertEqual(game.get_immediate_results(), (wins, losses))
+                seen_wins += bool(wins)
+                seen_losses += bool(losses)
+                game.apply_move(rng.choice(game.get_legal_move_indices()))
+            self.assertEqual(game.get_winning_moves(), [])
+            self.assertEqual(game.get_threats(), [])
+            self.assertEqual(game.get_immediate_results(), ([], []))
+        self.assertGreater(seen_wins, 0)
+        self.assertGreater(seen_losses, 0)
+
+    def test_compact_layout(self):
+        game = Pentago()
+        game.make_move('black', 'b1', 2, 'A')
+        self.assertFalse(hasattr(game, '__dict__'))
+        self.assertFalse(hasattr(game.get_sub_board(1), '__dict__'))
+        # copies still work without a __dict__
+        duplicate = copy.copy(game)
+        self.assertEqual(duplicate.get_bitboards(), game.get_bitboards())
+        self.assertEqual(pickle.loads(pickle.dumps(game)).get_zobrist_hash(), game.get_zobrist_hash())
+
+    def test_instrumentation(self):
+        plain_make_move = Pentago.make_move
+        reset_instrumentation()
+        enable_instrumentation()
+        try:
+            self.assertTrue(is_instrumentation_enabled())
+            # black wins by a row before rotating, then a fresh game gets a few moves
+            game = Pentago()
+            for move in ('a0', 'f5', 'a1', 'f4', 'a2', 'e5', 'a3', 'e4'):
+                game.make_move(game.get_whose_turn(), move, 2, 'C')
+                game.rotate_sub_board(2, 'A')
+            game = Pentago()
+            game.make_move('black', 'a0', 1, 'C')
+            game.get_sub_board(1)
+            snapshot = get_instrumentation_snapshot()
+        finally:
+            disable_instrumentation()
+
+        self.assertEqual(snapshot['make_move']['calls'], 9)
+        self.assertEqual(snapshot['apply_move']['calls'], 9)
+        self.assertEqual(snapshot['rotate_sub_board']['calls'], 8)
+        self.assertEqual(snapshot['get_sub_board']['calls'], 1)
+        self.assertGreater(snapshot['win_check']['calls'], 0)
+        self.assertGreaterEqual(snapshot['rotate_bits']['calls'], 17)
+        self.assertGreater(snapshot['make_move']['seconds'], 0)
+
+        # turning it off puts the plain methods back and leaves the counters alone
+        self.assertFalse(is_instrumentation_enabled())
+        self.assertIs(Pentago.make_move, plain_make_move)
+        Pentago().make_move('black', 'a0', 1, 'C')
+        self.assertEqual(get_instrumentation_snapshot()['make_move']['calls'], 9)
+        reset_instrumentation()
+        self.assertEqual(get_instrumentation_snapshot()['make_move']['calls'], 0)
+
+    def test_instrumentation_game_endings(self):
+        reset_instrumentation()
+        enable_instrumentation()
+        try:
+            # black's fifth marble makes a row before the rotation
+            game = Pentago()
+            for move in ('a0', 'f5', 'a1', 'f4', 'a2', 'e5', 'a3', 'e4', 'a4'):
+                game.make_move(game.get_whose_turn(), move, 4, 'C')
+            snapshot = get_instrumentation_snapshot()
+        finally:
+            disable_instrumentation()
+        self.assertEqual(snapshot['games_won_before_rotation'], 1)
+        self.assertEqual(snapshot['games_ended_after_rotation'], 0)
+
+    def test_profile_games(self):
+        calls = []
+
+        class Recorder:
+            def enable(self):
+                calls.append('enable')
+
+            def disable(self):
+                calls.append('disable')
+
+        result, profiler = profile_games(lambda: Pentago().make_move('black', 'a0', 1, 'C'), profiler=Recorder())
+        self.assertTrue(result)
+        self.assertEqual(calls, ['enable', 'disable'])
+        result, profiler = profile_games(Pentago().get_num_turns_taken)
+        self.assertEqual(result, 0)
+        self.assertTrue(hasattr(profiler, 'getstats'))
 
 
 if __name__ == '__main__':
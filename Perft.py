@@ -0,0 +1,122 @@
+# Description: Counts the leaves of the Pentago move tree (perft), to check and time move generation.
+#       Run it with: python Perft.py --help
+
+import argparse
+import copy
+import sys
+import time
+from multiprocessing import Pool
+
+from Pentago import Pentago, index_to_move
+
+
+def perft(game, depth, merge_transpositions=False):
+    """
+    Counts the positions reached by every sequence of depth legal moves. A move that ends the game
+    counts as a leaf even if it comes before depth moves.
+    :param merge_transpositions: if True, a position reached by more than one path at the same ply is only
+        counted and expanded once, which counts the distinct positions at each ply instead of move paths.
+        Moves that lead to the same board from one position are always merged in that case too.
+    """
+    game = copy.copy(game)
+    if merge_transpositions:
+        return _count_distinct(game, depth)
+    return _count_paths(game, depth)
+
+
+def _count_paths(game, depth):
+    """ counts leaves of the full move tree, playing moves with apply_move and taking them back """
+    if depth == 0 or game.get_game_state() != 'UNFINISHED':
+        return 1
+    moves = game.get_legal_move_indices()
+    if depth == 1:
+        return len(moves)
+    leaves = 0
+    for move in moves:
+        token = game.apply_move(move)
+        leaves += _count_paths(game, depth - 1)
+        game.unmake_move(token)
+    return leaves
+
+
+def _count_distinct(game, depth):
+    """ counts distinct positions ply by ply, keeping the (black, white) bitboards of the current ply in a set """
+    frontier = {game.get_bitboards()}
+    finished = 0
+    for _ in range(depth):
+        next_frontier = set()
+        for black, white in frontier:
+            game.set_position(black, white)
+            if game.get_game_state() != 'UNFINISHED':
+                finished += 1
+                continue
+            for move in game.get_legal_move_indices(merge_identical=True):
+                token = game.apply_move(move)
+                next_frontier.add(game.get_bitboards())
+                game.unmake_move(token)
+        frontier = next_frontier
+    return finished + len(frontier)
+
+
+def _divide_one(arguments):
+    """ counts the subtree under one root move, for the process pool """
+    game, move, depth = arguments
+    game.apply_move(move)
+    return move, _count_paths(game, depth - 1)
+
+
+def divide(game, depth, processes=None):
+    """
+    Counts perft(depth) separately for each root move, spread over a process pool.
+    :param processes: worker processes, defaults to one per core. With 1 everything runs in this process.
+    :return: a {(position, sub_board, rotation): leaves} dict in move order
+    """
+    moves = game.get_legal_move_indices()
+    if depth < 1 or not moves:
+        return {}
+    tasks = [(copy.copy(game), move, depth) for move in moves]
+    if processes == 1:
+        results = map(_divide_one, tasks)
+        return {index_to_move(move): leaves for move, leaves in results}
+    with Pool(processes) as pool:
+        return {index_to_move(move): leaves for move, leaves in pool.imap(_divide_one, tasks)}
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Count the leaves of the Pentago move tree.')
+    parser.add_argument('depth', type=int)
+    parser.add_argument('--moves', nargs='*', default=[],
+                        help="moves to play first, like a2:1:C, to start from another position")
+    parser.add_argument('--divide', action='store_true', help='show the count under each root move')
+    parser.add_argument('--merge-transpositions', action='store_true',
+                        help='count distinct positions instead of move paths')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, defaults to one per core')
+    args = parser.parse_args(argv)
+
+    game = Pentago()
+    for move in args.moves:
+        position, sub_board, rotation = move.split(':')
+        result = game.make_move(game.get_whose_turn(), position, int(sub_board), rotation)
+        if result is not True and result != 'game is finished':
+            parser.error('{}: {}'.format(move, result))
+
+    start = time.perf_counter()
+    if args.merge_transpositions:
+        total = perft(game, args.depth, merge_transpositions=True)
+    elif args.divide or args.depth > 1:
+        counts = divide(game, args.depth, args.processes)
+        if args.divide:
+            for (position, sub_board, rotation), leaves in counts.items():
+                print('{} {} {}: {}'.format(position, sub_board, rotation, leaves))
+        total = sum(counts.values()) if counts else perft(game, args.depth)
+    else:
+        total = perft(game, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print('perft({}) = {}'.format(args.depth, total))
+    print('{:.2f} seconds, {:.0f} leaves per second'.format(elapsed, total / elapsed if elapsed else 0.0))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
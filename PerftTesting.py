@@ -0,0 +1,58 @@
+import copy
+import random
+import unittest
+from Pentago import *
+from Perft import *
+
+
+def _brute_force(game, depth):
+    """ counts move paths the slow way, with make_move on copies of the board """
+    if depth == 0 or game.get_game_state() != 'UNFINISHED':
+        return 1
+    leaves = 0
+    for row in 'abcdef':
+        for col in range(6):
+            for sub_board in range(1, 5):
+                for rotation in 'CA':
+                    child = Pentago()
+                    child.set_position(*game.get_bitboards(), game.get_num_turns_taken())
+                    if child.make_move(child.get_whose_turn(), row + str(col), sub_board, rotation) in \
+                            (True, 'game is finished'):
+                        leaves += _brute_force(child, depth - 1)
+    return leaves
+
+
+class PerftTestCase(unittest.TestCase):
+    def test_opening(self):
+        game = Pentago()
+        self.assertEqual(perft(game, 1), 288)
+        self.assertEqual(perft(game, 2), 288 * 280)
+        # distinct positions: one black marble anywhere, then one of each color anywhere
+        self.assertEqual(perft(game, 1, merge_transpositions=True), 36)
+        self.assertEqual(perft(game, 2, merge_transpositions=True), 36 * 35)
+
+    def test_matches_make_move(self):
+        # late in random games, where wins and full boards cut the tree short
+        rng = random.Random(6)
+        for _ in range(3):
+            game = Pentago()
+            while game.get_num_turns_taken() < 31:
+                game.apply_move(rng.choice(game.get_legal_move_indices()))
+                if game.get_game_state() != 'UNFINISHED':
+                    game = Pentago()
+            before = copy.copy(game)
+            self.assertEqual(perft(game, 2), _brute_force(game, 2))
+            self.assertEqual(game.get_bitboards(), before.get_bitboards())
+
+    def test_divide(self):
+        game = Pentago()
+        game.make_move('black', 'c2', 1, 'C')
+        counts = divide(game, 2, processes=2)
+        self.assertEqual(len(counts), 280)
+        self.assertEqual(counts[('a0', 1, 'C')], 272)
+        self.assertEqual(sum(counts.values()), perft(game, 2))
+        self.assertEqual(divide(game, 2, processes=1), counts)
+
+
+if __name__ == '__main__':
+    unittest.main()
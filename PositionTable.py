@@ -0,0 +1,134 @@
+# Description: A file of fixed size records sorted by canonical position key, searched in place through
+#       mmap. The opening book and the endgame database are both stored this way.
+
+import mmap
+import os
+import struct
+
+# The file is a header (4 magic bytes saying what kind of table it is, a number the table's owner keeps
+#       with it, and the number of records) followed by the records sorted by key. A record holds the
+#       72 bit canonical key (see Pentago.canonical_key) as its low 64 bits and high 8 bits, then the
+#       fields of a layout made by record_layout.
+_HEADER = struct.Struct('<4sIQ')
+_LOW_BITS = (1 << 64) - 1
+
+
+def record_layout(fields):
+    """
+    Returns the struct.Struct of a record whose fields after the key are given by a struct format
+    string without its byte order, like 'bH' for a signed byte and an unsigned short.
+    """
+    return struct.Struct('<QB' + fields)
+
+
+def pack_record(layout, key, fields):
+    """ returns the bytes of one record, with fields a tuple that matches the layout """
+    return layout.pack(key & _LOW_BITS, key >> 64, *fields)
+
+
+def unpack_records(layout, data):
+    """ returns a {key: fields} dict of the records packed back to back in data """
+    return {high << 64 | low: tuple(fields) for low, high, *fields in layout.iter_unpack(data)}
+
+
+def write_table(path, magic, info, layout, records):
+    """
+    Writes a {key: fields} dict to a table file, sorted by key. The file is written under another name
+    and renamed, so a reader never sees half of it.
+    :param info: a number from 0 to 2 ** 32 - 1 kept in the header, see PositionTable.get_info
+    :return: the number of records
+    """
+    with open(path + '.tmp', 'wb') as output:
+        output.write(_HEADER.pack(magic, info, len(records)))
+        for key in sorted(records):
+            output.write(pack_record(layout, key, records[key]))
+    os.replace(path + '.tmp', path)
+    return len(records)
+
+
+class PositionTable:
+    """
+    Looks up records by key in a table file made by write_table. The file isn't opened until the first
+    lookup, and then it's read through mmap, so only the pages a lookup touches get loaded.
+    """
+
+    __slots__ = ('_path', '_magic', '_layout', '_kind', '_file', '_data', '_info', '_count')
+
+    def __init__(self, path, magic, layout, kind):
+        """
+        Remembers where the table is, without opening it yet.
+        :param magic: the bytes the file has to start with
+        :param layout: the record layout, see record_layout
+        :param kind: what the table is, for the error raised when the magic doesn't match, like 'an opening book'
+        """
+        self._path = path
+        self._magic = magic
+        self._layout = layout
+        self._kind = kind
+        self._file = None
+        self._data = None
+        self._info = 0
+        self._count = 0
+
+    def _open(self):
+        """ maps the file into memory and reads its header """
+        self._file = open(self._path, 'rb')
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._info, self._count = _HEADER.unpack_from(self._data)
+        if magic != self._magic:
+            self.close()
+            raise ValueError('{} is not {}'.format(self._path, self._kind))
+
+    def get_info(self):
+        """ returns the number kept in the file's header """
+        if self._data is None:
+            self._open()
+        return self._info
+
+    def __len__(self):
+        """ returns the number of records """
+        if self._data is None:
+            self._open()
+        return self._count
+
+    def find(self, key):
+        """ returns the fields of the record with the key, or None if there isn't one """
+        if self._data is None:
+            self._open()
+
+        # binary search over the sorted records
+        data = self._data
+        layout = self._layout
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_low, key_high, *fields = layout.unpack_from(data, _HEADER.size + middle * layout.size)
+            record_key = key_high << 64 | key_low
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return tuple(fields)
+        return None
+
+    def get_records(self):
+        """ returns every record as a {key: fields} dict """
+        if self._data is None:
+            self._open()
+        return unpack_records(self._layout, self._data[_HEADER.size:_HEADER.size + self._count * self._layout.size])
+
+    def close(self):
+        """ unmaps and closes the file, it's opened again by the next lookup """
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+            self._data = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
@@ -0,0 +1,37 @@
+import os
+import random
+import tempfile
+import unittest
+from PositionTable import *
+
+
+class PositionTableTestCase(unittest.TestCase):
+    def test_write_and_find(self):
+        rng = random.Random(6)
+        layout = record_layout('bH')
+        records = {rng.getrandbits(72): (rng.randint(-1, 1), rng.randrange(288)) for _ in range(500)}
+        records[0] = (0, 0)
+        records[(1 << 72) - 1] = (1, 287)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            # nothing is opened until it's needed, so the table can be made before the file
+            table = PositionTable(path, b'TEST', layout, 'a test table')
+            self.assertEqual(write_table(path, b'TEST', 7, layout, records), len(records))
+            with table:
+                self.assertEqual(len(table), len(records))
+                self.assertEqual(table.get_info(), 7)
+                for key, fields in records.items():
+                    self.assertEqual(table.find(key), fields)
+                self.assertIsNone(table.find(12345))
+                self.assertEqual(table.get_records(), records)
+
+            # records packed back to back read back the same
+            data = b''.join(pack_record(layout, key, fields) for key, fields in records.items())
+            self.assertEqual(unpack_records(layout, data), records)
+
+            with self.assertRaisesRegex(ValueError, 'is not another table'):
+                PositionTable(path, b'ELSE', layout, 'another table').find(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
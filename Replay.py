@@ -0,0 +1,101 @@
+# Description: Replays and validates many recorded Pentago games quickly, spread over a process pool.
+
+import itertools
+import os
+from collections import deque
+from multiprocessing import Pool
+
+from Pentago import Pentago, tuple_to_string_coord
+
+# square index for every position string make_move accepts
+_SQUARES = {tuple_to_string_coord(divmod(index, 6)): index for index in range(36)}
+_SQUARES.update({position.upper(): index for position, index in list(_SQUARES.items())})
+
+# one game per worker process is reset and reused for every replay
+_worker_game = None
+
+# how many chunks each worker process can have waiting for it, so the workers never sit idle while
+#       only a bounded part of the stream is held in memory
+_CHUNKS_PER_PROCESS = 2
+
+
+def replay_game(moves, game=None):
+    """
+    Plays a recorded game from the start and reports how it ended. Moves are checked the same way
+    make_move checks them, and the replay stops at the first move make_move would refuse.
+    :param moves: a sequence of moves, each one a move index (see Pentago.move_to_index), a
+        (position, sub_board, rotation) triple, or a (color, position, sub_board, rotation) tuple
+        like the arguments to make_move. Only the last form can be the wrong player's turn.
+    :param game: a Pentago object to reuse instead of making a new one. Its position is replaced.
+    :return: a (game state, move number, problem) tuple. move number is the 0 based number of the first
+        illegal move and problem is what make_move would have returned for it ('game is finished',
+        "not this player's turn", or 'position is not empty'). Both are None if every move was legal.
+        The game state is the state after the last legal move.
+    """
+    if game is None:
+        game = Pentago()
+    else:
+        game.set_position(0, 0, 0)
+
+    for move_number, move in enumerate(moves):
+        if game.get_game_state() != 'UNFINISHED':
+            return game.get_game_state(), move_number, 'game is finished'
+
+        if isinstance(move, int):
+            move_index = move
+        else:
+            if len(move) == 4:
+                color, position, sub_board, rotation = move
+                if color != game.get_whose_turn():
+                    return game.get_game_state(), move_number, "not this player's turn"
+            else:
+                position, sub_board, rotation = move
+            move_index = _SQUARES[position] * 8 + (sub_board - 1) * 2 + (rotation == 'A')
+
+        black, white = game.get_bitboards()
+        if (black | white) >> (move_index >> 3) & 1:
+            return game.get_game_state(), move_number, 'position is not empty'
+        game.apply_move(move_index)
+
+    return game.get_game_state(), None, None
+
+
+def _replay_chunk(chunk):
+    """ replays a list of games in a worker process, with the worker's reusable game """
+    global _worker_game
+    if _worker_game is None:
+        _worker_game = Pentago()
+    return [replay_game(moves, _worker_game) for moves in chunk]
+
+
+def replay_games(games, processes=None, chunk_size=256):
+    """
+    Replays a stream of games across a process pool. Games are read from the iterable a chunk at a time,
+    and a new chunk is only sent out once an earlier one's results have been taken, so no more than a
+    few chunks per process are held at once and the stream can be longer than memory.
+    :param games: an iterable of move sequences, see replay_game
+    :param processes: number of worker processes, defaults to one per core. With 1 the games are
+        replayed in this process.
+    :param chunk_size: how many games are sent to a worker at a time
+    :return: a generator of replay_game results, in the same order as the games
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        game = Pentago()
+        for moves in games:
+            yield replay_game(moves, game)
+        return
+
+    games = iter(games)
+    with Pool(processes) as pool:
+        # Pool.imap would read the whole iterable ahead of the workers, so chunks are handed out here instead
+        pending = deque()
+        while True:
+            while len(pending) < processes * _CHUNKS_PER_PROCESS:
+                chunk = list(itertools.islice(games, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(_replay_chunk, (chunk,)))
+            if not pending:
+                return
+            yield from pending.popleft().get()
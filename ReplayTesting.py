@@ -0,0 +1,66 @@
+import random
+import unittest
+from Pentago import *
+from Replay import *
+
+
+class ReplayTestCase(unittest.TestCase):
+    def test_replay_game(self):
+        moves = [('black', 'a1', 4, 'C'), ('white', 'f0', 4, 'C'), ('black', 'a2', 4, 'C'),
+                 ('white', 'f1', 4, 'C'), ('black', 'a3', 4, 'C'), ('white', 'f2', 4, 'C'),
+                 ('black', 'a4', 4, 'C'), ('white', 'f3', 4, 'C'), ('black', 'a0', 4, 'C')]
+        self.assertEqual(replay_game(moves), ('BLACK_WON', None, None))
+
+        # the same game written as triples and as move indices
+        self.assertEqual(replay_game([move[1:] for move in moves]), ('BLACK_WON', None, None))
+        self.assertEqual(replay_game([move_to_index(*move[1:]) for move in moves]), ('BLACK_WON', None, None))
+
+        # each kind of illegal move is caught where it happens
+        self.assertEqual(replay_game(moves + [('white', 'b4', 4, 'A')]), ('BLACK_WON', 9, 'game is finished'))
+        self.assertEqual(replay_game(moves[:2] + [('white', 'c0', 1, 'C')]),
+                         ('UNFINISHED', 2, "not this player's turn"))
+        self.assertEqual(replay_game(moves[:2] + [('black', 'F0', 1, 'C')]),
+                         ('UNFINISHED', 2, 'position is not empty'))
+
+    def test_replay_games_matches_make_move(self):
+        rng = random.Random(4)
+        cells = [row + str(col) for row in 'abcdef' for col in range(6)]
+        games = []
+        expected = []
+        for _ in range(300):
+            game = Pentago()
+            moves = []
+            for move_number in range(40):
+                color = game.get_whose_turn() if rng.random() < 0.98 else 'white'
+                move = (color, rng.choice(cells), rng.randint(1, 4), rng.choice('CA'))
+                moves.append(move)
+                was_finished = game.get_game_state() != 'UNFINISHED'
+                answer = game.make_move(*move)
+                if was_finished or answer not in (True, 'game is finished'):
+                    result = (game.get_game_state(), move_number, answer)
+                    break
+            else:
+                result = (game.get_game_state(), None, None)
+            games.append(moves)
+            expected.append(result)
+
+        self.assertEqual(list(replay_games(games, processes=1)), expected)
+        self.assertEqual(list(replay_games(iter(games), processes=2, chunk_size=16)), expected)
+
+    def test_replay_games_reads_ahead_a_little(self):
+        taken = []
+
+        def stream():
+            for number in range(100000):
+                taken.append(number)
+                yield [move_to_index('a0', 1, 'C')]
+
+        results = replay_games(stream(), processes=2, chunk_size=10)
+        self.assertEqual(next(results), ('UNFINISHED', None, None))
+        # the chunks in flight, and the one read in after the first came back
+        self.assertLessEqual(len(taken), 10 * 5)
+        self.assertEqual(sum(1 for _ in results), 99999)
+
+
+if __name__ == '__main__':
+    unittest.main()
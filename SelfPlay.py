@@ -0,0 +1,198 @@
+# Description: Plays Pentago games between computer players across a pool of processes and streams
+#       the finished games to a file. Run it with: python -m Pentago selfplay --help
+
+import argparse
+import inspect
+import json
+import math
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from Pentago import Pentago, index_to_move
+from AlphaBetaEngine import AlphaBetaEngine
+
+PLAYER_TYPES = ('random', 'greedy', 'search')
+
+# players are built once per worker process and reused for every game it plays, as (function, engine) pairs
+_players = {}
+
+
+def _get_player(player_type, search_depth, search_time):
+    """
+    Returns a function that takes (game, rng) and picks a move index, and the AlphaBetaEngine it
+    searches with, or None for random players.
+    """
+    key = (player_type, search_depth, search_time)
+    if key not in _players:
+        time_limit = math.inf if search_time is None else search_time
+        if player_type == 'random':
+            _players[key] = (lambda game, rng: rng.choice(game.get_legal_move_indices()), None)
+        elif player_type in ('greedy', 'search'):
+            # greedy is one ply of search: take a win if there is one, otherwise the best looking move
+            if player_type == 'greedy':
+                engine = AlphaBetaEngine(time_limit=time_limit, max_depth=1, table_size_mb=1)
+            else:
+                engine = AlphaBetaEngine(time_limit=time_limit, max_depth=search_depth)
+            _players[key] = (lambda game, rng: engine.search(game)['move_index'], engine)
+        else:
+            raise ValueError('unknown player type: ' + str(player_type))
+    return _players[key]
+
+
+def play_game(game_number, black='random', white='random', seed=0, random_plies=0, search_depth=2,
+              search_time=1.0):
+    """
+    Plays one game. The game's random choices come from (seed, game_number) only, and the players'
+    transposition tables are emptied before it starts, so a game comes out the same no matter which
+    worker plays it or in what order. That holds for random and greedy players, and for search players
+    when search_time is None; a search cut off by its time limit stops wherever the clock says.
+    :param black: player type for black, one of PLAYER_TYPES
+    :param white: player type for white
+    :param random_plies: how many moves at the start of the game are played at random, so that
+        games between deterministic players don't all come out the same
+    :param search_depth: depth for search players
+    :param search_time: seconds per move for greedy and search players, or None to always finish the search
+    :return: a dict with the 'game' number, the settings it was played with ('seed', the 'black' and
+        'white' player types, 'random_plies', 'search_depth' and 'search_time'), the 'moves' as
+        [position, sub_board, rotation] lists, and the final game state as 'result'
+    """
+    # random.Random won't take the (seed, game_number) pair itself, but a str of it is hashed whole, so
+    #       different pairs don't collide
+    rng = random.Random('{}/{}'.format(seed, game_number))
+    players = {}
+    for color, player_type in (('black', black), ('white', white)):
+        players[color], engine = _get_player(player_type, search_depth, search_time)
+        if engine is not None:
+            engine.get_table().clear()
+    game = Pentago()
+    moves = []
+    while game.get_game_state() == 'UNFINISHED':
+        if len(moves) < random_plies:
+            move_index = rng.choice(game.get_legal_move_indices())
+        else:
+            move_index = players[game.get_whose_turn()](game, rng)
+        position, sub_board, rotation = index_to_move(move_index)
+        game.make_move(game.get_whose_turn(), position, sub_board, rotation)
+        moves.append([position, sub_board, rotation])
+    return {'game': game_number, 'seed': seed, 'black': black, 'white': white, 'random_plies': random_plies,
+            'search_depth': search_depth, 'search_time': search_time, 'moves': moves,
+            'result': game.get_game_state()}
+
+
+def _game_settings(settings):
+    """ returns the settings play_game would play with, its defaults filled in for any not given """
+    parameters = inspect.signature(play_game).parameters
+    return {name: settings.get(name, parameter.default) for name, parameter in parameters.items()
+            if name != 'game_number'}
+
+
+def _play_game_from_arguments(arguments):
+    """ unpacks a (game_number, settings dict) pair for Pool.imap_unordered """
+    game_number, settings = arguments
+    return play_game(game_number, **settings)
+
+
+def read_finished_games(path, settings=None):
+    """
+    Returns the set of game numbers already in an output file. A partly written last line, left
+    behind if a run was killed, is cut off so the file can be appended to.
+    :param settings: if given, the play_game settings the file is going to be added to with. A ValueError
+        is raised if its games were played with different ones, since resuming would mix the two.
+    """
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, 'rb+') as output:
+        data = output.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            output.truncate(end)
+    expected = None if settings is None else _game_settings(settings)
+    for line in data[:end].splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if expected is not None:
+                # files from before every setting was kept only have some of them
+                different = sorted(name for name, value in expected.items() if record.get(name, value) != value)
+                if different:
+                    raise ValueError('{} was played with different settings: {}'.format(path, ', '.join(different)))
+                expected = None
+            finished.add(record['game'])
+    return finished
+
+
+def run_self_play(output_path, num_games, workers=None, chunk_size=100, resume=True, report_every=10.0,
+                  report_file=sys.stderr, **settings):
+    """
+    Plays num_games games across a process pool and appends each one to output_path as a line of
+    JSON. Finished games are written in chunks as they come in, so memory use doesn't grow with the
+    number of games.
+    :param workers: number of worker processes, defaults to one per core
+    :param chunk_size: how many finished games to collect before writing them out
+    :param resume: if True, game numbers already in the output file are skipped. The file's games have to
+        have been played with the same settings.
+    :param report_every: seconds between games per second reports, or None for no reports
+    :param settings: passed to play_game (black, white, seed, random_plies, search_depth, search_time)
+    :return: the number of games played by this call
+    """
+    finished = read_finished_games(output_path, settings) if resume else set()
+    todo = [(game_number, settings) for game_number in range(num_games) if game_number not in finished]
+    start = time.monotonic()
+    last_report = start
+    played = 0
+    chunk = []
+
+    with open(output_path, 'a' if resume else 'w') as output, Pool(workers) as pool:
+        for record in pool.imap_unordered(_play_game_from_arguments, todo):
+            chunk.append(json.dumps(record) + '\n')
+            played += 1
+            if len(chunk) >= chunk_size:
+                output.writelines(chunk)
+                output.flush()
+                chunk = []
+
+            now = time.monotonic()
+            if report_every is not None and now - last_report >= report_every:
+                print('{} / {} games, {:.1f} games per second'.format(
+                    played, len(todo), played / (now - start)), file=report_file)
+                last_report = now
+        output.writelines(chunk)
+
+    if report_every is not None:
+        elapsed = time.monotonic() - start
+        print('{} games in {:.1f} seconds, {:.1f} games per second'.format(
+            played, elapsed, played / elapsed if elapsed else 0.0), file=report_file)
+    return played
+
+
+def main(argv=None):
+    """ command line entry point, see python -m Pentago selfplay --help """
+    parser = argparse.ArgumentParser(prog='python -m Pentago selfplay',
+                                     description='Play Pentago games between computer players.')
+    parser.add_argument('--games', type=int, default=100, help='total number of games')
+    parser.add_argument('--output', default='selfplay.jsonl', help='file the games are appended to')
+    parser.add_argument('--black', choices=PLAYER_TYPES, default='random')
+    parser.add_argument('--white', choices=PLAYER_TYPES, default='random')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to one per core')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--random-plies', type=int, default=0, help='moves played at random at the start')
+    parser.add_argument('--search-depth', type=int, default=2, help='depth for search players')
+    parser.add_argument('--search-time', type=float, default=1.0, help='seconds per move for search players')
+    parser.add_argument('--no-time-limit', action='store_true',
+                        help='search to --search-depth however long it takes, so search games can be played again')
+    parser.add_argument('--chunk-size', type=int, default=100, help='games written to disk at a time')
+    parser.add_argument('--no-resume', action='store_true', help='overwrite the output instead of resuming')
+    parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress reports')
+    args = parser.parse_args(argv)
+
+    run_self_play(args.output, args.games, workers=args.workers, chunk_size=args.chunk_size,
+                  resume=not args.no_resume, report_every=args.report_every, black=args.black, white=args.white,
+                  seed=args.seed, random_plies=args.random_plies, search_depth=args.search_depth,
+                  search_time=None if args.no_time_limit else args.search_time)
+
+
+if __name__ == '__main__':
+    main()
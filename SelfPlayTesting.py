@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from Pentago import *
+from SelfPlay import *
+
+
+class SelfPlayTestCase(unittest.TestCase):
+    def test_play_game(self):
+        record = play_game(3, black='greedy', white='random', seed=7, search_time=5)
+        self.assertEqual(record, play_game(3, black='greedy', white='random', seed=7, search_time=5))
+        self.assertNotEqual(record['moves'], play_game(4, black='greedy', white='random', seed=7)['moves'])
+
+        # replaying the moves gives the same result
+        game = Pentago()
+        for position, sub_board, rotation in record['moves']:
+            self.assertTrue(game.make_move(game.get_whose_turn(), position, sub_board, rotation) in
+                            (True, 'game is finished'))
+        self.assertEqual(game.get_game_state(), record['result'])
+
+    def test_games_dont_depend_on_each_other(self):
+        # games that used to share a seed
+        self.assertNotEqual(play_game(1000003, seed=0)['moves'], play_game(0, seed=1)['moves'])
+
+        # without a time limit a search player's game is the same whatever was played before it
+        settings = {'black': 'search', 'white': 'random', 'seed': 4, 'random_plies': 4, 'search_depth': 1,
+                    'search_time': None}
+        record = play_game(2, **settings)
+        play_game(3, **settings)
+        self.assertEqual(play_game(2, **settings), record)
+
+    def test_run_self_play_and_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.jsonl')
+            report = io.StringIO()
+            self.assertEqual(run_self_play(path, 5, workers=2, chunk_size=2, report_file=report, seed=1), 5)
+            self.assertIn('games per second', report.getvalue())
+
+            # a run that was killed partway through a line picks up where it left off
+            with open(path, 'a') as output:
+                output.write('{"game": 9, "seed"')
+            self.assertEqual(read_finished_games(path), {0, 1, 2, 3, 4})
+            self.assertEqual(run_self_play(path, 8, workers=2, report_every=None, seed=1), 3)
+
+            with open(path) as output:
+                records = [json.loads(line) for line in output]
+            self.assertEqual(sorted(record['game'] for record in records), list(range(8)))
+            self.assertEqual(records[0], play_game(records[0]['game'], seed=1))
+
+            # resuming with other settings would mix two kinds of game in one file
+            with self.assertRaisesRegex(ValueError, 'random_plies, seed'):
+                run_self_play(path, 10, workers=2, report_every=None, seed=2, random_plies=3)
+            self.assertEqual(read_finished_games(path, {'seed': 1}), set(range(8)))
+
+    def test_main_without_a_time_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.jsonl')
+            main(['--games', '2', '--output', path, '--workers', '1', '--black', 'search', '--search-depth', '1',
+                  '--no-time-limit', '--report-every', '1000'])
+            with open(path) as output:
+                records = [json.loads(line) for line in output]
+            self.assertEqual([record['search_time'] for record in records], [None, None])
+            self.assertEqual(records[0],
+                             play_game(records[0]['game'], black='search', search_depth=1, search_time=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+# Description: Turns finished Pentago games into fixed-shape training arrays stored as numpy.memmap
+#       files, so training can map them straight in. Run it with: python TrainingData.py --help
+
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+from Pentago import Pentago, move_to_index, transform_bitboard, transform_move_index
+from GameRecords import read_games
+from SelfPlay import PLAYER_TYPES, play_game
+
+# A dataset is a directory holding one raw file per array, named after the array, plus DATASET_FILE
+#       saying how many positions the arrays hold. Each array's file is its rows back to back in C
+#       order, so numpy.memmap opens it directly given the dtype, and shape (count,) + ARRAYS shape.
+DATASET_FILE = 'dataset.json'
+FORMAT_VERSION = 1
+
+# (name, dtype, shape of one position's row)
+#       planes: 1 where black (plane 0) or white (plane 1) has a marble, indexed [plane][row][col]
+#       to_move: 1 when black is the player to move, 0 for white
+#       policy: 1.0 at the index (see Pentago.move_to_index) of the move played from the position
+#       value: the game's final result for the player to move, 1.0 for a win, 0.0 for a draw, -1.0 for a loss
+ARRAYS = (('planes', np.uint8, (2, 6, 6)), ('to_move', np.uint8, ()), ('policy', np.float32, (288,)),
+          ('value', np.float32, ()))
+
+_SQUARE_SHIFTS = np.arange(36, dtype=np.uint64)
+
+
+def _array_path(directory, name):
+    """ returns the path of one array's file in a dataset directory """
+    return os.path.join(directory, name + '.bin')
+
+
+def game_positions(moves, result, augment=False):
+    """
+    Replays one game and returns its training rows.
+    :param moves: the move indices played, or (position, sub_board, rotation) triples
+    :param result: the final game state string, like 'BLACK_WON'
+    :param augment: if True, every position is also given in its 7 other rotations and reflections,
+        with the move played turned the same way, so there are 8 rows per move instead of 1
+    :return: a dict with an array for each name in ARRAYS
+    """
+    if result not in ('BLACK_WON', 'WHITE_WON', 'DRAW'):
+        raise ValueError('the game is not finished: ' + str(result))
+    game = Pentago()
+    black = []
+    white = []
+    to_move = []
+    played = []
+    for move in moves:
+        if not isinstance(move, int):
+            move = move_to_index(*move)
+        bits = game.get_bitboards()
+        for symmetry in range(8 if augment else 1):
+            black.append(transform_bitboard(bits[0], symmetry))
+            white.append(transform_bitboard(bits[1], symmetry))
+            to_move.append(game.get_whose_turn() == 'black')
+            played.append(transform_move_index(move, symmetry))
+        game.apply_move(move)
+
+    boards = np.array([black, white], dtype=np.uint64).T.reshape(-1, 2)
+    to_move = np.array(to_move, dtype=np.uint8)
+    policy = np.zeros((len(played), 288), dtype=np.float32)
+    policy[np.arange(len(played)), played] = 1.0
+    if result == 'DRAW':
+        value = np.zeros(len(played), dtype=np.float32)
+    else:
+        # +1 where the player to move is the one who won
+        value = np.where(to_move == (result == 'BLACK_WON'), 1.0, -1.0).astype(np.float32)
+    planes = (boards[:, :, None] >> _SQUARE_SHIFTS & np.uint64(1)).astype(np.uint8).reshape(-1, 2, 6, 6)
+    return {'planes': planes, 'to_move': to_move, 'policy': policy, 'value': value}
+
+
+class TrainingDataWriter:
+    """
+    Appends training rows to a dataset directory. Rows are appended to each array's file and the count
+    in DATASET_FILE is only moved forward afterwards, so a dataset whose writer was killed partway is
+    still readable, just without the rows that were being written.
+    """
+
+    __slots__ = ('_directory', '_files', '_count')
+
+    def __init__(self, directory, append=False):
+        """
+        Opens the dataset, starting a new one unless append is True and the dataset already exists.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._count = 0
+        if append and os.path.exists(os.path.join(directory, DATASET_FILE)):
+            self._count = _read_metadata(directory)['count']
+        self._files = {}
+        for name, dtype, shape in ARRAYS:
+            output = open(_array_path(directory, name), 'ab' if self._count else 'wb')
+            # anything past the count is left over from a writer that didn't finish
+            output.truncate(self._count * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize)
+            output.seek(0, os.SEEK_END)
+            self._files[name] = output
+        self._write_metadata()
+
+    def __len__(self):
+        """ returns the number of rows in the dataset """
+        return self._count
+
+    def write(self, rows):
+        """ appends rows, a dict like the one game_positions returns """
+        count = len(rows['value'])
+        for name, dtype, shape in ARRAYS:
+            array = np.ascontiguousarray(rows[name], dtype=dtype)
+            if array.shape != (count,) + shape:
+                raise ValueError('{} has shape {}, expected {}'.format(name, array.shape, (count,) + shape))
+            self._files[name].write(array.tobytes())
+        for output in self._files.values():
+            output.flush()
+        self._count += count
+        self._write_metadata()
+
+    def _write_metadata(self):
+        """ replaces DATASET_FILE with the current count """
+        metadata = {'version': FORMAT_VERSION, 'count': self._count,
+                    'arrays': {name: [np.dtype(dtype).str, list(shape)] for name, dtype, shape in ARRAYS}}
+        path = os.path.join(self._directory, DATASET_FILE)
+        with open(path + '.tmp', 'w') as output:
+            json.dump(metadata, output)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        """ closes the array files """
+        for output in self._files.values():
+            output.close()
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+def _read_metadata(directory):
+    """ reads and checks a dataset's DATASET_FILE """
+    with open(os.path.join(directory, DATASET_FILE)) as metadata_file:
+        metadata = json.load(metadata_file)
+    if metadata.get('version') != FORMAT_VERSION:
+        raise ValueError(directory + ' is not a training dataset of version {}'.format(FORMAT_VERSION))
+    return metadata
+
+
+def load_training_data(directory, mode='r'):
+    """
+    Maps a dataset's arrays into memory without reading them.
+    :param mode: numpy.memmap mode, 'r' for read only or 'r+' to change the files in place
+    :return: a dict with a numpy.memmap for each name in ARRAYS, each with one row per position
+    """
+    count = _read_metadata(directory)['count']
+    arrays = {}
+    for name, dtype, shape in ARRAYS:
+        if count == 0:
+            # numpy.memmap can't map an empty file
+            arrays[name] = np.zeros((0,) + shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(_array_path(directory, name), dtype=dtype, mode=mode, shape=(count,) + shape)
+    return arrays
+
+
+def export_games(directory, games, augment=False, append=False, chunk_size=1000):
+    """
+    Writes the positions of finished games to a dataset.
+    :param games: an iterable of (moves, result) pairs, like a GameRecords.GameRecordReader. moves are
+        move indices or (position, sub_board, rotation) triples, and result is the final game state string.
+    :param augment: add the 7 other symmetries of every position, see game_positions
+    :param append: add to an existing dataset instead of starting over
+    :param chunk_size: how many games to collect before writing them out
+    :return: the number of rows in the dataset
+    """
+    with TrainingDataWriter(directory, append) as writer:
+        chunk = []
+        for moves, result in games:
+            chunk.append(game_positions(moves, result, augment))
+            if len(chunk) >= chunk_size:
+                writer.write(_concatenate(chunk))
+                chunk = []
+        if chunk:
+            writer.write(_concatenate(chunk))
+        return len(writer)
+
+
+def _concatenate(chunk):
+    """ joins a list of game_positions dicts into one """
+    return {name: np.concatenate([rows[name] for rows in chunk]) for name, _, _ in ARRAYS}
+
+
+def _self_play_positions(arguments):
+    """ plays one self-play game in a worker process and returns its training rows """
+    game_number, augment, settings = arguments
+    record = play_game(game_number, **settings)
+    return game_positions(record['moves'], record['result'], augment)
+
+
+def export_self_play(directory, num_games, augment=False, append=False, workers=None, chunk_size=100,
+                     **settings):
+    """
+    Plays games with SelfPlay.play_game across a process pool and writes their positions to a dataset as
+    they finish, without saving the games themselves.
+    :param workers: number of worker processes, defaults to one per core. With 1 everything runs in this process.
+    :param settings: passed to play_game (black, white, seed, random_plies, search_depth, search_time)
+    :return: the number of rows in the dataset
+    """
+    tasks = [(game_number, augment, settings) for game_number in range(num_games)]
+    with TrainingDataWriter(directory, append) as writer:
+        if workers == 1:
+            results = map(_self_play_positions, tasks)
+            pool = None
+        else:
+            pool = Pool(workers)
+            results = pool.imap_unordered(_self_play_positions, tasks)
+        try:
+            chunk = []
+            for rows in results:
+                chunk.append(rows)
+                if len(chunk) >= chunk_size:
+                    writer.write(_concatenate(chunk))
+                    chunk = []
+            if chunk:
+                writer.write(_concatenate(chunk))
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return len(writer)
+
+
+def main(argv=None):
+    """ command line entry point """
+    parser = argparse.ArgumentParser(description='Export Pentago games as memory-mapped training arrays.')
+    parser.add_argument('output', help='dataset directory to write')
+    parser.add_argument('--games', help='finished games to export (self-play .jsonl or a game record file)')
+    parser.add_argument('--self-play', type=int, default=0, help='play this many new games and export them instead')
+    parser.add_argument('--augment', action='store_true', help='add all 8 symmetries of every position')
+    parser.add_argument('--append', action='store_true', help='add to the dataset instead of starting over')
+    parser.add_argument('--black', choices=PLAYER_TYPES, default='random', help='self-play player type for black')
+    parser.add_argument('--white', choices=PLAYER_TYPES, default='random', help='self-play player type for white')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--random-plies', type=int, default=0, help='self-play moves played at random at the start')
+    parser.add_argument('--search-depth', type=int, default=2, help='depth for search players')
+    parser.add_argument('--search-time', type=float, default=1.0, help='seconds per move for search players')
+    parser.add_argument('--no-time-limit', action='store_true',
+                        help='search to --search-depth however long it takes, so search games can be played again')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to one per core')
+    args = parser.parse_args(argv)
+
+    if args.games:
+        count = export_games(args.output, read_games(args.games), args.augment, args.append)
+    elif args.self_play:
+        count = export_self_play(args.output, args.self_play, args.augment, args.append, args.workers,
+                                 black=args.black, white=args.white, seed=args.seed,
+                                 random_plies=args.random_plies, search_depth=args.search_depth,
+                                 search_time=None if args.no_time_limit else args.search_time)
+    else:
+        parser.error('one of --games or --self-play is needed')
+    print('{} positions in {}'.format(count, args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
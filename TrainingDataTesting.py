@@ -0,0 +1,111 @@
+import os
+import random
+import tempfile
+import unittest
+from Pentago import *
+from GameRecords import GameRecordWriter, GameRecordReader
+
+try:
+    import numpy as np
+    from TrainingData import *
+except ImportError:
+    np = None
+
+
+def _random_game(rng):
+    """ plays a random game and returns its (move indices, result) """
+    game = Pentago()
+    moves = []
+    while game.get_game_state() == 'UNFINISHED':
+        moves.append(rng.choice(game.get_legal_move_indices()))
+        game.apply_move(moves[-1])
+    return moves, game.get_game_state()
+
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TrainingDataTestCase(unittest.TestCase):
+    def test_game_positions(self):
+        moves, result = _random_game(random.Random(1))
+        rows = game_positions(moves, result)
+        self.assertEqual(rows['planes'].shape, (len(moves), 2, 6, 6))
+        self.assertEqual(rows['policy'].shape, (len(moves), 288))
+
+        game = Pentago()
+        for number, move in enumerate(moves):
+            board = game.get_board()
+            for row in range(6):
+                for col in range(6):
+                    self.assertEqual(rows['planes'][number, 0, row, col], board[row][col] == 'black')
+                    self.assertEqual(rows['planes'][number, 1, row, col], board[row][col] == 'white')
+            is_black_turn = game.get_whose_turn() == 'black'
+            self.assertEqual(rows['to_move'][number], is_black_turn)
+            self.assertEqual(rows['policy'][number].sum(), 1.0)
+            self.assertEqual(rows['policy'][number, move], 1.0)
+            if result == 'DRAW':
+                self.assertEqual(rows['value'][number], 0.0)
+            else:
+                self.assertEqual(rows['value'][number], 1.0 if (result == 'BLACK_WON') == is_black_turn else -1.0)
+            game.apply_move(move)
+
+        with self.assertRaises(ValueError):
+            game_positions(moves[:3], 'UNFINISHED')
+
+    def test_augmentation(self):
+        moves, result = _random_game(random.Random(2))
+        rows = game_positions(moves, result, augment=True)
+        self.assertEqual(len(rows['value']), 8 * len(moves))
+        self.assertTrue((rows['value'].reshape(-1, 8) == rows['value'][::8, None]).all())
+
+        # playing each turned move on its turned position gives the same position as the game, turned
+        for number in range(len(rows['value'])):
+            bits = 1 << np.arange(36, dtype=object)
+            black = int((rows['planes'][number, 0].reshape(36) * bits).sum())
+            white = int((rows['planes'][number, 1].reshape(36) * bits).sum())
+            game = Pentago()
+            game.set_position(black, white, number // 8)
+            game.apply_move(int(rows['policy'][number].argmax()))
+            played = Pentago()
+            for move in moves[:number // 8 + 1]:
+                played.apply_move(move)
+            self.assertEqual(game.get_canonical_key(), played.get_canonical_key())
+
+    def test_export_and_load(self):
+        rng = random.Random(3)
+        games = [_random_game(rng) for _ in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            records = os.path.join(directory, 'games.pgr')
+            with GameRecordWriter(records) as writer:
+                for moves, result in games[:12]:
+                    writer.write(moves, result)
+            dataset = os.path.join(directory, 'dataset')
+            with GameRecordReader(records) as reader:
+                count = export_games(dataset, reader, chunk_size=5)
+            self.assertEqual(count, sum(len(moves) for moves, _ in games[:12]))
+
+            # rows written after the last count, by a writer that was killed, are dropped by the next one
+            with open(os.path.join(dataset, 'value.bin'), 'ab') as leftover:
+                leftover.write(b'\0' * 12)
+            self.assertEqual(export_games(dataset, games[12:], append=True), sum(len(moves) for moves, _ in games))
+
+            arrays = load_training_data(dataset)
+            expected = [game_positions(moves, result) for moves, result in games]
+            for name, _, _ in ARRAYS:
+                self.assertIsInstance(arrays[name], np.memmap)
+                self.assertTrue((arrays[name] == np.concatenate([rows[name] for rows in expected])).all())
+
+            # an empty dataset loads as empty arrays
+            self.assertEqual(export_games(os.path.join(directory, 'empty'), []), 0)
+            self.assertEqual(load_training_data(os.path.join(directory, 'empty'))['planes'].shape, (0, 2, 6, 6))
+
+    def test_export_self_play(self):
+        with tempfile.TemporaryDirectory() as directory:
+            count = export_self_play(directory, 4, augment=True, workers=1, seed=5)
+            arrays = load_training_data(directory)
+            self.assertEqual(len(arrays['value']), count)
+            records = [play_game(game_number, seed=5) for game_number in range(4)]
+            self.assertEqual(count, 8 * sum(len(record['moves']) for record in records))
+            self.assertTrue((arrays['to_move'][:8] == 1).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+# Description: A fixed size transposition table for caching search results about Pentago positions,
+#       and one kept in shared memory so several processes can search with the same table.
+
+from array import array
+from multiprocessing import shared_memory
+
+# bound types for stored values
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# bytes used by one entry: 8 for the key, 4 for the value, 2 for the best move, 1 each for depth and bound type
+ENTRY_SIZE = 16
+
+
+class TranspositionTable:
+    """
+    Remembers search results (value, depth, bound type, and best move) keyed by a position's
+    64 bit hash, normally Pentago.get_zobrist_hash(). The table never grows past the memory budget
+    it is given: every field lives in its own preallocated array, and a new entry replaces an old one
+    when their hashes land in the same bucket.
+
+    With the 'depth' replacement policy each bucket has two slots. The first keeps whichever entry
+    was searched deepest and the second always takes the newest entry, so deep results survive
+    while shallow ones still get cached. With the 'always' policy each bucket is a single slot that
+    the newest entry always takes.
+    """
+
+    __slots__ = ('_replacement', '_bucket_size', '_num_buckets', '_keys', '_values', '_depths', '_bounds',
+                 '_best_moves', '_hits', '_misses', '_stores', '_evictions')
+
+    def __init__(self, size_mb=16, replacement='depth'):
+        """
+        Allocates the table.
+        :param size_mb: memory budget in megabytes
+        :param replacement: 'depth' for depth-preferred buckets or 'always' for always-replace
+        """
+        if replacement not in ('depth', 'always'):
+            raise ValueError("replacement must be 'depth' or 'always'")
+        self._replacement = replacement
+        self._bucket_size = 2 if replacement == 'depth' else 1
+        num_entries = max(self._bucket_size, int(size_mb * 1024 * 1024) // ENTRY_SIZE)
+        self._num_buckets = num_entries // self._bucket_size
+        num_entries = self._num_buckets * self._bucket_size
+
+        self._keys = array('Q', [0]) * num_entries
+        self._values = array('i', [0]) * num_entries
+        self._best_moves = array('h', [-1]) * num_entries
+        # a depth of -1 marks an empty slot, since 0 is a real hash (the empty board)
+        self._depths = array('b', [-1]) * num_entries
+        self._bounds = array('B', [0]) * num_entries
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    def get_capacity(self):
+        """ returns how many entries the table can hold """
+        return len(self._keys)
+
+    def _find(self, key):
+        """ returns the slot holding key, or -1 if it isn't in the table """
+        slot = (key % self._num_buckets) * self._bucket_size
+        for slot in range(slot, slot + self._bucket_size):
+            if self._keys[slot] == key and self._depths[slot] >= 0:
+                return slot
+        return -1
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        :param key: the position's 64 bit hash
+        :return: a (value, depth, bound, best_move) tuple, or None if the position isn't stored. best_move
+            is a move index (see Pentago.move_to_index) or -1 if none was stored.
+        """
+        slot = self._find(key)
+        if slot < 0:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return self._values[slot], self._depths[slot], self._bounds[slot], self._best_moves[slot]
+
+    def store(self, key, value, depth, bound, best_move=-1):
+        """
+        Saves a search result, replacing an older entry if the bucket is full.
+        :param key: the position's 64 bit hash
+        :param value: the score found for the position
+        :param depth: how many plies deep the search went, 0 to 127
+        :param bound: EXACT, LOWER_BOUND, or UPPER_BOUND
+        :param best_move: the best move index found, or -1
+        """
+        slot = self._find(key)
+        if slot < 0:
+            first = (key % self._num_buckets) * self._bucket_size
+            slot = first
+            # depth-preferred: the first slot only gives way to a search at least as deep, everything
+            #       else goes into the always-replace slot next to it
+            if self._bucket_size == 2 and self._depths[first] > depth:
+                slot = first + 1
+            if self._depths[slot] >= 0:
+                self._evictions += 1
+        elif best_move < 0:
+            # keep the old best move, it's still the best guess for move ordering
+            best_move = self._best_moves[slot]
+
+        self._stores += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._depths[slot] = depth
+        self._bounds[slot] = bound
+        self._best_moves[slot] = best_move
+
+    def clear(self):
+        """ empties the table without freeing its memory, and resets the counters """
+        self._depths[:] = array('b', [-1]) * len(self._depths)
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    def get_stats(self):
+        """ returns a dict of counters: hits, misses, stores, evictions, and the table's capacity """
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'stores': self._stores,
+            'evictions': self._evictions,
+            'capacity': self.get_capacity(),
+        }
+
+
+# how SharedTranspositionTable packs an entry's fields into one 64 bit word: the value in the low 32 bits,
+#       then the best move in 16 bits, then the depth plus 1 (so 0 means an empty slot), then the bound type
+_VALUE_MASK = (1 << 32) - 1
+_MOVE_MASK = (1 << 16) - 1
+
+
+class SharedTranspositionTable:
+    """
+    A TranspositionTable, with the same methods and replacement policies, whose entries live in a
+    multiprocessing.shared_memory block. Pickling one (as Pool does with its arguments) sends only the
+    block's name, and unpickling attaches to the same memory, so every process reads and writes one
+    table. The process that made the table owns the block and frees it with close().
+
+    There are no locks. An entry is two 64 bit words, the packed fields and the key xor the packed
+    fields, and a probe only accepts an entry when the two words agree with the key. When two
+    processes write the same slot at once and the words come from different entries, the slot just
+    reads as empty. The counters are kept by each process for itself.
+    """
+
+    __slots__ = ('_replacement', '_bucket_size', '_num_buckets', '_memory', '_words', '_is_owner', '_hits',
+                 '_misses', '_stores', '_evictions')
+
+    def __init__(self, size_mb=16, replacement='depth', name=None):
+        """
+        Allocates the table in shared memory, or attaches to an existing one.
+        :param size_mb: memory budget in megabytes, ignored when attaching
+        :param replacement: 'depth' for depth-preferred buckets or 'always' for always-replace
+        :param name: the shared memory name of a table to attach to, see get_name
+        """
+        if replacement not in ('depth', 'always'):
+            raise ValueError("replacement must be 'depth' or 'always'")
+        self._replacement = replacement
+        self._bucket_size = 2 if replacement == 'depth' else 1
+        if name is None:
+            num_entries = max(self._bucket_size, int(size_mb * 1024 * 1024) // ENTRY_SIZE)
+            num_entries -= num_entries % self._bucket_size
+            # new shared memory is always zeroed, which is an empty table
+            self._memory = shared_memory.SharedMemory(create=True, size=num_entries * ENTRY_SIZE)
+            self._is_owner = True
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            self._is_owner = False
+        # the block can be rounded up to a whole page, only the entries' part of it is used
+        self._num_buckets = self._memory.size // ENTRY_SIZE // self._bucket_size
+        self._words = self._memory.buf[:self._num_buckets * self._bucket_size * ENTRY_SIZE].cast('Q')
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    def __reduce__(self):
+        """ pickles as the shared memory name, so the other process attaches to the same table """
+        return SharedTranspositionTable, (0, self._replacement, self._memory.name)
+
+    def get_name(self):
+        """ returns the name of the table's shared memory block """
+        return self._memory.name
+
+    def get_capacity(self):
+        """ returns how many entries the table can hold """
+        return self._num_buckets * self._bucket_size
+
+    def _find(self, key):
+        """ returns (slot, packed fields) for key, or (-1, 0) if it isn't in the table """
+        words = self._words
+        slot = (key % self._num_buckets) * self._bucket_size
+        for slot in range(slot, slot + self._bucket_size):
+            # each word is read once, another process may be writing the slot
+            data = words[2 * slot + 1]
+            if data and words[2 * slot] ^ data == key:
+                return slot, data
+        return -1, 0
+
+    def probe(self, key):
+        """ looks up a position, see TranspositionTable.probe """
+        slot, data = self._find(key)
+        if slot < 0:
+            self._misses += 1
+            return None
+        self._hits += 1
+        value = data & _VALUE_MASK
+        best_move = data >> 32 & _MOVE_MASK
+        return (value - (1 << 32) if value >> 31 else value, (data >> 48 & 255) - 1, data >> 56,
+                best_move - (1 << 16) if best_move >> 15 else best_move)
+
+    def store(self, key, value, depth, bound, best_move=-1):
+        """ saves a search result, see TranspositionTable.store """
+        words = self._words
+        slot, data = self._find(key)
+        if slot < 0:
+            first = (key % self._num_buckets) * self._bucket_size
+            slot = first
+            if self._bucket_size == 2 and (words[2 * first + 1] >> 48 & 255) - 1 > depth:
+                slot = first + 1
+            if words[2 * slot + 1]:
+                self._evictions += 1
+        elif best_move < 0:
+            best_move = data >> 32 & _MOVE_MASK
+
+        self._stores += 1
+        data = (value & _VALUE_MASK | (best_move & _MOVE_MASK) << 32 | (depth + 1) << 48 | bound << 56)
+        words[2 * slot] = key ^ data
+        words[2 * slot + 1] = data
+
+    def clear(self):
+        """ empties the table for every process using it, and resets this process's counters """
+        self._memory.buf[:] = bytes(self._memory.size)
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    def get_stats(self):
+        """ returns a dict of this process's counters: hits, misses, stores, evictions, and the capacity """
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'stores': self._stores,
+            'evictions': self._evictions,
+            'capacity': self.get_capacity(),
+        }
+
+    def close(self):
+        """ detaches from the shared memory, and frees it if this is the process that made the table """
+        if self._words is None:
+            return
+        self._words.release()
+        self._words = None
+        self._memory.close()
+        if self._is_owner:
+            self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
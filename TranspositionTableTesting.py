@@ -0,0 +1,102 @@
+import multiprocessing
+import unittest
+from Pentago import *
+from TranspositionTable import *
+
+
+class TranspositionTableTestCase(unittest.TestCase):
+    def make_table(self, *args, **kwargs):
+        return TranspositionTable(*args, **kwargs)
+
+    def test_store_and_probe(self):
+        table = self.make_table(size_mb=1)
+        self.assertEqual(table.get_capacity(), 1024 * 1024 // ENTRY_SIZE)
+
+        game = Pentago()
+        self.assertIsNone(table.probe(game.get_zobrist_hash()))
+
+        # the empty board hashes to 0, which still has to be storable
+        table.store(game.get_zobrist_hash(), 5, 3, EXACT, move_to_index('a2', 1, 'C'))
+        self.assertEqual(table.probe(game.get_zobrist_hash()), (5, 3, EXACT, 16))
+
+        # a later store without a best move keeps the old one
+        table.store(game.get_zobrist_hash(), -2, 4, UPPER_BOUND)
+        self.assertEqual(table.probe(game.get_zobrist_hash()), (-2, 4, UPPER_BOUND, 16))
+
+        game.make_move('black', 'a0', 1, 'C')
+        self.assertIsNone(table.probe(game.get_zobrist_hash()))
+
+        self.assertEqual(table.get_stats()['hits'], 2)
+        self.assertEqual(table.get_stats()['misses'], 2)
+        table.clear()
+        self.assertIsNone(table.probe(0))
+
+    def test_depth_preferred_replacement(self):
+        # a budget this small gives exactly one bucket, so every key collides
+        table = self.make_table(size_mb=2 * ENTRY_SIZE / (1024 * 1024))
+        self.assertEqual(table.get_capacity(), 2)
+
+        table.store(1, 10, 8, EXACT)
+        table.store(2, 20, 1, EXACT)
+        table.store(3, 30, 2, EXACT)
+
+        # the deep entry survives, the shallow ones take turns in the other slot
+        self.assertEqual(table.probe(1), (10, 8, EXACT, -1))
+        self.assertIsNone(table.probe(2))
+        self.assertEqual(table.probe(3), (30, 2, EXACT, -1))
+        self.assertEqual(table.get_stats()['evictions'], 1)
+
+        # a deeper search takes over the first slot
+        table.store(4, 40, 9, LOWER_BOUND)
+        self.assertEqual(table.probe(4), (40, 9, LOWER_BOUND, -1))
+        self.assertIsNone(table.probe(1))
+
+    def test_always_replace(self):
+        table = self.make_table(size_mb=ENTRY_SIZE / (1024 * 1024), replacement='always')
+        table.store(1, 10, 8, EXACT)
+        table.store(2, 20, 1, EXACT)
+        self.assertIsNone(table.probe(1))
+        self.assertEqual(table.probe(2), (20, 1, EXACT, -1))
+        self.assertRaises(ValueError, self.make_table, 1, 'never')
+
+
+class SharedTranspositionTableTestCase(TranspositionTableTestCase):
+    # the same tests again, with the table in shared memory
+    def make_table(self, *args, **kwargs):
+        table = SharedTranspositionTable(*args, **kwargs)
+        self.addCleanup(table.close)
+        return table
+
+    def test_shared_between_processes(self):
+        table = self.make_table(size_mb=1)
+        table.store(7, -123456, 5, LOWER_BOUND, 287)
+        with multiprocessing.Pool(1) as pool:
+            # the worker attaches to the same memory, reads the entry, and stores one of its own
+            self.assertEqual(pool.apply(_probe_and_store, (table, 7, 8)), (-123456, 5, LOWER_BOUND, 287))
+        self.assertEqual(table.probe(8), (-7, 3, UPPER_BOUND, -1))
+
+        other = SharedTranspositionTable(name=table.get_name())
+        self.assertEqual(other.probe(7), (-123456, 5, LOWER_BOUND, 287))
+        other.close()
+        self.assertEqual(table.probe(7), (-123456, 5, LOWER_BOUND, 287))
+
+    def test_torn_entry(self):
+        table = self.make_table(size_mb=1)
+        table.store(7, 10, 5, EXACT, 3)
+        self.assertEqual(table.probe(7), (10, 5, EXACT, 3))
+        # an entry whose two words were written by different stores doesn't match its key
+        slot = (7 % (table.get_capacity() // 2)) * 2
+        table._words[2 * slot + 1] ^= 1
+        self.assertIsNone(table.probe(7))
+
+
+def _probe_and_store(table, probed_key, stored_key):
+    """ runs in a worker process """
+    entry = table.probe(probed_key)
+    table.store(stored_key, -7, 3, UPPER_BOUND)
+    table.close()
+    return entry
+
+
+if __name__ == '__main__':
+    unittest.main()